@@ -0,0 +1,411 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Gemini视频分析工具 - 常驻HTTP服务
+接收与GitHub Actions工作流相同的请求参数（prompt/video_type/youtube_url/network_url/webhook_url），
+立即返回任务ID，由共享同一个常驻分析器的worker池在后台执行，
+避免每个请求都启动新的Actions运行器、安装Python和依赖
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Optional
+
+from aiohttp import web
+
+import batch_runner
+import errors
+import hedging
+import media_presets
+import retry_policy
+import structured_report
+from circuit_breaker import CircuitBreaker
+from gemini_video_analyzer import AsyncGeminiVideoAnalyzer
+from metrics import Metrics
+from rate_limiter import BULK, INTERACTIVE, RateLimiter, priority_lane
+from result_cache import ResultCache
+from result_store import DEFAULT_STORE_PATH, ResultStore
+from upload_registry import UploadRegistry
+from webhook_dispatcher import WebhookDispatcher
+from webhook_outbox import WebhookOutbox
+
+# 服务接受的视频类型（与工作流的video_type选项一致）
+SERVER_VIDEO_TYPES = {'youtube': 'youtube', 'network_url': 'url', 'url': 'url'}
+
+
+class AnalysisJob:
+    """服务中的一个分析任务"""
+
+    def __init__(self, job: batch_runner.BatchJob, priority: int):
+        self.job = job
+        self.priority = priority
+        self.status = "queued"
+        self.created_at = datetime.now().isoformat()
+        self.started_at: Optional[str] = None
+        self.finished_at: Optional[str] = None
+        self.record: Optional[dict] = None
+
+    def to_dict(self, include_result: bool = True) -> dict:
+        data = {
+            "job_id": self.job.job_id,
+            "status": self.status,
+            "video_type": self.job.video_type,
+            "source": self.job.source,
+            "model": self.job.model,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+        if self.record is not None:
+            data["latency_s"] = self.record["latency_s"]
+            if self.record["status"] == "error":
+                data["error"] = self.record["error"]
+                if "error_type" in self.record:
+                    data["error_type"] = self.record["error_type"]
+            else:
+                if "answered_by" in self.record:
+                    data["answered_by"] = self.record["answered_by"]
+                if include_result and structured_report.is_structured(self.job.prompt):
+                    data["report"] = json.loads(self.record["result"])
+                elif include_result:
+                    data["result"] = self.record["result"]
+        return data
+
+
+def _payload_body(payload: dict) -> dict:
+    """取出请求参数（兼容repository_dispatch格式的client_payload）"""
+    return payload['client_payload'] if isinstance(payload.get('client_payload'), dict) else payload
+
+
+def parse_job_payload(payload: dict, default_model: str) -> batch_runner.BatchJob:
+    """把请求体转换为任务
+
+    同时接受工作流的client_payload字段本身，以及repository_dispatch格式的
+    {"event_type": ..., "client_payload": {...}} 整体请求体。
+
+    Raises:
+        ValueError: 请求参数无效
+    """
+    if not isinstance(payload, dict):
+        raise ValueError("请求体必须是JSON对象")
+    payload = _payload_body(payload)
+
+    video_type = payload.get('video_type') or 'youtube'
+    if video_type not in SERVER_VIDEO_TYPES:
+        raise ValueError(f"video_type无效: {video_type}（支持 youtube / network_url）")
+    video_type = SERVER_VIDEO_TYPES[video_type]
+
+    source = payload.get('youtube_url') if video_type == 'youtube' else payload.get('network_url') or payload.get('url')
+    if not source:
+        field = 'youtube_url' if video_type == 'youtube' else 'network_url'
+        raise ValueError(f"缺少视频地址: {field}")
+
+    prompt = payload.get('prompt') or None
+    if payload.get('structured'):
+        if prompt is not None:
+            raise ValueError("structured不能与prompt同时使用")
+        prompt = structured_report.PROMPT
+
+    return batch_runner.BatchJob(
+        job_id=uuid.uuid4().hex,
+        video_type=video_type,
+        source=source,
+        prompt=prompt,
+        model=payload.get('model') or default_model,
+        webhook_url=payload.get('webhook_url') or None,
+    )
+
+
+class AnalysisServer:
+    """任务队列 + worker池 + HTTP接口"""
+
+    def __init__(self, analyzer: AsyncGeminiVideoAnalyzer, workers: int = 4, max_queue: int = 1000,
+                 max_finished: int = 10000, default_model: str = "gemini-2.5-flash",
+                 auth_token: Optional[str] = None):
+        """初始化服务
+
+        Args:
+            analyzer: 所有worker共享的常驻分析器
+            workers: 同时执行的分析数（队列中的任务和POST /stream的流式分析共用）
+            max_queue: 排队任务数上限，超过时新请求返回503
+            max_finished: 内存中保留的已完成任务数，超过时丢弃最早完成的任务
+            default_model: 请求未指定model时使用的模型
+            auth_token: 设置后请求必须携带 Authorization: Bearer <token>
+        """
+        self.analyzer = analyzer
+        self.workers = max(1, workers)
+        self.max_finished = max_finished
+        self.default_model = default_model
+        self.auth_token = auth_token
+        self.jobs: Dict[str, AnalysisJob] = {}
+        self._finished: "OrderedDict[str, None]" = OrderedDict()
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        # 执行分析的名额：worker执行队列中的任务、流式请求直接分析都要先占用一个
+        self._slots = asyncio.Semaphore(self.workers)
+        self._streaming = 0
+        self._worker_tasks = []
+        self._started = time.monotonic()
+
+    def make_app(self) -> web.Application:
+        """创建aiohttp应用"""
+        app = web.Application(middlewares=[self._auth_middleware])
+        app.router.add_post('/jobs', self.handle_submit)
+        app.router.add_post('/stream', self.handle_stream)
+        app.router.add_get('/jobs/{job_id}', self.handle_status)
+        app.router.add_get('/jobs/{job_id}/result', self.handle_result)
+        app.router.add_get('/health', self.handle_health)
+        app.router.add_get('/metrics', self.handle_metrics)
+        app.on_startup.append(self._start_workers)
+        app.on_cleanup.append(self._stop_workers)
+        return app
+
+    @web.middleware
+    async def _auth_middleware(self, request: web.Request, handler):
+        if self.auth_token and request.path != '/health':
+            if request.headers.get('Authorization') != f"Bearer {self.auth_token}":
+                return web.json_response({"error": "未授权"}, status=401)
+        return await handler(request)
+
+    async def _start_workers(self, app: web.Application) -> None:
+        await self.analyzer.replay_webhooks()
+        self._worker_tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        print(f"✓ 分析服务已启动，worker数: {self.workers}")
+
+    async def _stop_workers(self, app: web.Application) -> None:
+        for task in self._worker_tasks:
+            task.cancel()
+        await asyncio.gather(*self._worker_tasks, return_exceptions=True)
+        await self.analyzer.close()
+
+    async def _worker(self) -> None:
+        while True:
+            analysis_job = await self._queue.get()
+            try:
+                async with self._slots:
+                    analysis_job.status = "running"
+                    analysis_job.started_at = datetime.now().isoformat()
+                    with priority_lane(analysis_job.priority):
+                        record = await batch_runner.run_job(self.analyzer, analysis_job.job)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                record = {"status": "error", "error": str(e), "latency_s": 0.0}
+            finally:
+                self._queue.task_done()
+
+            analysis_job.record = record
+            analysis_job.status = "succeeded" if record["status"] == "ok" else "failed"
+            analysis_job.finished_at = datetime.now().isoformat()
+            mark = "✓" if analysis_job.status == "succeeded" else "✗"
+            print(f"{mark} 任务 {analysis_job.job.job_id} {analysis_job.status} ({record['latency_s']:.1f}s)")
+            self._remember_finished(analysis_job.job.job_id)
+
+    def _remember_finished(self, job_id: str) -> None:
+        self._finished[job_id] = None
+        while len(self._finished) > self.max_finished:
+            old_id, _ = self._finished.popitem(last=False)
+            self.jobs.pop(old_id, None)
+
+    async def handle_submit(self, request: web.Request) -> web.Response:
+        """POST /jobs：提交分析任务，立即返回任务ID"""
+        try:
+            payload = await request.json()
+            job = parse_job_payload(payload, self.default_model)
+        except ValueError as e:
+            return web.json_response({"error": str(e)}, status=400)
+
+        # 请求可以用 "priority": "bulk" 让出配额给交互式请求
+        body = _payload_body(payload)
+        priority = BULK if body.get('priority') == 'bulk' else INTERACTIVE
+        analysis_job = AnalysisJob(job, priority)
+        try:
+            self._queue.put_nowait(analysis_job)
+        except asyncio.QueueFull:
+            return web.json_response({"error": "任务队列已满，请稍后重试"}, status=503)
+        self.jobs[job.job_id] = analysis_job
+
+        return web.json_response({
+            "job_id": job.job_id,
+            "status": analysis_job.status,
+            "status_url": f"/jobs/{job.job_id}",
+            "result_url": f"/jobs/{job.job_id}/result",
+        }, status=202)
+
+    async def handle_stream(self, request: web.Request) -> web.StreamResponse:
+        """POST /stream：不经过任务队列直接分析，以分块传输的纯文本边生成边返回
+
+        请求参数与POST /jobs相同；"progressive_webhook": true 时报告每完成一个章节就先推送一次webhook。
+        流式分析与worker共用执行名额，名额已满时返回503（不排队，客户端按Retry-After稍后重试）。
+        客户端断开连接时取消分析。
+        """
+        try:
+            payload = await request.json()
+            job = parse_job_payload(payload, self.default_model)
+        except ValueError as e:
+            return web.json_response({"error": str(e)}, status=400)
+
+        if self._slots.locked():
+            return web.json_response({"error": "分析名额已满，请稍后重试"}, status=503, headers={'Retry-After': '5'})
+        await self._slots.acquire()
+        self._streaming += 1
+        try:
+            return await self._stream(request, job, payload)
+        finally:
+            self._streaming -= 1
+            self._slots.release()
+
+    async def _stream(self, request: web.Request, job: batch_runner.BatchJob, payload: dict) -> web.StreamResponse:
+        """执行流式分析并写出响应（调用方已占用执行名额）"""
+        progressive = bool(_payload_body(payload).get('progressive_webhook'))
+        if job.video_type == 'youtube':
+            chunks = self.analyzer.stream_youtube_video(job.source, job.prompt, job.model, job.webhook_url, progressive)
+        else:
+            chunks = self.analyzer.stream_video_url(job.source, job.prompt, job.model, job.webhook_url, progressive)
+
+        response = web.StreamResponse(headers={'Content-Type': 'text/plain; charset=utf-8'})
+        await response.prepare(request)
+        try:
+            async for chunk in chunks:
+                await response.write(chunk.encode('utf-8'))
+        except errors.AnalysisError as e:
+            # 响应头已经发出，错误信息作为最后一块文本
+            await response.write(f"分析过程中出现错误: {str(e)}".encode('utf-8'))
+        finally:
+            await chunks.aclose()
+        await response.write_eof()
+        return response
+
+    def _find(self, request: web.Request) -> AnalysisJob:
+        analysis_job = self.jobs.get(request.match_info['job_id'])
+        if analysis_job is None:
+            raise web.HTTPNotFound(text='{"error": "任务不存在"}', content_type='application/json')
+        return analysis_job
+
+    async def handle_status(self, request: web.Request) -> web.Response:
+        """GET /jobs/{job_id}：查询任务状态（不含结果正文）"""
+        return web.json_response(self._find(request).to_dict(include_result=False))
+
+    async def handle_result(self, request: web.Request) -> web.Response:
+        """GET /jobs/{job_id}/result：获取任务结果，任务未完成时返回202"""
+        analysis_job = self._find(request)
+        status = 202 if analysis_job.record is None else 200
+        return web.json_response(analysis_job.to_dict(), status=status)
+
+    async def handle_health(self, request: web.Request) -> web.Response:
+        """GET /health：服务状态"""
+        running = sum(1 for j in self.jobs.values() if j.status == "running")
+        return web.json_response({
+            "status": "ok",
+            "uptime_s": round(time.monotonic() - self._started, 1),
+            "queued": self._queue.qsize(),
+            "running": running,
+            "streaming": self._streaming,
+            "workers": self.workers,
+            "coalescing": self.analyzer.coalescing_stats(),
+            "circuit_breaker": self.analyzer.breaker.stats(),
+        })
+
+
+    async def handle_metrics(self, request: web.Request) -> web.Response:
+        """GET /metrics：Prometheus文本格式的分阶段耗时、token用量和任务计数"""
+        text = self.analyzer.metrics.render_prometheus() + (
+            "# TYPE gva_server_queued_jobs gauge\n"
+            f"gva_server_queued_jobs {self._queue.qsize()}\n"
+            "# TYPE gva_coalesced_requests_total counter\n"
+            f"gva_coalesced_requests_total {self.analyzer.coalescing_stats()['coalesced']}\n"
+        )
+        return web.Response(text=text, content_type='text/plain', charset='utf-8')
+
+
+def main():
+    """启动分析服务"""
+    parser = argparse.ArgumentParser(
+        description='Gemini视频分析常驻HTTP服务',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+使用示例:
+  python analysis_server.py --port 8080 --workers 8
+  curl -X POST localhost:8080/jobs -d '{"video_type": "youtube", "youtube_url": "https://www.youtube.com/watch?v=dQw4w9WgXcQ"}'
+  curl localhost:8080/jobs/<job_id>/result
+  curl -N -X POST localhost:8080/stream -d '{"youtube_url": "https://www.youtube.com/watch?v=dQw4w9WgXcQ"}'
+
+  # 使用本地假Gemini后端测试（不需要API密钥）
+  python analysis_server.py --fake
+        """
+    )
+    parser.add_argument('--host', default='127.0.0.1', help='监听地址（默认: 127.0.0.1）')
+    parser.add_argument('--port', type=int, default=8080, help='监听端口（默认: 8080）')
+    parser.add_argument('--workers', type=int, default=4, help='同时执行的任务数（默认: 4）')
+    parser.add_argument('--max-queue', type=int, default=1000, help='排队任务数上限（默认: 1000）')
+    parser.add_argument('--model', '-m', default='gemini-2.5-flash', help='默认模型（默认: gemini-2.5-flash）')
+    parser.add_argument('--api-key', '-k', help='Google AI API密钥（可选，优先使用环境变量GOOGLE_AI_API_KEY）')
+    parser.add_argument('--auth-token', help='要求请求携带的Bearer令牌（可选，也可用环境变量ANALYSIS_SERVER_TOKEN）')
+    parser.add_argument('--no-cache', action='store_true', help='不使用分析结果缓存')
+    parser.add_argument('--no-store', action='store_true', help='不把分析结果写入本地结果库（供 cli_analyzer.py query 查询）')
+    parser.add_argument('--store-path', default=DEFAULT_STORE_PATH, metavar='PATH',
+                        help=f'本地结果库路径（默认: {DEFAULT_STORE_PATH}）')
+    parser.add_argument('--segment-seconds', type=float, help='时长超过该值的视频分段并行分析后合并（默认整段分析）')
+    parser.add_argument('--segment-overlap', type=float, default=30, help='相邻分段窗口的重叠秒数（默认: 30）')
+    parser.add_argument('--preset', choices=list(media_presets.PRESETS) + [media_presets.AUTO],
+                        help='默认的视频采样预设（fast / balanced / full / auto，默认full）')
+    parser.add_argument('--token-budget', type=int, help='每次请求的输入token预算，按预算自动选择采样预设（隐含--preset auto）')
+    parser.add_argument('--job-log', help='把每次分析的分阶段耗时和token用量以JSON Lines追加写入该文件')
+    parser.add_argument('--retries', type=int, default=2,
+                        help='下载、上传、生成遇到临时故障（5xx、超时、连接中断）时的重试次数（默认: 2）')
+    parser.add_argument('--circuit-threshold', type=int, default=5,
+                        help='同一模型（或上传接口）连续失败多少次后熔断，熔断期间请求立即失败（默认: 5）')
+    parser.add_argument('--circuit-reset', type=float, default=30, help='熔断后多少秒放行试探请求（默认: 30）')
+    parser.add_argument('--hedge-percentile', type=float, metavar='P',
+                        help='生成请求超过该模型近期延迟的P分位数仍未返回时发出对冲请求（默认不对冲）')
+    parser.add_argument('--hedge-model', metavar='MODEL', help='对冲请求使用的模型（默认与任务的模型相同）')
+    parser.add_argument('--fallback-model', action='append', metavar='MODEL',
+                        help='模型出现后端故障时依次改用的模型，可重复指定')
+    parser.add_argument('--fake', action='store_true', help='使用本地假Gemini后端（用于本地测试）')
+    args = parser.parse_args()
+
+    api_key = args.api_key or os.getenv('GOOGLE_AI_API_KEY')
+    if args.fake:
+        import fake_gemini
+        fake_gemini.install()
+        api_key = api_key or 'fake'
+        print("⚠ 使用本地假Gemini后端")
+    if not api_key:
+        print("错误: 需要提供API密钥")
+        print("请设置环境变量GOOGLE_AI_API_KEY或使用--api-key参数")
+        sys.exit(1)
+
+    analyzer = AsyncGeminiVideoAnalyzer(
+        api_key,
+        cache=None if args.no_cache else ResultCache(),
+        result_store=None if args.no_store else ResultStore(args.store_path),
+        upload_registry=UploadRegistry(),
+        webhook_dispatcher=WebhookDispatcher(outbox=WebhookOutbox()),
+        rate_limiter=RateLimiter(),
+        metrics=Metrics(jobs_path=args.job_log),
+        segment_seconds=args.segment_seconds,
+        segment_overlap=args.segment_overlap,
+        media_preset=args.preset or (media_presets.AUTO if args.token_budget else None),
+        token_budget=args.token_budget,
+        retry_policies=retry_policy.with_attempts(args.retries + 1),
+        circuit_breaker=CircuitBreaker(args.circuit_threshold, args.circuit_reset),
+        hedging_policy=hedging.from_options(args.hedge_percentile, args.hedge_model, args.fallback_model),
+    )
+    server = AnalysisServer(
+        analyzer,
+        workers=args.workers,
+        max_queue=args.max_queue,
+        default_model=args.model,
+        auth_token=args.auth_token or os.getenv('ANALYSIS_SERVER_TOKEN'),
+    )
+    web.run_app(server.make_app(), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,448 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+离线批量预测
+把大量不要求时效的分析任务（视频, 提示词, 模型）打包成批量预测请求提交，成本和配额都与同步调用分开，
+不和交互式请求争抢。提交后定期查询状态，完成后把结果拆回每个任务的输出行和webhook。
+后端可替换：GeminiBatchBackend调用Gemini的batchGenerateContent接口，
+LocalBatchBackend是本地替身，不需要网络即可测试整个流程
+"""
+
+import asyncio
+import hashlib
+import itertools
+import json
+import os
+import tempfile
+import time
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+import aiohttp
+
+import errors
+import gemini_rest
+import structured_report
+from batch_runner import BatchJob, summarize
+from rate_limiter import BULK, priority_lane
+from streaming_upload import GEMINI_UPLOAD_URL, ResumableUpload
+
+# 批量任务状态
+PENDING = 'PENDING'
+RUNNING = 'RUNNING'
+SUCCEEDED = 'SUCCEEDED'
+FAILED = 'FAILED'
+CANCELLED = 'CANCELLED'
+EXPIRED = 'EXPIRED'
+TERMINAL_STATES = (SUCCEEDED, FAILED, CANCELLED, EXPIRED)
+
+# 连续这么多次查询状态失败时放弃等待，该批的任务记为失败
+MAX_STATUS_ERRORS = 10
+
+# 内联提交的请求总大小上限，超过时先把请求写成JSONL文件上传
+INLINE_LIMIT = 16 * 1024 * 1024
+
+GEMINI_DOWNLOAD_BASE = "https://generativelanguage.googleapis.com/download/v1beta"
+
+# 一个请求的结果：{"response": GenerateContentResponse} 或 {"error": 错误信息}
+BatchResults = Dict[str, dict]
+
+
+def parse_responses(lines) -> BatchResults:
+    """解析批量预测的结果文件（每行 {"key": ..., "response": ...} 或 {"key": ..., "error": ...}）"""
+    results: BatchResults = {}
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        entry = json.loads(line)
+        if 'error' in entry:
+            error = entry['error']
+            results[entry['key']] = {"error": error.get('message', str(error)) if isinstance(error, dict) else str(error)}
+        else:
+            results[entry['key']] = {"response": entry.get('response', {})}
+    return results
+
+
+class BatchBackend:
+    """批量预测后端的接口"""
+
+    async def submit(self, model: str, requests: List[Tuple[str, dict]], display_name: str) -> str:
+        """提交一批请求
+
+        Args:
+            model: 模型名称（一批请求只能使用同一个模型）
+            requests: (请求键, REST格式的GenerateContentRequest) 列表
+            display_name: 批量任务的显示名称
+
+        Returns:
+            批量任务ID
+        """
+        raise NotImplementedError
+
+    async def status(self, batch_id: str) -> str:
+        """查询批量任务状态（PENDING / RUNNING / SUCCEEDED / FAILED / CANCELLED / EXPIRED）"""
+        raise NotImplementedError
+
+    async def results(self, batch_id: str) -> BatchResults:
+        """读取已完成的批量任务的结果，返回 请求键 -> 结果"""
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        """释放后端占用的资源"""
+
+
+def _normalize_state(state: Optional[str]) -> str:
+    """把BATCH_STATE_SUCCEEDED、JOB_STATE_SUCCEEDED等写法统一为SUCCEEDED"""
+    state = (state or PENDING).upper()
+    for prefix in ('BATCH_STATE_', 'JOB_STATE_'):
+        if state.startswith(prefix):
+            state = state[len(prefix):]
+    return state if state in TERMINAL_STATES + (PENDING, RUNNING) else RUNNING
+
+
+class GeminiBatchBackend(BatchBackend):
+    """通过Gemini API的batchGenerateContent接口提交批量预测"""
+
+    def __init__(self, api_key: str, api_base: str = gemini_rest.GEMINI_API_BASE,
+                 download_base: str = GEMINI_DOWNLOAD_BASE, upload_endpoint: str = GEMINI_UPLOAD_URL):
+        """初始化后端
+
+        Args:
+            api_key: Google AI API密钥
+            api_base: API地址
+            download_base: 结果文件的下载地址
+            upload_endpoint: 请求文件的上传地址（请求较多、超过内联大小上限时使用）
+        """
+        self.api_key = api_key
+        self.api_base = api_base
+        self.download_base = download_base
+        self.upload_endpoint = upload_endpoint
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    async def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(headers={'x-goog-api-key': self.api_key})
+        return self._session
+
+    async def _input_config(self, requests: List[Tuple[str, dict]], display_name: str) -> dict:
+        inline = [{"request": request, "metadata": {"key": key}} for key, request in requests]
+        if len(json.dumps(inline, ensure_ascii=False).encode('utf-8')) <= INLINE_LIMIT:
+            return {"requests": {"requests": inline}}
+        # 请求较多时写成JSONL文件上传，再按文件名引用
+        data = ''.join(json.dumps({"key": key, "request": request}, ensure_ascii=False) + '\n'
+                       for key, request in requests).encode('utf-8')
+        upload = ResumableUpload(await self._get_session(), self.api_key, self.upload_endpoint)
+        await upload.start(len(data), 'application/jsonl', display_name)
+        uploaded = await upload.send(data, 0, finalize=True)
+        return {"file_name": uploaded['name']}
+
+    async def submit(self, model: str, requests: List[Tuple[str, dict]], display_name: str) -> str:
+        session = await self._get_session()
+        body = {"batch": {"display_name": display_name,
+                          "input_config": await self._input_config(requests, display_name)}}
+        async with session.post(f"{self.api_base}/models/{model}:batchGenerateContent", json=body) as response:
+            await gemini_rest.raise_for_error(response)
+            return (await response.json())['name']
+
+    async def _get(self, batch_id: str) -> dict:
+        session = await self._get_session()
+        async with session.get(f"{self.api_base}/{batch_id}") as response:
+            await gemini_rest.raise_for_error(response)
+            return await response.json()
+
+    async def status(self, batch_id: str) -> str:
+        data = await self._get(batch_id)
+        return _normalize_state(data.get('metadata', {}).get('state') or data.get('state'))
+
+    async def results(self, batch_id: str) -> BatchResults:
+        data = await self._get(batch_id)
+        output = data.get('response') or data.get('metadata', {}).get('output') or {}
+        if output.get('responsesFile'):
+            session = await self._get_session()
+            url = f"{self.download_base}/{output['responsesFile']}:download?alt=media"
+            async with session.get(url) as response:
+                await gemini_rest.raise_for_error(response)
+                return parse_responses((await response.text()).splitlines())
+
+        results: BatchResults = {}
+        inlined = output.get('inlinedResponses', {})
+        for entry in inlined.get('inlinedResponses', []) if isinstance(inlined, dict) else inlined:
+            key = entry.get('metadata', {}).get('key')
+            if 'error' in entry:
+                results[key] = {"error": entry['error'].get('message', str(entry['error']))}
+            else:
+                results[key] = {"response": entry.get('response', {})}
+        return results
+
+    async def close(self) -> None:
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+
+
+async def _local_response(model: str, request: dict) -> dict:
+    """本地替身默认的生成函数：返回可重复的模拟报告"""
+    parts = request['contents'][0]['parts']
+    prompt = next((p['text'] for p in parts if 'text' in p), '')
+    uri = next((p['fileData']['fileUri'] for p in parts if 'fileData' in p), '')
+    digest = hashlib.sha256(f"{model}|{prompt}|{uri}".encode('utf-8')).hexdigest()[:12]
+    if request.get('generationConfig', {}).get('responseMimeType') == 'application/json':
+        # 结构化模式：返回符合structured_report.RESPONSE_SCHEMA的JSON
+        text = json.dumps({
+            "sponsorship": "无赞助", "sponsorship_evidence": "",
+            "brands": [{"name": "LocalBrand", "seconds": int(digest[:2], 16) % 60, "percent": 1.0,
+                        "sentiment": 4, "opinion": f"结果{digest[:4]}"}],
+            "video_type": "评测", "summary": f"{uri} 的内容", "kol_sentiment": 4,
+            "positives": [], "negatives": [],
+        }, ensure_ascii=False)
+    else:
+        text = (f"# [local-batch:{model}] 分析报告\n\n## 1. 视频\n- {uri}\n\n"
+                f"## 2. 提示词摘要\n- {prompt[:30]}\n\n## 3. 结果编号\n- {digest}\n")
+    return {
+        "candidates": [{"content": {"parts": [{"text": text}], "role": "model"}}],
+        "usageMetadata": {"promptTokenCount": len(prompt) // 3, "candidatesTokenCount": len(text) // 3,
+                          "totalTokenCount": len(prompt) // 3 + len(text) // 3},
+    }
+
+
+class LocalBatchBackend(BatchBackend):
+    """本地替身后端：请求写入目录中的JSONL文件，经过一段延迟后逐个生成结果文件"""
+
+    def __init__(self, directory: Optional[str] = None, delay: float = 1.0,
+                 generate: Optional[Callable[[str, dict], Awaitable[dict]]] = None):
+        """初始化后端
+
+        Args:
+            directory: 保存请求和结果文件的目录，不提供时使用临时目录
+            delay: 提交后到开始处理的延迟（秒），模拟排队
+            generate: 生成函数，参数为(模型, REST格式的请求)，返回GenerateContentResponse；
+                抛出的异常记录为该请求的错误。不提供时返回可重复的模拟报告
+        """
+        self.directory = directory or tempfile.mkdtemp(prefix='gemini-batch-')
+        self.delay = delay
+        self.generate = generate or _local_response
+        self._states: Dict[str, str] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._count = 0
+
+    def _path(self, batch_id: str, name: str) -> str:
+        return os.path.join(self.directory, batch_id.replace('/', '-'), name)
+
+    async def submit(self, model: str, requests: List[Tuple[str, dict]], display_name: str) -> str:
+        self._count += 1
+        batch_id = f"batches/local-{os.getpid()}-{self._count}"
+        os.makedirs(os.path.dirname(self._path(batch_id, 'input.jsonl')), exist_ok=True)
+        with open(self._path(batch_id, 'input.jsonl'), 'w', encoding='utf-8') as f:
+            for key, request in requests:
+                f.write(json.dumps({"key": key, "request": request}, ensure_ascii=False) + '\n')
+        self._states[batch_id] = PENDING
+        self._tasks[batch_id] = asyncio.create_task(self._process(batch_id, model))
+        return batch_id
+
+    async def _process(self, batch_id: str, model: str) -> None:
+        await asyncio.sleep(self.delay)
+        self._states[batch_id] = RUNNING
+        try:
+            with open(self._path(batch_id, 'input.jsonl'), 'r', encoding='utf-8') as f:
+                entries = [json.loads(line) for line in f if line.strip()]
+            lines = []
+            for entry in entries:
+                try:
+                    line = {"key": entry['key'], "response": await self.generate(model, entry['request'])}
+                except Exception as e:
+                    line = {"key": entry['key'], "error": {"message": str(e)}}
+                lines.append(json.dumps(line, ensure_ascii=False) + '\n')
+            with open(self._path(batch_id, 'output.jsonl'), 'w', encoding='utf-8') as f:
+                f.writelines(lines)
+            self._states[batch_id] = SUCCEEDED
+        except Exception as e:
+            print(f"✗ 本地批量任务失败 {batch_id}: {str(e)}")
+            self._states[batch_id] = FAILED
+
+    async def status(self, batch_id: str) -> str:
+        if batch_id not in self._states:
+            raise KeyError(f"批量任务不存在: {batch_id}")
+        return self._states[batch_id]
+
+    async def results(self, batch_id: str) -> BatchResults:
+        with open(self._path(batch_id, 'output.jsonl'), 'r', encoding='utf-8') as f:
+            return parse_responses(f)
+
+    async def close(self) -> None:
+        for task in self._tasks.values():
+            task.cancel()
+        await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+
+
+class _PendingRequest(NamedTuple):
+    """已提交（或待提交）到批量预测中的一个任务"""
+    key: str
+    job: BatchJob
+    prompt: str
+    identity: Optional[str]
+    release: Optional[Callable[[], Awaitable[None]]]
+    request: dict
+    started_at: str
+    start: float
+
+
+async def run_batch_prediction(analyzer, jobs: Iterator[BatchJob], output_path: str, backend: BatchBackend,
+                               concurrency: int = 4, poll_interval: float = 60.0,
+                               max_batch_size: int = 1000, max_status_errors: int = MAX_STATUS_ERRORS) -> dict:
+    """以离线批量预测方式执行批量任务
+
+    以有界并发获取视频（YouTube直接引用，本地和网络视频上传到Gemini），命中结果缓存的任务直接输出；
+    其余任务按模型分组，某个模型攒满max_batch_size个请求就立即打包提交（获取视频与提交、等待重叠进行，
+    已上传的文件不必等全部任务准备完），全部准备完后提交剩余的请求。
+    定期查询状态，完成后逐个写入结果、缓存并发送webhook。
+
+    Args:
+        analyzer: AsyncGeminiVideoAnalyzer实例（负责上传、缓存和webhook投递）
+        jobs: 任务迭代器
+        output_path: 输出JSONL文件路径（格式与batch_runner.run_batch相同，另带batch字段）
+        backend: 批量预测后端
+        concurrency: 获取视频的最大并发数
+        poll_interval: 查询批量任务状态的间隔（秒）
+        max_batch_size: 每次提交的最大请求数
+        max_status_errors: 连续查询状态失败这么多次后放弃等待，该批的任务记为失败
+
+    Returns:
+        汇总统计信息
+    """
+    start = time.monotonic()
+    latencies: List[float] = []
+    counts = {"ok": 0, "error": 0}
+    error_types: Dict[str, int] = {}
+    cached = 0
+    job_iter = iter(jobs)
+    # 按模型攒批：模型 -> 尚未提交的请求
+    by_model: Dict[str, List[_PendingRequest]] = {}
+    chunk_tasks: List[asyncio.Task] = []
+    request_ids = itertools.count(1)
+
+    with open(output_path, 'a', encoding='utf-8') as out, priority_lane(BULK):
+        def write(job: BatchJob, started_at: str, job_start: float, outcome: dict, batch_id: Optional[str] = None):
+            record = {"id": job.job_id, "video_type": job.video_type, "source": job.source,
+                      "model": job.model, "started_at": started_at}
+            if "error" in outcome:
+                record.update(status="error", error=outcome["error"])
+                error_type = outcome.get("error_type", "error")
+                error_types[error_type] = error_types.get(error_type, 0) + 1
+                if "error_type" in outcome:
+                    record["error_type"] = error_type
+            else:
+                record.update(status="ok", result=outcome["result"])
+            if batch_id is not None:
+                record["batch"] = batch_id
+            record["latency_s"] = round(time.monotonic() - job_start, 3)
+            record["finished_at"] = datetime.now().isoformat()
+            out.write(json.dumps(record, ensure_ascii=False) + '\n')
+            out.flush()
+            latencies.append(record["latency_s"])
+            counts[record["status"]] += 1
+            if record["status"] == "ok":
+                print(f"✓ [{job.job_id}] 完成 ({record['latency_s']:.1f}s)")
+            else:
+                print(f"✗ [{job.job_id}] 失败: {record['error']}")
+
+        async def run_chunk(index: int, items: List[_PendingRequest]):
+            model = items[0].job.model
+            batch_id = None
+            try:
+                batch_id = await backend.submit(model, [(item.key, item.request) for item in items],
+                                                f"gemini-video-analyzer-{int(time.time())}-{index}")
+                print(f"✓ 已提交批量预测 {batch_id}（{model}，{len(items)} 个请求）")
+                state = PENDING
+                status_errors = 0
+                while state not in TERMINAL_STATES:
+                    await asyncio.sleep(poll_interval)
+                    try:
+                        current = await backend.status(batch_id)
+                    except Exception as e:
+                        status_errors += 1
+                        if status_errors >= max_status_errors:
+                            raise RuntimeError(f"连续 {status_errors} 次查询状态失败: {str(e)}") from e
+                        print(f"⚠ 查询批量任务状态失败 {batch_id} ({status_errors}/{max_status_errors}): {str(e)}")
+                        continue
+                    status_errors = 0
+                    if current != state:
+                        print(f"批量任务 {batch_id}: {current}")
+                    state = current
+                if state == SUCCEEDED:
+                    results = await backend.results(batch_id)
+                else:
+                    results = {item.key: {"error": f"批量任务结束状态为{state}"} for item in items}
+            except Exception as e:
+                results = {item.key: {"error": f"批量预测失败: {str(e)}"} for item in items}
+
+            for item in items:
+                entry = results.get(item.key, {"error": "批量预测结果中缺少该请求"})
+                if "response" in entry:
+                    response = gemini_rest.RestResponse(entry["response"])
+                    try:
+                        outcome = {"result": structured_report.normalize(item.prompt, response.text), "cached": False}
+                        analyzer.metrics.record_usage(model, response.usage_metadata)
+                        await analyzer.store_result(item.identity, item.prompt, model, outcome["result"])
+                    except (ValueError, errors.AnalysisError) as e:
+                        outcome = {"error": str(e), "error_type": errors.classify(e).kind}
+                else:
+                    outcome = {"error": entry["error"]}
+                await analyzer.deliver_result(item.job.webhook_url, item.job.video_type, item.job.source,
+                                              model, item.prompt, outcome)
+                write(item.job, item.started_at, item.start, outcome, batch_id)
+                if item.release is not None:
+                    try:
+                        await item.release()
+                    except Exception as e:
+                        print(f"⚠ 释放上传失败: {str(e)}")
+
+        def submit_chunk(items: List[_PendingRequest]) -> None:
+            chunk_tasks.append(asyncio.create_task(run_chunk(len(chunk_tasks) + 1, items)))
+
+        async def prepare():
+            nonlocal cached
+            for job in job_iter:
+                started_at, job_start = datetime.now().isoformat(), time.monotonic()
+                prompt = job.prompt or analyzer.DEFAULT_PROMPT
+                try:
+                    if job.error:
+                        raise ValueError(job.error)
+                    if job.video_type == 'local' and not os.path.exists(job.source):
+                        raise FileNotFoundError(f"文件不存在 - {job.source}")
+                    file_data, identity, release = await analyzer.prepare_video(job.video_type, job.source)
+                except Exception as e:
+                    write(job, started_at, job_start, {"error": str(e), "error_type": errors.classify(e).kind})
+                    continue
+
+                result = await analyzer.lookup_result(identity, prompt, job.model)
+                if result is not None:
+                    cached += 1
+                    outcome = {"result": result, "cached": True}
+                    await analyzer.deliver_result(job.webhook_url, job.video_type, job.source, job.model, prompt, outcome)
+                    write(job, started_at, job_start, outcome)
+                    if release is not None:
+                        await release()
+                    continue
+                items = by_model.setdefault(job.model, [])
+                items.append(_PendingRequest(f"req-{next(request_ids)}", job, prompt, identity, release,
+                                             analyzer.build_request(prompt, file_data), started_at, job_start))
+                if len(items) >= max_batch_size:
+                    # 攒满一批立即提交，其余视频继续准备
+                    submit_chunk(by_model.pop(job.model))
+
+        try:
+            await asyncio.gather(*(prepare() for _ in range(max(1, concurrency))))
+            # 提交各模型剩余不足一批的请求
+            for items in by_model.values():
+                submit_chunk(items)
+            by_model.clear()
+            await asyncio.gather(*chunk_tasks)
+        finally:
+            for task in chunk_tasks:
+                task.cancel()
+            await asyncio.gather(*chunk_tasks, return_exceptions=True)
+
+    summary = summarize(counts, latencies, time.monotonic() - start)
+    summary.update(cached=cached, batches=len(chunk_tasks), error_types=error_types)
+    return summary
+
@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Gemini视频分析工具 - 批量模式
+从JSONL/CSV清单读取多个分析任务，在单个事件循环中以有界并发执行，
+每完成一个任务就向输出JSONL追加一行结果；提供任务日志时记录每个任务的阶段，中断后可以续跑
+"""
+
+import asyncio
+import csv
+import json
+import math
+import os
+import time
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional
+
+import errors
+import hedging
+import job_journal
+from job_journal import JobJournal
+from rate_limiter import BULK, priority_lane
+
+# 清单中支持的视频类型（network_url与GitHub Actions工作流中的写法保持一致）
+VIDEO_TYPES = {
+    'youtube': 'youtube',
+    'local': 'local',
+    'url': 'url',
+    'network_url': 'url',
+}
+
+
+class BatchJob:
+    """批量清单中的单个分析任务"""
+
+    def __init__(self, job_id: str, video_type: str, source: str,
+                 prompt: Optional[str] = None, model: str = "gemini-2.5-flash",
+                 webhook_url: Optional[str] = None, error: Optional[str] = None):
+        self.job_id = job_id
+        self.video_type = video_type
+        self.source = source
+        self.prompt = prompt
+        self.model = model
+        self.webhook_url = webhook_url
+        # 清单行本身无效时记录原因，该行作为失败任务输出而不中断整个批次
+        self.error = error
+
+
+def _guess_video_type(source: str) -> str:
+    """根据视频地址推断视频类型"""
+    lowered = source.lower()
+    if 'youtube.com/' in lowered or 'youtu.be/' in lowered:
+        return 'youtube'
+    if lowered.startswith(('http://', 'https://')):
+        return 'url'
+    return 'local'
+
+
+def _row_to_job(row: Dict[str, str], index: int, defaults: Dict[str, Optional[str]]) -> BatchJob:
+    """把清单中的一行转换为BatchJob
+
+    每行可以使用 video_type + source，也可以直接使用 youtube/local/url 字段（与命令行参数同名）。
+    """
+    row = {k: v for k, v in row.items() if k and v not in (None, '')}
+
+    video_type = row.get('video_type')
+    source = row.get('source')
+    if not source:
+        for key in ('youtube', 'local', 'url', 'network_url'):
+            if row.get(key):
+                video_type, source = key, row[key]
+                break
+    if not source:
+        raise ValueError(f"第{index}行缺少视频地址（source/youtube/local/url）")
+
+    if video_type is None:
+        video_type = _guess_video_type(source)
+    if video_type not in VIDEO_TYPES:
+        raise ValueError(f"第{index}行的video_type无效: {video_type}")
+
+    return BatchJob(
+        job_id=str(row.get('id') or index),
+        video_type=VIDEO_TYPES[video_type],
+        source=source,
+        prompt=row.get('prompt') or defaults.get('prompt'),
+        model=row.get('model') or defaults.get('model') or "gemini-2.5-flash",
+        webhook_url=row.get('webhook') or row.get('webhook_url') or defaults.get('webhook_url'),
+    )
+
+
+def load_manifest(manifest_path: str, defaults: Optional[Dict[str, Optional[str]]] = None) -> Iterator[BatchJob]:
+    """读取批量任务清单
+
+    Args:
+        manifest_path: 清单文件路径，扩展名为.csv时按CSV解析，否则按JSONL解析
+        defaults: 行内未指定时使用的默认值（prompt/model/webhook_url）
+
+    Returns:
+        BatchJob迭代器
+    """
+    defaults = defaults or {}
+    with open(manifest_path, 'r', encoding='utf-8', newline='') as f:
+        if manifest_path.lower().endswith('.csv'):
+            rows = ((index, row) for index, row in enumerate(csv.DictReader(f), start=1))
+        else:
+            rows = ((index, line.strip()) for index, line in enumerate(f, start=1))
+
+        for index, row in rows:
+            if isinstance(row, str):
+                if not row or row.startswith('#'):
+                    continue
+            try:
+                if isinstance(row, str):
+                    row = json.loads(row)
+                yield _row_to_job(row, index, defaults)
+            except (ValueError, AttributeError) as e:
+                yield BatchJob(job_id=str(index), video_type='', source='', error=f"清单行无效: {str(e)}")
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    """计算百分位数（最近秩法）"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, math.ceil(pct / 100.0 * len(ordered)) - 1))
+    return ordered[rank]
+
+
+async def run_job(analyzer, job: BatchJob) -> dict:
+    """执行单个任务并返回结果记录，任务失败不会抛出异常"""
+    started_at = datetime.now().isoformat()
+    start = time.monotonic()
+    record = {
+        "id": job.job_id,
+        "video_type": job.video_type,
+        "source": job.source,
+        "model": job.model,
+        "started_at": started_at,
+    }
+    try:
+        if job.error:
+            raise ValueError(job.error)
+        # 兼容模式（return_error_strings=True）的分析器同样抛出错误，按错误类型记录失败
+        with errors.raising(), hedging.recording_answers() as answers:
+            if job.video_type == 'youtube':
+                result = await analyzer.analyze_youtube_video(
+                    youtube_url=job.source, prompt=job.prompt,
+                    model=job.model, webhook_url=job.webhook_url)
+            elif job.video_type == 'local':
+                if not os.path.exists(job.source):
+                    raise FileNotFoundError(f"文件不存在 - {job.source}")
+                result = await analyzer.analyze_local_video(
+                    video_path=job.source, prompt=job.prompt,
+                    model=job.model, webhook_url=job.webhook_url)
+            else:
+                result = await analyzer.analyze_video_url(
+                    video_url=job.source, prompt=job.prompt,
+                    model=job.model, webhook_url=job.webhook_url)
+
+        record.update(status="ok", result=result)
+        # 实际给出结果的模型（对冲或降级时可能不是job.model；缓存命中时没有）
+        if answers:
+            record["answered_by"] = next(iter(answers.values()))
+    except Exception as e:
+        record.update(status="error", error=str(e), error_type=errors.classify(e).kind)
+
+    record["latency_s"] = round(time.monotonic() - start, 3)
+    record["finished_at"] = datetime.now().isoformat()
+    return record
+
+
+async def run_batch(analyzer, jobs: Iterator[BatchJob], output_path: str, concurrency: int = 4,
+                    journal: Optional[JobJournal] = None) -> dict:
+    """并发执行批量任务，每完成一个任务就写入一行结果
+
+    Args:
+        analyzer: AsyncGeminiVideoAnalyzer实例（所有任务共享）
+        jobs: 任务迭代器
+        output_path: 输出JSONL文件路径
+        concurrency: 最大并发任务数
+        journal: 可选的任务日志；以续跑方式打开时跳过中断前已完成的任务，并复用仍有效的上传
+
+    Returns:
+        汇总统计信息
+    """
+    concurrency = max(1, concurrency)
+    latencies = []
+    counts = {"ok": 0, "error": 0}
+    error_types: Dict[str, int] = {}
+    skipped = 0
+    start = time.monotonic()
+    # 所有worker共享同一个迭代器，按需读取清单，避免一次性把超大清单全部读入内存
+    job_iter = iter(jobs)
+
+    # 批量任务走低优先级通道，交互式请求可以先获得配额
+    with open(output_path, 'a', encoding='utf-8') as out, priority_lane(BULK):
+        async def worker():
+            nonlocal skipped
+            for job in job_iter:
+                if journal is None:
+                    record = await run_job(analyzer, job)
+                else:
+                    if journal.is_complete(job.job_id, job.source):
+                        skipped += 1
+                        continue
+                    journal.mark(job.job_id, job_journal.QUEUED, source=job.source)
+                    with journal.tracking(job.job_id, journal.resumable_upload(job.job_id, job.source)):
+                        record = await run_job(analyzer, job)
+
+                out.write(json.dumps(record, ensure_ascii=False) + '\n')
+                out.flush()
+                if journal is not None:
+                    # 结果写入输出文件后才算完成；失败的任务续跑时重新执行
+                    if record["status"] == "ok":
+                        journal.mark(job.job_id, job_journal.DELIVERED)
+                    else:
+                        journal.mark(job.job_id, job_journal.FAILED, error=record["error"])
+                latencies.append(record["latency_s"])
+                counts[record["status"]] += 1
+                if record["status"] == "ok":
+                    print(f"✓ [{record['id']}] 完成 ({record['latency_s']:.1f}s)")
+                else:
+                    error_type = record.get("error_type", "error")
+                    error_types[error_type] = error_types.get(error_type, 0) + 1
+                    print(f"✗ [{record['id']}] 失败: {record['error']}")
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+    summary = summarize(counts, latencies, time.monotonic() - start)
+    summary.update(coalesced=analyzer.coalescing_stats()["coalesced"], skipped=skipped, error_types=error_types)
+    return summary
+
+
+def summarize(counts: Dict[str, int], latencies: List[float], elapsed: float) -> dict:
+    """根据成功/失败计数和各任务延迟生成汇总统计"""
+    total = counts["ok"] + counts["error"]
+    return {
+        "total": total,
+        "succeeded": counts["ok"],
+        "failed": counts["error"],
+        "elapsed_s": round(elapsed, 3),
+        "throughput_per_min": round(total / elapsed * 60, 2) if elapsed > 0 else 0.0,
+        "latency_p50_s": round(_percentile(latencies, 50), 3),
+        "latency_p95_s": round(_percentile(latencies, 95), 3),
+        "latency_p99_s": round(_percentile(latencies, 99), 3),
+    }
+
+
+def print_summary(summary: dict) -> None:
+    """打印批量运行汇总"""
+    print("\n=== 批量分析汇总 ===")
+    print(f"任务总数: {summary['total']}")
+    print(f"成功: {summary['succeeded']}  失败: {summary['failed']}")
+    print(f"总耗时: {summary['elapsed_s']:.1f}s")
+    print(f"吞吐量: {summary['throughput_per_min']:.2f} 个/分钟")
+    print(f"延迟 p50: {summary['latency_p50_s']:.1f}s  p95: {summary['latency_p95_s']:.1f}s  p99: {summary['latency_p99_s']:.1f}s")
+    if summary.get('error_types'):
+        print("失败类型: " + "  ".join(f"{kind} {count}" for kind, count in sorted(summary['error_types'].items())))
+    if summary.get('skipped'):
+        print(f"跳过（中断前已完成）: {summary['skipped']}")
+    if summary.get('batches'):
+        print(f"批量预测任务: {summary['batches']}  命中缓存: {summary.get('cached', 0)}")
+    if summary.get('coalesced'):
+        print(f"合并的重复请求: {summary['coalesced']}")
@@ -0,0 +1,442 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Gemini视频分析工具 - 离线基准测试
+用本地假Gemini后端（fake_gemini.py，可配置上传速度、处理延迟、生成延迟和错误注入）
+和本地合成视频服务器（支持/不支持Range两种模式）驱动 analyze_youtube_video、
+analyze_local_video、analyze_video_url 和命令行批量模式，在不同并发下测量吞吐量、
+p50/p95/p99延迟、峰值内存和临时磁盘占用，以及命令行的启动耗时（直接运行与经常驻进程），
+结果写入JSON文件，便于发现性能回退
+"""
+
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from aiohttp import web
+
+import batch_runner
+import cli_daemon
+import fake_gemini
+from gemini_video_analyzer import AsyncGeminiVideoAnalyzer
+from hedging import HedgingPolicy
+
+SCENARIOS = ('youtube', 'local', 'url_range', 'url_plain', 'cli')
+
+# 命令行场景的子进程入口：先安装假后端，再运行cli_analyzer
+_CLI_BOOTSTRAP = (
+    "import json, os, sys; sys.path.insert(0, os.getcwd()); import fake_gemini; "
+    "fake_gemini.install(**json.loads(os.environ['GVA_FAKE_GEMINI'])); "
+    "import cli_analyzer; sys.argv[0] = 'cli_analyzer.py'; cli_analyzer.main()"
+)
+
+# 参与回退比较的指标：名称 -> 数值越大越好
+_COMPARED_METRICS = {
+    'throughput_per_min': True,
+    'latency_p95_s': False,
+    'peak_rss_mb': False,
+}
+
+# 参与回退比较的启动耗时指标（越小越好）；sdk_import_s只作参考
+_COMPARED_STARTUP = ('import_analyzer_s', 'cli_help_s', 'cli_single_s', 'cli_single_daemon_s')
+
+
+def make_videos(directory: str, sizes_mb: List[float], seed: int = 0) -> Dict[float, str]:
+    """生成指定大小的合成视频文件（随机字节，内容由种子决定）
+
+    Returns:
+        大小(MB) -> 文件路径
+    """
+    rng = random.Random(seed)
+    videos = {}
+    for size_mb in sizes_mb:
+        path = os.path.join(directory, f"video_{size_mb:g}mb.mp4")
+        remaining = int(size_mb * 1024 * 1024)
+        with open(path, 'wb') as f:
+            while remaining > 0:
+                block = min(remaining, 1024 * 1024)
+                f.write(rng.randbytes(block))
+                remaining -= block
+        videos[size_mb] = path
+    return videos
+
+
+class VideoServer:
+    """在独立线程中运行的本地视频服务器
+
+    /range/<文件名> 支持Range请求（分段并行下载），/plain/<文件名> 不支持（单连接顺序下载）。
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.base_url: Optional[str] = None
+        self._loop = asyncio.new_event_loop()
+        self._runner: Optional[web.AppRunner] = None
+
+    def _path(self, request: web.Request) -> str:
+        path = os.path.join(self.directory, os.path.basename(request.match_info['name']))
+        if not os.path.isfile(path):
+            raise web.HTTPNotFound()
+        return path
+
+    async def _handle_range(self, request: web.Request) -> web.StreamResponse:
+        return web.FileResponse(self._path(request))
+
+    async def _handle_plain(self, request: web.Request) -> web.StreamResponse:
+        path = self._path(request)
+        response = web.StreamResponse(headers={'Content-Type': 'video/mp4'})
+        response.content_length = os.path.getsize(path)
+        await response.prepare(request)
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(256 * 1024), b''):
+                await response.write(block)
+        await response.write_eof()
+        return response
+
+    async def _start(self) -> None:
+        app = web.Application()
+        app.router.add_get('/range/{name}', self._handle_range)
+        app.router.add_get('/plain/{name}', self._handle_plain)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, '127.0.0.1', 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.base_url = f"http://127.0.0.1:{port}"
+
+    def start(self) -> str:
+        """启动服务器，返回基础地址"""
+        threading.Thread(target=self._loop.run_forever, name="benchmark-video-server", daemon=True).start()
+        asyncio.run_coroutine_threadsafe(self._start(), self._loop).result()
+        return self.base_url
+
+    def stop(self) -> None:
+        asyncio.run_coroutine_threadsafe(self._runner.cleanup(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+
+
+def _rss_bytes(pid: Optional[int] = None) -> int:
+    """读取进程当前的常驻内存（Linux读/proc，其他平台退回到ru_maxrss）"""
+    try:
+        with open(f"/proc/{pid or 'self'}/status", 'r') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN if pid else resource.RUSAGE_SELF)
+    # macOS上ru_maxrss单位是字节，Linux上是KB
+    return usage.ru_maxrss if sys.platform == 'darwin' else usage.ru_maxrss * 1024
+
+
+def _dir_size(directory: str) -> int:
+    total = 0
+    for root, _, files in os.walk(directory):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+class ResourceSampler:
+    """后台线程定期采样内存和临时目录占用，记录峰值"""
+
+    def __init__(self, temp_dir: str, pid: Optional[int] = None, interval: float = 0.05):
+        self.temp_dir = temp_dir
+        self.pid = pid
+        self.interval = interval
+        self.peak_rss = 0
+        self.peak_temp = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="benchmark-sampler", daemon=True)
+
+    def _sample(self) -> None:
+        self.peak_rss = max(self.peak_rss, _rss_bytes(self.pid))
+        self.peak_temp = max(self.peak_temp, _dir_size(self.temp_dir))
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self._sample()
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self._sample()
+
+
+def build_jobs(scenario: str, count: int, videos: Dict[float, str], base_url: Optional[str]) -> List[batch_runner.BatchJob]:
+    """生成一个场景的任务；每个任务使用不同的提示词，避免被结果缓存或请求合并跳过"""
+    jobs = []
+    paths = list(videos.values())
+    for i in range(count):
+        path = paths[i % len(paths)]
+        if scenario == 'youtube':
+            video_type, source = 'youtube', f"https://www.youtube.com/watch?v=bench{i:06d}"
+        elif scenario in ('local', 'cli'):
+            video_type, source = 'local', path
+        else:
+            mode = 'range' if scenario == 'url_range' else 'plain'
+            video_type, source = 'url', f"{base_url}/{mode}/{os.path.basename(path)}"
+        jobs.append(batch_runner.BatchJob(
+            job_id=str(i), video_type=video_type, source=source, prompt=f"基准测试任务 {i}"))
+    return jobs
+
+
+def _read_latencies(output_path: str) -> List[float]:
+    latencies = []
+    with open(output_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            latencies.append(json.loads(line)["latency_s"])
+    return latencies
+
+
+async def run_in_process(jobs: List[batch_runner.BatchJob], concurrency: int, output_path: str,
+                         download_connections: int, hedge_percentile: Optional[float] = None) -> dict:
+    """在当前进程中用AsyncGeminiVideoAnalyzer执行一组任务（不启用缓存和上传复用）"""
+    # 任务数不多，延迟样本攒到5个就开始按分位数对冲
+    policy = HedgingPolicy(hedge_percentile, min_samples=5) if hedge_percentile is not None else None
+    async with AsyncGeminiVideoAnalyzer('fake', download_connections=download_connections,
+                                        hedging_policy=policy) as analyzer:
+        return await batch_runner.run_batch(analyzer, jobs, output_path, concurrency=concurrency)
+
+
+def run_cli(jobs: List[batch_runner.BatchJob], concurrency: int, output_path: str, work_dir: str,
+            temp_dir: str, fake_options: dict, hedge_percentile: Optional[float] = None) -> dict:
+    """以子进程运行命令行批量模式，测量包括进程启动在内的整体耗时"""
+    manifest = os.path.join(work_dir, 'cli_manifest.jsonl')
+    with open(manifest, 'w', encoding='utf-8') as f:
+        for job in jobs:
+            f.write(json.dumps({'id': job.job_id, 'local': job.source, 'prompt': job.prompt}, ensure_ascii=False) + '\n')
+
+    env = dict(os.environ, GVA_FAKE_GEMINI=json.dumps(fake_options), TMPDIR=temp_dir,
+               HOME=work_dir, GOOGLE_AI_API_KEY='fake')
+    command = [sys.executable, '-c', _CLI_BOOTSTRAP, '--batch', manifest, '--concurrency', str(concurrency),
+               '--output', output_path, '--no-cache', '--no-upload-reuse', '--no-webhook-outbox']
+    if hedge_percentile is not None:
+        command += ['--hedge-percentile', str(hedge_percentile)]
+    start = time.monotonic()
+    process = subprocess.Popen(command, cwd=os.path.dirname(os.path.abspath(__file__)), env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    with ResourceSampler(temp_dir, pid=process.pid) as sampler:
+        _, stderr = process.communicate()
+    elapsed = time.monotonic() - start
+    if process.returncode != 0:
+        raise RuntimeError(f"命令行子进程失败: {stderr.decode('utf-8', 'replace')[-500:]}")
+
+    latencies = _read_latencies(output_path)
+    succeeded = sum(1 for line in open(output_path, encoding='utf-8') if json.loads(line)["status"] == "ok")
+    summary = batch_runner.summarize({"ok": succeeded, "error": len(latencies) - succeeded}, latencies, elapsed)
+    summary["peak_rss_mb"] = round(sampler.peak_rss / (1024 * 1024), 1)
+    summary["peak_temp_disk_mb"] = round(sampler.peak_temp / (1024 * 1024), 1)
+    return summary
+
+
+def _median_wall_time(command: List[str], runs: int, env: Optional[dict] = None) -> float:
+    """多次运行命令，返回墙钟耗时的中位数（秒）"""
+    timings = []
+    for _ in range(runs):
+        start = time.monotonic()
+        subprocess.run(command, cwd=os.path.dirname(os.path.abspath(__file__)), env=env, check=True,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        timings.append(time.monotonic() - start)
+    return round(batch_runner._percentile(timings, 50), 3)
+
+
+def measure_startup(runs: int, video_path: str, work_dir: str) -> dict:
+    """测量命令行启动耗时：导入分析器、--help、单个视频直接运行与经常驻进程运行（假后端无延迟）"""
+    env = dict(os.environ, GVA_FAKE_GEMINI=json.dumps({'processing_delay': 0, 'generate_latency': 0}),
+               HOME=work_dir, GOOGLE_AI_API_KEY='fake')
+    single = ['--local', video_path, '--no-cache', '--no-upload-reuse', '--no-webhook-outbox']
+    startup = {
+        "sdk_import_s": _median_wall_time([sys.executable, '-c', 'import google.generativeai'], runs),
+        "import_analyzer_s": _median_wall_time([sys.executable, '-c', 'import gemini_video_analyzer'], runs),
+        "cli_help_s": _median_wall_time([sys.executable, 'cli_analyzer.py', '--help'], runs),
+        "cli_single_s": _median_wall_time([sys.executable, '-c', _CLI_BOOTSTRAP] + single, runs, env),
+    }
+
+    socket_path = os.path.join(work_dir, 'cli.sock')
+    daemon = subprocess.Popen([sys.executable, '-c', _CLI_BOOTSTRAP, '--daemon', '--daemon-socket', socket_path],
+                              cwd=os.path.dirname(os.path.abspath(__file__)), env=env,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        deadline = time.monotonic() + 30
+        while cli_daemon.run_client(socket_path, None) is None:
+            if daemon.poll() is not None or time.monotonic() > deadline:
+                raise RuntimeError("常驻进程启动失败")
+            time.sleep(0.05)
+        startup["cli_single_daemon_s"] = _median_wall_time(
+            [sys.executable, 'cli_analyzer.py', '--use-daemon', '--daemon-socket', socket_path] + single, runs, env)
+    finally:
+        daemon.terminate()
+        daemon.wait()
+    return startup
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> List[str]:
+    """与基线结果比较，返回超过容差的回退项"""
+    previous = {(s['scenario'], s['concurrency']): s for s in baseline.get('scenarios', [])}
+    regressions = []
+    old_startup, new_startup = baseline.get('startup') or {}, results.get('startup') or {}
+    for metric in _COMPARED_STARTUP:
+        before, after = old_startup.get(metric), new_startup.get(metric)
+        if before and after is not None and (after - before) / before > tolerance:
+            regressions.append(f"启动 {metric}: {before} -> {after} ({(after - before) / before:+.0%})")
+    for current in results['scenarios']:
+        old = previous.get((current['scenario'], current['concurrency']))
+        if old is None:
+            continue
+        for metric, higher_is_better in _COMPARED_METRICS.items():
+            before, after = old.get(metric), current.get(metric)
+            if not before or after is None:
+                continue
+            change = (after - before) / before
+            if (higher_is_better and change < -tolerance) or (not higher_is_better and change > tolerance):
+                regressions.append(
+                    f"{current['scenario']} (并发{current['concurrency']}) {metric}: {before} -> {after} ({change:+.0%})")
+    return regressions
+
+
+def main():
+    """运行基准测试"""
+    parser = argparse.ArgumentParser(
+        description='Gemini视频分析工具离线基准测试（不消耗API配额）',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+使用示例:
+  python benchmark.py --jobs 50 --concurrency 1 8 32 --output bench.json
+  python benchmark.py --scenarios local url_range --video-sizes 5 50 --upload-speed 50
+  python benchmark.py --error-rate 0.05 --rate-limit-rate 0.1
+  python benchmark.py --baseline bench_main.json --tolerance 0.2
+        """
+    )
+    parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS, default=list(SCENARIOS),
+                        help='要运行的场景（默认全部）')
+    parser.add_argument('--concurrency', nargs='+', type=int, default=[1, 8, 32], help='并发数列表（默认: 1 8 32）')
+    parser.add_argument('--jobs', type=int, default=40, help='每个场景每个并发下的任务数（默认: 40）')
+    parser.add_argument('--video-sizes', nargs='+', type=float, default=[2, 20],
+                        help='合成视频大小（MB，默认: 2 20）')
+    parser.add_argument('--download-connections', type=int, default=4, help='网络视频的分段下载连接数（默认: 4）')
+    parser.add_argument('--processing-delay', type=float, default=0.5, help='假后端文件处理时间（秒，默认: 0.5）')
+    parser.add_argument('--generate-latency', type=float, default=1.0, help='假后端生成延迟（秒，默认: 1.0）')
+    parser.add_argument('--latency-jitter', type=float, default=0.2, help='生成延迟的随机浮动比例（默认: 0.2）')
+    parser.add_argument('--upload-speed', type=float, help='假后端上传速度（MB/s，默认不限速）')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='生成请求随机失败的概率（默认: 0）')
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0, help='生成请求随机返回429的概率（默认: 0）')
+    parser.add_argument('--upload-error-rate', type=float, default=0.0, help='上传随机失败的概率（默认: 0）')
+    parser.add_argument('--tail-rate', type=float, default=0.0, help='生成请求落入长尾（卡住）的概率（默认: 0）')
+    parser.add_argument('--tail-latency', type=float, default=30.0, help='长尾请求的延迟（秒，默认: 30）')
+    parser.add_argument('--hedge-percentile', type=float, help='按该延迟分位数发出对冲请求（默认不对冲）')
+    parser.add_argument('--seed', type=int, default=0, help='随机数种子（默认: 0）')
+    parser.add_argument('--output', '-o', default='benchmark_results.json', help='结果文件（默认: benchmark_results.json）')
+    parser.add_argument('--baseline', help='与之比较的历史结果文件，出现回退时以非零状态退出')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='回退判定的相对容差（默认: 0.2）')
+    parser.add_argument('--startup-runs', type=int, default=5, help='启动耗时每项测量的运行次数，0表示不测（默认: 5）')
+    parser.add_argument('--verbose', action='store_true', help='显示分析过程的输出')
+    args = parser.parse_args()
+
+    fake_options = {
+        'processing_delay': args.processing_delay,
+        'generate_latency': args.generate_latency,
+        'latency_jitter': args.latency_jitter,
+        'upload_speed': args.upload_speed * 1024 * 1024 if args.upload_speed else None,
+        'error_rate': args.error_rate,
+        'rate_limit_rate': args.rate_limit_rate,
+        'upload_error_rate': args.upload_error_rate,
+        'tail_rate': args.tail_rate,
+        'tail_latency': args.tail_latency,
+        'seed': args.seed,
+    }
+
+    work_dir = tempfile.mkdtemp(prefix='gva-bench-')
+    video_dir = os.path.join(work_dir, 'videos')
+    temp_dir = os.path.join(work_dir, 'tmp')
+    os.makedirs(video_dir)
+    os.makedirs(temp_dir)
+    # 下载的临时文件和续传文件都写到单独的目录，便于统计临时磁盘占用
+    tempfile.tempdir = temp_dir
+
+    print(f"生成合成视频: {', '.join(f'{s:g}MB' for s in args.video_sizes)}")
+    videos = make_videos(video_dir, args.video_sizes, seed=args.seed)
+    server = VideoServer(video_dir)
+    base_url = server.start()
+
+    results = {
+        "started_at": datetime.now().isoformat(),
+        "python": sys.version.split()[0],
+        "config": {k: v for k, v in vars(args).items() if k not in ('output', 'baseline', 'verbose')},
+        "scenarios": [],
+    }
+    try:
+        for scenario in args.scenarios:
+            for concurrency in args.concurrency:
+                jobs = build_jobs(scenario, args.jobs, videos, base_url)
+                output_path = os.path.join(work_dir, f"{scenario}_{concurrency}.jsonl")
+                print(f"▶ {scenario} 并发 {concurrency}，{len(jobs)} 个任务...", flush=True)
+
+                if scenario == 'cli':
+                    summary = run_cli(jobs, concurrency, output_path, work_dir, temp_dir, fake_options,
+                                      args.hedge_percentile)
+                else:
+                    backend = fake_gemini.install(**fake_options)
+                    quiet = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(open(os.devnull, 'w'))
+                    with quiet, ResourceSampler(temp_dir) as sampler:
+                        summary = asyncio.run(run_in_process(jobs, concurrency, output_path, args.download_connections,
+                                                             args.hedge_percentile))
+                    summary["peak_rss_mb"] = round(sampler.peak_rss / (1024 * 1024), 1)
+                    summary["peak_temp_disk_mb"] = round(sampler.peak_temp / (1024 * 1024), 1)
+                    summary["fake_calls"] = dict(backend.calls)
+                    summary["injected_errors"] = dict(backend.injected)
+
+                summary.update(scenario=scenario, concurrency=concurrency)
+                results["scenarios"].append(summary)
+                print(f"  吞吐量 {summary['throughput_per_min']:.1f}/分钟  p50 {summary['latency_p50_s']:.2f}s  "
+                      f"p95 {summary['latency_p95_s']:.2f}s  p99 {summary['latency_p99_s']:.2f}s  "
+                      f"失败 {summary['failed']}  峰值内存 {summary['peak_rss_mb']}MB  "
+                      f"临时磁盘 {summary['peak_temp_disk_mb']}MB")
+        if args.startup_runs > 0:
+            print(f"▶ 启动耗时，每项 {args.startup_runs} 次...", flush=True)
+            startup = measure_startup(args.startup_runs, videos[min(videos)], work_dir)
+            results["startup"] = startup
+            print(f"  导入SDK {startup['sdk_import_s']:.2f}s  导入分析器 {startup['import_analyzer_s']:.2f}s  "
+                  f"--help {startup['cli_help_s']:.2f}s  单个视频 {startup['cli_single_s']:.2f}s  "
+                  f"经常驻进程 {startup['cli_single_daemon_s']:.2f}s")
+    finally:
+        server.stop()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    print(f"✓ 结果已写入: {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print("✗ 发现性能回退:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print("✓ 与基线相比没有超过容差的回退")
+
+
+if __name__ == "__main__":
+    main()
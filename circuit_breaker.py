@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+按模型/接口的熔断器
+连续出现若干次后端故障（临时故障或配额耗尽）后打开熔断器，之后的请求不再发送而是立即以
+CircuitOpenError失败，排队中的任务不会逐个等待超时；冷却时间过后放行一个试探请求（半开），
+成功则关闭熔断器，失败则重新打开
+"""
+
+import time
+from typing import Dict, Optional
+
+from errors import AnalysisError, CircuitOpenError
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class _Circuit:
+    """一个模型或接口的熔断状态"""
+
+    def __init__(self):
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probing = False
+
+
+class CircuitBreaker:
+    """按键（模型名称或接口）分别熔断"""
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        """初始化熔断器
+
+        Args:
+            failure_threshold: 连续多少次后端故障后打开熔断器
+            reset_timeout: 打开后经过多少秒放行试探请求
+        """
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self.rejected = 0
+        self._circuits: Dict[str, _Circuit] = {}
+
+    def _circuit(self, key: str) -> _Circuit:
+        return self._circuits.setdefault(key, _Circuit())
+
+    def state(self, key: str) -> str:
+        """key当前的熔断状态（closed / open / half_open）"""
+        circuit = self._circuits.get(key)
+        return circuit.state if circuit is not None else CLOSED
+
+    def check(self, key: str, stage: Optional[str] = None) -> None:
+        """发送请求前调用：熔断器打开时抛出CircuitOpenError
+
+        冷却时间过后第一个调用成为试探请求，其余调用在试探结束前仍然立即失败。
+        """
+        circuit = self._circuit(key)
+        if circuit.state == CLOSED:
+            return
+        now = time.monotonic()
+        if circuit.state == OPEN and now - circuit.opened_at >= self.reset_timeout:
+            circuit.state = HALF_OPEN
+        if circuit.state == HALF_OPEN and not circuit.probing:
+            circuit.probing = True
+            return
+        self.rejected += 1
+        remaining = max(0.0, self.reset_timeout - (now - circuit.opened_at))
+        raise CircuitOpenError(f"{key} 暂时不可用（熔断中，约 {remaining:.0f} 秒后试探恢复）", stage)
+
+    def record_success(self, key: str) -> None:
+        """请求成功（或后端正常响应了错误，如输入无效）"""
+        circuit = self._circuit(key)
+        if circuit.state != CLOSED:
+            print(f"✓ {key} 已恢复，关闭熔断器")
+        circuit.state = CLOSED
+        circuit.failures = 0
+        circuit.probing = False
+
+    def record_failure(self, key: str, error: AnalysisError) -> None:
+        """请求失败：后端故障计入连续失败次数，达到阈值（或试探失败）时打开熔断器"""
+        if not error.backend_failure:
+            self.record_success(key)
+            return
+        circuit = self._circuit(key)
+        circuit.failures += 1
+        if circuit.state == HALF_OPEN or circuit.failures >= self.failure_threshold:
+            if circuit.state != OPEN:
+                print(f"✗ {key} 连续失败 {circuit.failures} 次，打开熔断器 {self.reset_timeout:g} 秒")
+            circuit.state = OPEN
+            circuit.opened_at = time.monotonic()
+            circuit.probing = False
+
+    def abandon(self, key: str) -> None:
+        """请求被取消、没有结果时调用，允许下一个请求重新试探"""
+        circuit = self._circuits.get(key)
+        if circuit is not None:
+            circuit.probing = False
+
+    def stats(self) -> dict:
+        """各键的熔断状态和被拒绝的请求数"""
+        return {
+            "rejected": self.rejected,
+            "circuits": {key: circuit.state for key, circuit in self._circuits.items()},
+        }
@@ -2,16 +2,215 @@
 # -*- coding: utf-8 -*-
 """
 Gemini视频分析工具 - 命令行版本
-支持通过命令行参数传入prompt、YouTube地址和webhook
+支持通过命令行参数传入prompt、YouTube地址和webhook，也支持通过清单文件批量分析；
+query 子命令查询本地结果库
 """
 
 import argparse
+import asyncio
+import json
 import os
 import sys
-from gemini_video_analyzer import GeminiVideoAnalyzer
+import time
+import unicodedata
+from typing import Optional
+import batch_runner
+import cli_daemon
+import errors
+import hedging
+import media_presets
+import retry_policy
+from circuit_breaker import CircuitBreaker
+from job_journal import JobJournal
+from result_cache import ResultCache
+from result_store import DEFAULT_STORE_PATH, ResultStore, guess_video_id, parse_time
+from metrics import Metrics
+from rate_limiter import Quota, RateLimiter
+from upload_registry import UploadRegistry
+from webhook_outbox import WebhookOutbox
 
-def main():
-    """主函数 - 支持命令行参数"""
+# gemini_video_analyzer、batch_prediction、webhook_dispatcher 依赖aiohttp等较重的模块，
+# 在确定要执行分析时才导入，--help和参数错误可以立即返回
+
+def _preload():
+    """常驻进程启动时导入所有模块并预热Gemini SDK"""
+    import lazy_import
+    import batch_prediction  # noqa: F401
+    import gemini_video_analyzer
+    import webhook_dispatcher  # noqa: F401
+    lazy_import.load(gemini_video_analyzer.genai)
+
+async def _run_batch(api_key: str, jobs, output_path: str, concurrency: int,
+                     journal: Optional[JobJournal] = None, **options) -> dict:
+    """使用异步分析器执行批量任务"""
+    from gemini_video_analyzer import AsyncGeminiVideoAnalyzer
+    async with AsyncGeminiVideoAnalyzer(api_key, **options) as analyzer:
+        await analyzer.replay_webhooks()
+        return await batch_runner.run_batch(analyzer, jobs, output_path, concurrency=concurrency, journal=journal)
+
+async def _run_batch_prediction(api_key: str, jobs, output_path: str, concurrency: int, backend_name: str,
+                                poll_interval: float, max_batch_size: int, **options) -> dict:
+    """以离线批量预测方式执行批量任务"""
+    import batch_prediction
+    from gemini_video_analyzer import AsyncGeminiVideoAnalyzer
+    if backend_name == 'local':
+        backend = batch_prediction.LocalBatchBackend(delay=min(poll_interval, 1.0))
+    else:
+        backend = batch_prediction.GeminiBatchBackend(api_key)
+    try:
+        async with AsyncGeminiVideoAnalyzer(api_key, **options) as analyzer:
+            await analyzer.replay_webhooks()
+            return await batch_prediction.run_batch_prediction(
+                analyzer, jobs, output_path, backend, concurrency=concurrency,
+                poll_interval=poll_interval, max_batch_size=max_batch_size)
+    finally:
+        await backend.close()
+
+def load_prompts_file(path: str) -> list:
+    """读取提示词文件
+
+    扩展名为.json时读取字符串数组；否则按文本读取，多个提示词之间用单独一行的 --- 分隔。
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        content = f.read()
+    if path.lower().endswith('.json'):
+        prompts = json.loads(content)
+    else:
+        blocks, current = [], []
+        for line in content.splitlines():
+            if line.strip() == '---':
+                blocks.append('\n'.join(current))
+                current = []
+            else:
+                current.append(line)
+        blocks.append('\n'.join(current))
+        prompts = blocks
+    return [p.strip() for p in prompts if p and p.strip()]
+
+def parse_quota(spec: str):
+    """解析 --quota 参数，格式为 模型=每分钟请求数[/每分钟token数]
+
+    Returns:
+        (模型名称, Quota)
+    """
+    model, sep, limits = spec.partition('=')
+    if not sep or not model.strip():
+        raise argparse.ArgumentTypeError(f"配额格式应为 模型=RPM[/TPM]: {spec}")
+    rpm, _, tpm = limits.partition('/')
+    try:
+        return model.strip(), Quota(rpm=float(rpm) if rpm else None, tpm=float(tpm) if tpm else None)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"配额必须是数字: {spec}")
+
+def _parse_clip(spec: str):
+    """解析 --clip START-END"""
+    try:
+        return media_presets.parse_clip(spec)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+def _short(text: str, limit: int = 40) -> str:
+    """截断较长的提示词用于显示"""
+    text = ' '.join(text.split())
+    return text if len(text) <= limit else text[:limit] + '...'
+
+def _parse_time(text: str) -> float:
+    """解析 --since / --until"""
+    try:
+        return parse_time(text)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+def _width(text: str) -> int:
+    """终端显示宽度（中文等全角字符占两列）"""
+    return sum(2 if unicodedata.east_asian_width(c) in 'WF' else 1 for c in text)
+
+def _print_table(rows: list) -> None:
+    """按列对齐打印查询结果"""
+    if not rows:
+        print("（没有匹配的结果）")
+        return
+    columns = list(rows[0])
+    cells = [[_short('' if row[c] is None else str(row[c]), 60) for c in columns] for row in rows]
+    widths = [max(_width(c), *(_width(line[i]) for line in cells)) for i, c in enumerate(columns)]
+    for line in [columns] + cells:
+        print('  '.join(text + ' ' * (width - _width(text)) for text, width in zip(line, widths)).rstrip())
+
+def query_main(argv: list) -> None:
+    """query 子命令：查询本地结果库
+
+    Args:
+        argv: query之后的命令行参数
+    """
+    parser = argparse.ArgumentParser(
+        prog='cli_analyzer.py query',
+        description='查询本地结果库中的分析结果，或按品牌、赞助判断汇总',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+使用示例:
+  python cli_analyzer.py query --brand Apple --min-sentiment 4 --since 7d
+  python cli_analyzer.py query --stats brands --since 30d --model gemini-2.5-pro
+  python cli_analyzer.py query --stats sponsorship --brand Samsung
+  python cli_analyzer.py query --search "续航" --sponsorship 明确赞助 --json
+        """
+    )
+    parser.add_argument('--db', default=DEFAULT_STORE_PATH, metavar='PATH',
+                        help=f'结果库路径（默认: {DEFAULT_STORE_PATH}）')
+    parser.add_argument('--brand', help='只看提及该品牌的结果（不区分大小写）')
+    parser.add_argument('--min-sentiment', type=float, metavar='N', help='品牌好感度下限（1-5）')
+    parser.add_argument('--max-sentiment', type=float, metavar='N', help='品牌好感度上限（1-5）')
+    parser.add_argument('--since', type=_parse_time, metavar='TIME',
+                        help='起始时间：相对时间（如 7d、12h）或日期（如 2026-10-01）')
+    parser.add_argument('--until', type=_parse_time, metavar='TIME', help='截止时间，格式同--since')
+    parser.add_argument('--model', help='只看该模型的结果')
+    parser.add_argument('--sponsorship', choices=['明确赞助', '可能合作', '无赞助'], help='只看该赞助判断的结果')
+    parser.add_argument('--search', metavar='TEXT', help='在报告全文中搜索（中文至少3个字）')
+    parser.add_argument('--video', metavar='VIDEO', help='只看某个视频（YouTube链接、网络链接或本地路径）')
+    parser.add_argument('--stats', choices=['brands', 'sponsorship'],
+                        help='汇总而不是列出结果：brands 按品牌，sponsorship 按赞助判断')
+    parser.add_argument('--limit', type=int, default=50, help='最多输出的行数（默认: 50）')
+    parser.add_argument('--json', action='store_true', help='以JSON Lines输出')
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.db):
+        print(f"错误: 结果库不存在 - {args.db}")
+        sys.exit(1)
+    filters = {
+        'brand': args.brand,
+        'min_sentiment': args.min_sentiment,
+        'max_sentiment': args.max_sentiment,
+        'since': args.since,
+        'until': args.until,
+        'model': args.model,
+        'sponsorship': args.sponsorship,
+        'search': args.search,
+        'video': guess_video_id(args.video) if args.video else None,
+    }
+    store = ResultStore(args.db)
+    try:
+        start = time.perf_counter()
+        if args.stats == 'brands':
+            rows = store.brand_stats(limit=args.limit, **filters)
+        elif args.stats == 'sponsorship':
+            rows = store.sponsorship_stats(**filters)
+        else:
+            rows = store.find(limit=args.limit, **filters)
+        elapsed = (time.perf_counter() - start) * 1000
+    finally:
+        store.close()
+    if args.json:
+        for row in rows:
+            print(json.dumps(row, ensure_ascii=False))
+    else:
+        _print_table(rows)
+        print(f"\n共 {len(rows)} 行，查询耗时 {elapsed:.1f} ms")
+
+def main(argv: Optional[list] = None):
+    """主函数 - 支持命令行参数
+
+    Args:
+        argv: 命令行参数（不含程序名），默认取sys.argv
+    """
     parser = argparse.ArgumentParser(
         description='Gemini视频分析工具 - 支持YouTube视频、本地视频和网络视频链接分析',
         formatter_class=argparse.RawDescriptionHelpFormatter,
@@ -21,6 +220,16 @@ def main():
   python cli_analyzer.py --prompt "总结视频要点" --youtube "https://www.youtube.com/watch?v=dQw4w9WgXcQ" --webhook "https://webhook.site/your-id"
   python cli_analyzer.py --prompt "分析视频" --local "/path/to/video.mp4" --webhook "https://your-webhook.com/endpoint"
   python cli_analyzer.py --prompt "分析网络视频" --url "https://example.com/video.mp4" --webhook "https://your-webhook.com/endpoint"
+  python cli_analyzer.py --youtube "https://www.youtube.com/watch?v=dQw4w9WgXcQ" --prompt "总结视频要点" --prompt "列出出现的所有产品"
+  python cli_analyzer.py --batch jobs.jsonl --concurrency 8 --output results.jsonl
+  python cli_analyzer.py --batch jobs.jsonl --concurrency 8 --output results.jsonl --resume
+  python cli_analyzer.py --batch jobs.jsonl --batch-prediction --output results.jsonl
+  python cli_analyzer.py --youtube "https://www.youtube.com/watch?v=dQw4w9WgXcQ" --stream
+  python cli_analyzer.py --youtube "https://www.youtube.com/watch?v=dQw4w9WgXcQ" --preset fast --clip 0-600
+  python cli_analyzer.py --local "/path/to/video.mp4" --token-budget 200000
+  python cli_analyzer.py query --brand Apple --since 7d --stats brands
+  python cli_analyzer.py --daemon &
+  python cli_analyzer.py --use-daemon --youtube "https://www.youtube.com/watch?v=dQw4w9WgXcQ"
         """
     )
     
@@ -28,11 +237,26 @@ def main():
     parser.add_argument(
         '--prompt', '-p',
         required=False,
-        help='分析提示词（可选，如果不提供则使用默认的YouTube科技视频分析提示词）'
+        action='append',
+        help='分析提示词（可选，可重复指定多次，对同一视频并行执行；不提供则使用默认的YouTube科技视频分析提示词）'
+    )
+    parser.add_argument(
+        '--prompts-file',
+        help='提示词文件（JSON字符串数组，或用单独一行 --- 分隔的文本），与--prompt合并使用'
+    )
+    parser.add_argument(
+        '--structured',
+        action='store_true',
+        help='结构化报告模式：要求Gemini按固定结构输出JSON并校验，输出紧凑JSON（与--prompt同时使用时作为其中一个提示词）'
+    )
+    parser.add_argument(
+        '--markdown',
+        action='store_true',
+        help='把结构化报告渲染为与默认报告相同格式的Markdown后输出（需要--structured，不支持流式输出）'
     )
     
-    # 视频源参数（三选一）
-    video_group = parser.add_mutually_exclusive_group(required=True)
+    # 视频源参数（四选一，启动常驻进程时不需要）
+    video_group = parser.add_mutually_exclusive_group()
     video_group.add_argument(
         '--youtube', '-y',
         help='YouTube视频链接'
@@ -45,12 +269,59 @@ def main():
         '--url', '-u',
         help='网络视频链接（非YouTube）'
     )
+    video_group.add_argument(
+        '--batch', '-b',
+        metavar='MANIFEST',
+        help='批量任务清单（JSONL或CSV，每行包含source/prompt/model/webhook等字段）'
+    )
     
     # 可选参数
     parser.add_argument(
         '--webhook', '-w',
         help='Webhook地址（可选）'
     )
+    parser.add_argument(
+        '--rpm',
+        type=float,
+        help='每个模型每分钟最多发起的生成请求数（默认不限制，收到429时自动暂停重试）'
+    )
+    parser.add_argument(
+        '--tpm',
+        type=float,
+        help='每个模型每分钟最多消耗的token数（默认不限制）'
+    )
+    parser.add_argument(
+        '--quota',
+        type=parse_quota,
+        action='append',
+        metavar='MODEL=RPM[/TPM]',
+        help='为单个模型（或文件上传files）设置配额，可重复使用，例如 gemini-2.5-pro=150/2000000'
+    )
+    parser.add_argument(
+        '--metrics-file',
+        help='结束时把分阶段耗时、token用量等指标以Prometheus文本格式写入该文件'
+    )
+    parser.add_argument(
+        '--job-log',
+        help='把每次分析的分阶段耗时和token用量以JSON Lines追加写入该文件'
+    )
+    parser.add_argument(
+        '--webhook-batch',
+        type=int,
+        default=1,
+        help='把同一webhook地址的最多N条结果合并为一个JSON数组发送（默认: 1，即逐条发送）'
+    )
+    parser.add_argument(
+        '--webhook-batch-ms',
+        type=int,
+        default=500,
+        help='批量发送webhook时未攒满一批最多等待的毫秒数（默认: 500）'
+    )
+    parser.add_argument(
+        '--no-webhook-outbox',
+        action='store_true',
+        help='不把webhook先写入本地发件箱（投递失败的结果不会在下次启动时重新投递）'
+    )
     parser.add_argument(
         '--model', '-m',
         default='gemini-2.5-flash',
@@ -60,8 +331,201 @@ def main():
         '--api-key', '-k',
         help='Google AI API密钥（可选，优先使用环境变量GOOGLE_AI_API_KEY）'
     )
+    parser.add_argument(
+        '--concurrency', '-c',
+        type=int,
+        default=4,
+        help='批量模式下的最大并发任务数（默认: 4，单进程可设置到数百）'
+    )
+    parser.add_argument(
+        '--output', '-o',
+        default='batch_results.jsonl',
+        help='批量模式下的结果输出文件（JSONL，默认: batch_results.jsonl）'
+    )
+    parser.add_argument(
+        '--journal',
+        help='批量模式下的任务日志（默认: 输出文件名加 .journal），记录每个任务的阶段用于续跑'
+    )
+    parser.add_argument(
+        '--resume',
+        action='store_true',
+        help='批量模式下按任务日志续跑：跳过中断前已完成的任务，复用仍有效的上传'
+    )
+    parser.add_argument(
+        '--batch-prediction',
+        action='store_true',
+        help='批量模式下改用离线批量预测：打包提交、定期查询，适合不要求时效的大批量任务'
+    )
+    parser.add_argument(
+        '--batch-backend',
+        choices=['gemini', 'local'],
+        default='gemini',
+        help='离线批量预测的后端：gemini（batchGenerateContent）或 local（本地替身，用于测试，默认: gemini）'
+    )
+    parser.add_argument(
+        '--batch-poll',
+        type=float,
+        default=60,
+        help='离线批量预测查询状态的间隔（秒，默认: 60）'
+    )
+    parser.add_argument(
+        '--batch-size',
+        type=int,
+        default=1000,
+        help='离线批量预测每次提交的最大请求数（默认: 1000）'
+    )
+    parser.add_argument(
+        '--download-connections',
+        type=int,
+        default=4,
+        help='下载网络视频时的并发分段连接数（默认: 4，服务器不支持Range时自动使用单连接）'
+    )
+    parser.add_argument(
+        '--stream-upload',
+        action='store_true',
+        help='网络视频边下载边上传到Gemini，不先完整下载到本地临时文件'
+    )
+    parser.add_argument(
+        '--processing-timeout',
+        type=float,
+        help='等待上传的视频处理完成的最长时间（秒，默认按文件大小估算）'
+    )
+    parser.add_argument(
+        '--stream',
+        action='store_true',
+        help='流式输出：生成的文本一到达就打印，不等待整份报告完成（不支持批量模式和多个提示词）'
+    )
+    parser.add_argument(
+        '--progressive-webhook',
+        action='store_true',
+        help='流式分析时报告每完成一个章节就先推送一次章节事件，最后再推送完整结果（隐含--stream）'
+    )
+    parser.add_argument(
+        '--segment-seconds',
+        type=float,
+        help='长视频分段分析：时长超过该值的视频按此长度的时间窗口并行分析后合并（默认整段分析）'
+    )
+    parser.add_argument(
+        '--segment-overlap',
+        type=float,
+        default=30,
+        help='相邻分段窗口的重叠秒数（默认: 30）'
+    )
+    parser.add_argument(
+        '--preset',
+        choices=list(media_presets.PRESETS) + [media_presets.AUTO],
+        help='视频采样预设：fast（低分辨率，每4秒1帧）/ balanced（低分辨率，每秒1帧）/ full（默认采样）'
+             ' / auto（按--token-budget自动选择）'
+    )
+    parser.add_argument(
+        '--token-budget',
+        type=int,
+        help='每次请求的输入token预算，分析前用count_tokens预估并选择不超过预算的预设（隐含--preset auto）'
+    )
+    parser.add_argument(
+        '--clip',
+        type=_parse_clip,
+        metavar='START-END',
+        help='只分析视频的一段（秒），如 60-600，任一端可省略'
+    )
+    parser.add_argument(
+        '--no-cache',
+        action='store_true',
+        help='不使用本地结果缓存，每次都调用Gemini分析'
+    )
+    parser.add_argument(
+        '--refresh',
+        action='store_true',
+        help='忽略已有的缓存结果重新分析，并用新结果覆盖缓存'
+    )
+    parser.add_argument(
+        '--no-store',
+        action='store_true',
+        help='不把分析结果写入本地结果库（结果库供 query 子命令查询）'
+    )
+    parser.add_argument(
+        '--store-path',
+        default=DEFAULT_STORE_PATH,
+        metavar='PATH',
+        help=f'本地结果库路径（默认: {DEFAULT_STORE_PATH}）'
+    )
+    parser.add_argument(
+        '--no-upload-reuse',
+        action='store_true',
+        help='不复用已上传到Gemini的视频文件，每次分析后立即删除上传'
+    )
+    parser.add_argument(
+        '--retries',
+        type=int,
+        default=2,
+        help='下载、上传、生成遇到临时故障（5xx、超时、连接中断）时的重试次数（默认: 2）'
+    )
+    parser.add_argument(
+        '--circuit-threshold',
+        type=int,
+        default=5,
+        help='同一模型（或上传接口）连续失败多少次后熔断，熔断期间请求立即失败（默认: 5）'
+    )
+    parser.add_argument(
+        '--circuit-reset',
+        type=float,
+        default=30,
+        help='熔断后多少秒放行试探请求（默认: 30）'
+    )
+    parser.add_argument(
+        '--hedge-percentile',
+        type=float,
+        metavar='P',
+        help='生成请求超过该模型近期延迟的P分位数（如95）仍未返回时发出对冲请求，取先返回的结果（默认不对冲）'
+    )
+    parser.add_argument(
+        '--hedge-model',
+        metavar='MODEL',
+        help='对冲请求使用的模型（默认与--model相同；只设置此项时按95分位数对冲）'
+    )
+    parser.add_argument(
+        '--fallback-model',
+        action='append',
+        metavar='MODEL',
+        help='降级链：模型出现后端故障（重试后仍失败、配额耗尽、熔断）时依次改用的模型，可重复指定'
+    )
     
-    args = parser.parse_args()
+    parser.add_argument(
+        '--daemon',
+        action='store_true',
+        help='启动常驻进程：提前完成所有导入，之后带--use-daemon的调用由它fork执行，省去每次的启动时间'
+    )
+    parser.add_argument(
+        '--use-daemon',
+        action='store_true',
+        help='交给常驻进程执行（常驻进程未运行时在本进程执行）'
+    )
+    parser.add_argument(
+        '--daemon-socket',
+        default=cli_daemon.DEFAULT_SOCKET_PATH,
+        metavar='PATH',
+        help=f'常驻进程的Unix socket路径（默认: {cli_daemon.DEFAULT_SOCKET_PATH}）'
+    )
+    
+    if argv is None:
+        argv = sys.argv[1:]
+    if argv and argv[0] == 'query':
+        query_main(argv[1:])
+        return
+    args = parser.parse_args(argv)
+    
+    if args.daemon:
+        if args.use_daemon:
+            parser.error("--daemon不能与--use-daemon同时使用")
+        cli_daemon.serve(args.daemon_socket, main, preload=_preload)
+        return
+    if not (args.youtube or args.local or args.url or args.batch):
+        parser.error("必须指定 --youtube、--local、--url 或 --batch 之一")
+    if args.use_daemon:
+        code = cli_daemon.run_client(args.daemon_socket, [a for a in argv if a != '--use-daemon'])
+        if code is not None:
+            sys.exit(code)
+        print(f"⚠ 常驻进程未运行，在本进程执行: {args.daemon_socket}")
     
     # 获取API密钥
     api_key = args.api_key or os.getenv('GOOGLE_AI_API_KEY')
@@ -70,28 +534,139 @@ def main():
         print("请设置环境变量GOOGLE_AI_API_KEY或使用--api-key参数")
         sys.exit(1)
     
+    # 采样预设
+    preset = args.preset or (media_presets.AUTO if args.token_budget else None)
+    if args.clip:
+        if preset == media_presets.AUTO:
+            print("错误: --clip不能与自动选择预设同时使用，请用--preset指定预设")
+            sys.exit(1)
+        preset = media_presets.with_clip(media_presets.get_preset(preset), *args.clip)
+    
     # 初始化分析器
+    from gemini_video_analyzer import GeminiVideoAnalyzer
+    from webhook_dispatcher import WebhookDispatcher
+    metrics = Metrics(jobs_path=args.job_log)
+    analyzer = None
     try:
-        analyzer = GeminiVideoAnalyzer(api_key)
+        analyzer_options = {
+            'metrics': metrics,
+            'cache': None if args.no_cache else ResultCache(),
+            'refresh_cache': args.refresh,
+            'result_store': None if args.no_store else ResultStore(args.store_path),
+            'upload_registry': None if args.no_upload_reuse else UploadRegistry(),
+            'download_connections': args.download_connections,
+            'stream_uploads': args.stream_upload,
+            'processing_timeout': args.processing_timeout,
+            'segment_seconds': args.segment_seconds,
+            'segment_overlap': args.segment_overlap,
+            'media_preset': preset,
+            'token_budget': args.token_budget,
+            'webhook_dispatcher': WebhookDispatcher(
+                outbox=None if args.no_webhook_outbox else WebhookOutbox(),
+                batch_size=args.webhook_batch,
+                batch_interval=args.webhook_batch_ms / 1000),
+            'rate_limiter': RateLimiter(
+                quotas=dict(args.quota or []),
+                default_quota=Quota(rpm=args.rpm, tpm=args.tpm)),
+            'retry_policies': retry_policy.with_attempts(args.retries + 1),
+            'circuit_breaker': CircuitBreaker(args.circuit_threshold, args.circuit_reset),
+            'hedging_policy': hedging.from_options(args.hedge_percentile, args.hedge_model, args.fallback_model),
+        }
+        prompts = list(args.prompt or [])
+        if args.prompts_file:
+            prompts.extend(load_prompts_file(args.prompts_file))
+        structured_report = None
+        if args.structured:
+            import structured_report
+            prompts.append(structured_report.PROMPT)
+        elif args.markdown:
+            print("错误: --markdown需要与--structured同时使用")
+            sys.exit(1)
+        
         print("=== Gemini视频分析工具 - 命令行版本 ===")
         print(f"模型: {args.model}")
-        if args.prompt:
-            print(f"提示词: {args.prompt}")
+        if args.fallback_model:
+            print(f"降级链: {' -> '.join([args.model] + args.fallback_model)}")
+        if isinstance(preset, media_presets.MediaPreset):
+            print(f"采样预设: {preset.key}")
+        elif preset == media_presets.AUTO:
+            print(f"采样预设: 自动（token预算 {args.token_budget or '未设置，使用full'}）")
+        if len(prompts) == 1 and args.structured:
+            print("结构化报告模式（JSON输出）")
+        elif len(prompts) == 1:
+            print(f"提示词: {prompts[0]}")
+        elif prompts:
+            print(f"提示词: 共{len(prompts)}个，将对同一视频并行执行")
+            for i, prompt in enumerate(prompts, 1):
+                print(f"  {i}. {_short(prompt)}")
         else:
             print("使用默认的YouTube科技视频分析提示词")
         
+        stream = args.stream or args.progressive_webhook
+        if stream and (args.batch or len(prompts) > 1):
+            print("错误: 流式输出只支持单个视频和一个提示词")
+            sys.exit(1)
+        if stream and args.markdown:
+            print("错误: --markdown不支持流式输出")
+            sys.exit(1)
+        
+        if args.batch:
+            if len(prompts) > 1:
+                print("错误: 批量模式只支持一个默认提示词，请在清单中为每行指定prompt")
+                sys.exit(1)
+            print(f"批量清单: {args.batch}")
+            print(f"并发数: {args.concurrency}")
+            print(f"结果输出: {args.output}")
+            jobs = batch_runner.load_manifest(args.batch, defaults={
+                'prompt': prompts[0] if prompts else None,
+                'model': args.model,
+                'webhook_url': args.webhook,
+            })
+            if args.batch_prediction:
+                if args.resume:
+                    print("错误: 离线批量预测模式不支持--resume")
+                    sys.exit(1)
+                print(f"离线批量预测后端: {args.batch_backend}")
+                print("\n开始离线批量预测...")
+                summary = asyncio.run(_run_batch_prediction(
+                    api_key, jobs, args.output, args.concurrency, args.batch_backend,
+                    args.batch_poll, args.batch_size, **analyzer_options))
+            else:
+                journal_path = args.journal or args.output + '.journal'
+                if args.resume and not os.path.exists(journal_path):
+                    print(f"⚠ 任务日志不存在，从头开始: {journal_path}")
+                journal = JobJournal(journal_path, resume=args.resume)
+                if args.resume and journal.previous:
+                    print(f"续跑: 任务日志中有 {len(journal.previous)} 个任务的记录")
+                print("\n开始批量分析...")
+                try:
+                    summary = asyncio.run(_run_batch(
+                        api_key, jobs, args.output, args.concurrency, journal=journal, **analyzer_options))
+                finally:
+                    journal.close()
+            batch_runner.print_summary(summary)
+            if args.metrics_file:
+                metrics.write_prometheus(args.metrics_file)
+            return
+
+        analyzer = GeminiVideoAnalyzer(api_key, **analyzer_options)
+        analyzer.replay_webhooks()
         if args.youtube:
             print(f"YouTube视频: {args.youtube}")
             if args.webhook:
                 print(f"Webhook: {args.webhook}")
             print("\n开始分析YouTube视频...")
             
-            result = analyzer.analyze_youtube_video(
-                youtube_url=args.youtube,
-                prompt=args.prompt,
-                model=args.model,
-                webhook_url=args.webhook
-            )
+            if stream:
+                chunks = analyzer.stream_youtube_video(
+                    args.youtube, prompts[0] if prompts else None, args.model, args.webhook, args.progressive_webhook)
+            else:
+                results = analyzer.analyze_youtube_video_multi(
+                    youtube_url=args.youtube,
+                    prompts=prompts or [None],
+                    model=args.model,
+                    webhook_url=args.webhook
+                )
             
         elif args.local:
             print(f"本地视频: {args.local}")
@@ -105,12 +680,16 @@ def main():
             
             print("\n开始分析本地视频...")
             
-            result = analyzer.analyze_local_video(
-                video_path=args.local,
-                prompt=args.prompt,
-                model=args.model,
-                webhook_url=args.webhook
-            )
+            if stream:
+                chunks = analyzer.stream_local_video(
+                    args.local, prompts[0] if prompts else None, args.model, args.webhook, args.progressive_webhook)
+            else:
+                results = analyzer.analyze_local_video_multi(
+                    video_path=args.local,
+                    prompts=prompts or [None],
+                    model=args.model,
+                    webhook_url=args.webhook
+                )
             
         elif args.url:
             print(f"网络视频链接: {args.url}")
@@ -119,17 +698,52 @@ def main():
             
             print("\n开始下载并分析网络视频...")
             
-            result = analyzer.analyze_video_url(
-                video_url=args.url,
-                prompt=args.prompt,
-                model=args.model,
-                webhook_url=args.webhook
-            )
+            if stream:
+                chunks = analyzer.stream_video_url(
+                    args.url, prompts[0] if prompts else None, args.model, args.webhook, args.progressive_webhook)
+            else:
+                results = analyzer.analyze_video_url_multi(
+                    video_url=args.url,
+                    prompts=prompts or [None],
+                    model=args.model,
+                    webhook_url=args.webhook
+                )
+        
+        if stream:
+            print("\n=== 分析结果 ===")
+            for chunk in chunks:
+                print(chunk, end='', flush=True)
+            print()
         
-        print("\n=== 分析结果 ===")
-        print(result)
+        analyzer.close()
+        if args.metrics_file:
+            metrics.write_prometheus(args.metrics_file)
+        
+        if not stream:
+            if structured_report is not None:
+                # 结构化结果是紧凑JSON，需要时渲染为Markdown
+                results = {
+                    prompt: structured_report.parse_report(result).to_markdown()
+                    if args.markdown and structured_report.is_structured(prompt) else result
+                    for prompt, result in results.items()
+                }
+            if len(results) == 1:
+                print("\n=== 分析结果 ===")
+                print(next(iter(results.values())))
+            else:
+                for i, (prompt, result) in enumerate(results.items(), 1):
+                    print(f"\n=== 分析结果 {i}/{len(results)} ===")
+                    print("结构化报告" if args.structured and structured_report.is_structured(prompt)
+                          else f"提示词: {_short(prompt)}")
+                    print(result)
         print("\n分析完成！")
         
+    except errors.AnalysisError as e:
+        if analyzer is not None:
+            # 失败的结果也要投递完webhook再退出
+            analyzer.close()
+        print(f"\n✗ 分析失败（{e.kind}）: {str(e)}")
+        sys.exit(1)
     except Exception as e:
         print(f"错误: {str(e)}")
         sys.exit(1)
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+命令行常驻进程
+`cli_analyzer.py --daemon` 启动一个已经完成所有导入（包括Gemini SDK）的常驻进程，监听Unix socket。
+带 --use-daemon 的命令行调用把参数、工作目录和环境变量发给它，常驻进程为每次调用fork一个子进程执行：
+子进程继承已导入的模块，通过SCM_RIGHTS收到调用方的stdin/stdout/stderr后直接读写，结束时把退出码发回调用方
+"""
+
+import json
+import os
+import signal
+import socket
+import sys
+import traceback
+from typing import Callable, List, Optional
+
+DEFAULT_SOCKET_PATH = os.path.join(os.path.expanduser('~'), '.cache', 'gemini_video_analyzer', 'cli.sock')
+
+
+def _read_line(conn: socket.socket) -> Optional[bytes]:
+    """读取一行（不含换行符），连接关闭时返回None"""
+    data = b''
+    while not data.endswith(b'\n'):
+        chunk = conn.recv(65536)
+        if not chunk:
+            return None
+        data += chunk
+    return data[:-1]
+
+
+def _exit_code(error: SystemExit) -> int:
+    if error.code is None:
+        return 0
+    if isinstance(error.code, int):
+        return error.code
+    print(error.code, file=sys.stderr)
+    return 1
+
+
+def _handle(conn: socket.socket, handler: Callable[[List[str]], None]) -> int:
+    """在fork出的子进程中执行一次调用"""
+    _, fds, _, _ = socket.recv_fds(conn, 1, 3)
+    request = json.loads(_read_line(conn))
+    # 把调用方的标准输入输出接到本进程，输出按行刷新，进度信息可以及时显示
+    for target, fd in enumerate(fds):
+        os.dup2(fd, target)
+        os.close(fd)
+    sys.stdout = open(1, 'w', encoding='utf-8', buffering=1, closefd=False)
+    sys.stderr = open(2, 'w', encoding='utf-8', buffering=1, closefd=False)
+    os.chdir(request['cwd'])
+    os.environ.clear()
+    os.environ.update(request['env'])
+    conn.sendall(json.dumps({"pid": os.getpid()}).encode('utf-8') + b'\n')
+
+    try:
+        handler(request['argv'])
+        code = 0
+    except SystemExit as e:
+        code = _exit_code(e)
+    except KeyboardInterrupt:
+        code = 130
+    except BaseException:
+        traceback.print_exc()
+        code = 1
+    sys.stdout.flush()
+    sys.stderr.flush()
+    conn.sendall(json.dumps({"exit": code}).encode('utf-8') + b'\n')
+    return code
+
+
+def serve(socket_path: str, handler: Callable[[List[str]], None], preload: Optional[Callable[[], None]] = None):
+    """启动常驻进程，直到收到Ctrl-C/SIGTERM
+
+    Args:
+        socket_path: Unix socket路径（权限设为仅当前用户可访问）
+        handler: 执行一次命令行调用的函数，参数为命令行参数列表
+        preload: 启动时调用一次，用于提前导入模块
+    """
+    if preload is not None:
+        preload()
+
+    directory = os.path.dirname(socket_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    if os.path.exists(socket_path):
+        if run_client(socket_path, None) is not None:
+            raise RuntimeError(f"已有常驻进程在监听: {socket_path}")
+        # 上次异常退出留下的socket文件
+        os.unlink(socket_path)
+
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    # bind按umask创建socket文件，先收紧umask，文件从创建起就只有当前用户可以连接
+    umask = os.umask(0o177)
+    try:
+        server.bind(socket_path)
+    finally:
+        os.umask(umask)
+    server.listen(64)
+    # 子进程自行报告退出码，由内核自动回收
+    signal.signal(signal.SIGCHLD, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    print(f"✓ 常驻进程已启动 (pid {os.getpid()}): {socket_path}", flush=True)
+    try:
+        while True:
+            conn, _ = server.accept()
+            sys.stdout.flush()
+            pid = os.fork()
+            if pid == 0:
+                server.close()
+                signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+                signal.signal(signal.SIGTERM, signal.SIG_DFL)
+                code = 1
+                try:
+                    code = _handle(conn, handler)
+                finally:
+                    os._exit(code)
+            conn.close()
+    except KeyboardInterrupt:
+        print("\n常驻进程已停止")
+    finally:
+        server.close()
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+
+
+def run_client(socket_path: str, argv: Optional[List[str]]) -> Optional[int]:
+    """把一次命令行调用交给常驻进程执行
+
+    Args:
+        socket_path: 常驻进程的Unix socket路径
+        argv: 命令行参数；为None时只检查常驻进程是否在运行
+
+    Returns:
+        命令的退出码；常驻进程不可用时返回None
+    """
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        client.connect(socket_path)
+    except OSError:
+        client.close()
+        return None
+    if argv is None:
+        client.close()
+        return 0
+
+    with client:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        socket.send_fds(client, [b'\0'], [0, 1, 2])
+        request = {"argv": argv, "cwd": os.getcwd(), "env": dict(os.environ)}
+        client.sendall(json.dumps(request).encode('utf-8') + b'\n')
+        pid = None
+        try:
+            while True:
+                line = _read_line(client)
+                if line is None:
+                    print("✗ 常驻进程意外断开连接", file=sys.stderr)
+                    return 1
+                reply = json.loads(line)
+                if "pid" in reply:
+                    pid = reply["pid"]
+                elif "exit" in reply:
+                    return reply["exit"]
+        except KeyboardInterrupt:
+            # 把Ctrl-C转给执行命令的子进程
+            if pid is not None:
+                os.kill(pid, signal.SIGINT)
+            return 130
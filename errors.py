@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+分析错误的类型层次
+下载、上传、文件处理和生成各阶段抛出的异常（SDK、aiohttp、REST、文件系统）统一归类为：
+配额耗尽、临时故障、输入无效、文件处理失败、被安全策略拦截、结构化结果无效。
+只有临时故障会按阶段的重试策略重试；临时故障和配额耗尽计入熔断器（见circuit_breaker.py）
+"""
+
+import contextlib
+import contextvars
+from typing import Optional
+
+from rate_limiter import is_rate_limited
+
+# 为True时analyze_*方法失败总是抛出AnalysisError（见raising）
+_raising: contextvars.ContextVar = contextvars.ContextVar('raising_analysis_errors', default=False)
+
+# 视为临时故障的HTTP状态码（5xx也都按临时故障处理）
+_TRANSIENT_STATUS = {408, 409, 425}
+
+# 视为临时故障的异常类型名（aiohttp的连接/传输错误、google.api_core的服务端错误），
+# 按名称判断以免为了分类导入这些较重的模块
+_TRANSIENT_TYPES = {
+    'ClientConnectionError', 'ClientPayloadError', 'ServerDisconnectedError', 'ServerTimeoutError',
+    'ServiceUnavailable', 'InternalServerError', 'DeadlineExceeded', 'GatewayTimeout', 'Aborted',
+    'RetryError',
+}
+
+# SDK中表示内容被拦截的异常类型名
+_SAFETY_TYPES = {'BlockedPromptException', 'StopCandidateException'}
+
+# 表示被安全策略拦截的blockReason / finishReason
+SAFETY_REASONS = {'SAFETY', 'BLOCKLIST', 'PROHIBITED_CONTENT', 'SPII', 'IMAGE_SAFETY'}
+
+
+class AnalysisError(Exception):
+    """视频分析失败（各类错误的基类，未能归类的错误直接使用此类）"""
+
+    # 写入结果记录和webhook的error_type字段
+    kind = 'error'
+    # 是否可以按重试策略重试
+    retryable = False
+    # 是否说明后端不健康（计入熔断器）
+    backend_failure = False
+
+    def __init__(self, message: str, stage: Optional[str] = None):
+        """
+        Args:
+            message: 错误信息
+            stage: 出错的阶段（download / upload / processing / generate），未知时为None
+        """
+        super().__init__(message)
+        self.stage = stage
+
+
+class QuotaExceededError(AnalysisError):
+    """配额耗尽（429），限流器按Retry-After退避重试后仍然失败"""
+    kind = 'quota'
+    backend_failure = True
+
+
+class TransientError(AnalysisError):
+    """临时故障（5xx、超时、连接中断），可以重试"""
+    kind = 'transient'
+    retryable = True
+    backend_failure = True
+
+
+class InvalidInputError(AnalysisError):
+    """输入无效（文件不存在、链接无效、请求被拒绝等4xx错误），重试没有意义"""
+    kind = 'invalid_input'
+
+
+class ProcessingFailedError(AnalysisError):
+    """上传的视频文件处理失败（文件状态为FAILED）"""
+    kind = 'processing_failed'
+
+
+class SafetyBlockedError(AnalysisError):
+    """提示词或生成结果被安全策略拦截"""
+    kind = 'safety_blocked'
+
+
+class MalformedOutputError(AnalysisError):
+    """结构化模式的生成结果不是有效的JSON或不符合结构（见structured_report.py）"""
+    kind = 'malformed_output'
+
+
+class CircuitOpenError(AnalysisError):
+    """熔断器处于打开状态，请求未发送直接失败"""
+    kind = 'circuit_open'
+
+
+def _status(error: BaseException) -> Optional[int]:
+    """异常携带的HTTP状态码（GeminiRestError.code、aiohttp的status、google.api_core的code）"""
+    for attr in ('code', 'status'):
+        value = getattr(error, attr, None)
+        if isinstance(value, int) and not isinstance(value, bool):
+            return value
+    return None
+
+
+def _error_class(error: BaseException) -> type:
+    names = {cls.__name__ for cls in type(error).__mro__}
+    status = _status(error)
+    if is_rate_limited(error):
+        return QuotaExceededError
+    if names & _SAFETY_TYPES:
+        return SafetyBlockedError
+    if names & _TRANSIENT_TYPES:
+        return TransientError
+    if status is not None:
+        if status >= 500 or status in _TRANSIENT_STATUS:
+            return TransientError
+        if status >= 400:
+            return InvalidInputError
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return TransientError
+    if isinstance(error, (FileNotFoundError, IsADirectoryError, PermissionError)):
+        return InvalidInputError
+    return AnalysisError
+
+
+def classify(error: BaseException, stage: Optional[str] = None) -> AnalysisError:
+    """把任意异常归类为AnalysisError（已经归类的异常原样返回）
+
+    Args:
+        error: 原始异常
+        stage: 出错的阶段，原始异常没有记录阶段时使用
+
+    Returns:
+        归类后的异常，原始异常记录在__cause__中
+    """
+    if isinstance(error, AnalysisError):
+        if error.stage is None:
+            error.stage = stage
+        return error
+    classified = _error_class(error)(str(error) or type(error).__name__, stage)
+    classified.__cause__ = error
+    return classified
+
+
+def block_reason(response) -> Optional[str]:
+    """SDK响应被安全策略拦截的原因（提示词被拦截或结果因安全原因终止），未被拦截时返回None"""
+    feedback = getattr(response, 'prompt_feedback', None)
+    reason = getattr(feedback, 'block_reason', None)
+    if reason:
+        return getattr(reason, 'name', str(reason))
+    try:
+        candidates = getattr(response, 'candidates', None) or []
+    except (AttributeError, ValueError, IndexError):
+        return None
+    if candidates:
+        finish = getattr(getattr(candidates[0], 'finish_reason', None), 'name', None)
+        if finish in SAFETY_REASONS:
+            return finish
+    return None
+
+
+def response_text(response) -> str:
+    """取出生成结果的文本，被安全策略拦截时抛出SafetyBlockedError"""
+    reason = block_reason(response)
+    if reason is not None:
+        raise SafetyBlockedError(f"内容被安全策略拦截: {reason}", 'generate')
+    return response.text
+
+
+@contextlib.contextmanager
+def raising():
+    """在此上下文中（以及其中创建的异步任务中）analyze_*方法失败时总是抛出AnalysisError，
+    不受兼容模式（return_error_strings）影响，调用方可以按错误类型处理失败"""
+    token = _raising.set(True)
+    try:
+        yield
+    finally:
+        _raising.reset(token)
+
+
+def raising_enabled() -> bool:
+    """当前是否在raising上下文中"""
+    return _raising.get()
@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+本地假Gemini后端
+模拟gemini_video_analyzer用到的google.generativeai接口（configure、upload_file、get_file、
+delete_file、GenerativeModel.generate_content_async/count_tokens_async）和gemini_rest的
+generate_content/stream_generate_content，不需要API密钥和网络，
+用于在本地测试分析服务、批量模式和webhook链路
+"""
+
+import asyncio
+import hashlib
+import itertools
+import json
+import os
+import random
+import threading
+import time
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from typing import Dict, Optional, Sequence
+
+import gemini_rest
+
+
+class _FakeFile:
+    """假的Gemini文件，上传后经过processing_delay秒变为ACTIVE"""
+
+    def __init__(self, name: str, display_name: str, mime_type: str, size_bytes: int, ready_at: float,
+                 duration: float):
+        self.name = name
+        self.display_name = display_name
+        self.uri = f"https://fake-gemini.local/v1beta/{name}"
+        self.mime_type = mime_type
+        self.size_bytes = size_bytes
+        self.ready_at = ready_at
+        self.video_metadata = SimpleNamespace(video_duration=timedelta(seconds=duration))
+        self.expiration_time = datetime.now().astimezone() + timedelta(hours=48)
+
+    @property
+    def state(self):
+        return SimpleNamespace(name="ACTIVE" if time.monotonic() >= self.ready_at else "PROCESSING")
+
+
+class FakeRateLimitError(Exception):
+    """模拟google.api_core的ResourceExhausted（429）"""
+    code = 429
+
+
+class FakeServerError(Exception):
+    """模拟google.api_core的InternalServerError / ServiceUnavailable（5xx，可重试的临时故障）"""
+
+    def __init__(self, message: str, code: int = 500):
+        super().__init__(message)
+        self.code = code
+
+
+class _FakeResponse:
+    def __init__(self, text: str, prompt_tokens: int, output_tokens: int):
+        self.text = text
+        self.usage_metadata = SimpleNamespace(
+            prompt_token_count=prompt_tokens,
+            candidates_token_count=output_tokens,
+            total_token_count=prompt_tokens + output_tokens)
+
+
+class _FakeStream:
+    """流式响应：按行分块，块之间间隔一小段时间"""
+
+    def __init__(self, response: _FakeResponse, delay: float):
+        self._lines = response.text.splitlines(keepends=True)
+        self._delay = delay
+        self.usage_metadata = response.usage_metadata
+
+    async def __aiter__(self):
+        for line in self._lines:
+            yield SimpleNamespace(text=line)
+            await asyncio.sleep(self._delay)
+
+
+class _FakeModel:
+    def __init__(self, backend: 'FakeGenAI', model_name: str):
+        self._backend = backend
+        self.model_name = model_name
+
+    async def generate_content_async(self, contents, generation_config=None, stream: bool = False, **kwargs):
+        response = await self._backend._respond(self.model_name, contents, generation_config)
+        if stream:
+            return _FakeStream(response, self._backend._latency() / 10)
+        return response
+
+    async def count_tokens_async(self, contents, **kwargs):
+        return SimpleNamespace(total_tokens=self._backend._count_tokens(contents))
+
+
+class FakeGenAI:
+    """可替换google.generativeai模块的假后端"""
+
+    def __init__(self, processing_delay: float = 0.2, generate_latency: float = 0.2,
+                 latency_jitter: float = 0.0, upload_speed: Optional[float] = None,
+                 error_rate: float = 0.0, rate_limit_rate: float = 0.0,
+                 upload_error_rate: float = 0.0, tail_rate: float = 0.0, tail_latency: float = 30.0,
+                 failing_models: Sequence[str] = (), model_latency: Optional[Dict[str, float]] = None,
+                 video_duration: float = 1800, seed: int = 0):
+        """初始化假后端
+
+        Args:
+            processing_delay: 上传的文件保持PROCESSING状态的秒数
+            generate_latency: 每次生成请求的模拟延迟（秒）
+            latency_jitter: 生成延迟的随机浮动比例（0.2表示±20%）
+            upload_speed: 模拟的上传速度（字节/秒），None表示不限速
+            error_rate: 生成请求随机失败的概率
+            rate_limit_rate: 生成请求随机返回429的概率
+            upload_error_rate: 上传随机失败的概率
+            tail_rate: 生成请求落入长尾的概率（模拟偶尔卡住的请求）
+            tail_latency: 长尾请求的延迟（秒）
+            failing_models: 这些模型的生成请求总是返回503（模拟某个模型不可用）
+            model_latency: 按模型覆盖generate_latency（模拟某个模型变慢）
+            video_duration: 上传文件处理完成后报告的视频时长（秒）
+            seed: 随机数种子，相同参数下结果可重复
+        """
+        self.processing_delay = processing_delay
+        self.generate_latency = generate_latency
+        self.latency_jitter = latency_jitter
+        self.upload_speed = upload_speed
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.upload_error_rate = upload_error_rate
+        self.tail_rate = tail_rate
+        self.tail_latency = tail_latency
+        self.failing_models = set(failing_models)
+        self.model_latency = dict(model_latency or {})
+        self.video_duration = video_duration
+        self._random = random.Random(seed)
+        self.files: Dict[str, _FakeFile] = {}
+        self.calls = {'upload': 0, 'get': 0, 'delete': 0, 'generate': 0, 'cancelled': 0}
+        self.injected = {'generate': 0, 'rate_limit': 0, 'upload': 0, 'tail': 0, 'model_down': 0}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def _latency(self, model_name: Optional[str] = None) -> float:
+        with self._lock:
+            jitter = self._random.uniform(-self.latency_jitter, self.latency_jitter)
+        return max(0.0, self.model_latency.get(model_name, self.generate_latency) * (1 + jitter))
+
+    def _generate_delay(self, model_name: str) -> float:
+        """一次生成请求的延迟：按tail_rate的概率落入长尾"""
+        with self._lock:
+            tail = self._random.random() < self.tail_rate
+            if tail:
+                self.injected['tail'] += 1
+        return self.tail_latency if tail else self._latency(model_name)
+
+    def _maybe_fail(self, operation: str) -> None:
+        """按配置的概率注入错误"""
+        with self._lock:
+            roll = self._random.random()
+            if operation == 'upload':
+                if roll < self.upload_error_rate:
+                    self.injected['upload'] += 1
+                    raise FakeServerError("fake: 503 上传失败", 503)
+                return
+            if roll < self.rate_limit_rate:
+                self.injected['rate_limit'] += 1
+                raise FakeRateLimitError("429 Resource has been exhausted. Please retry in 0.5s")
+            if roll < self.rate_limit_rate + self.error_rate:
+                self.injected['generate'] += 1
+                raise FakeServerError("fake: 500 内部错误")
+
+    def configure(self, api_key: Optional[str] = None, **kwargs) -> None:
+        pass
+
+    def upload_file(self, path: str, mime_type: Optional[str] = None, display_name: Optional[str] = None, **kwargs):
+        size = os.path.getsize(path)
+        self._maybe_fail('upload')
+        if self.upload_speed:
+            # 同步上传在线程池中执行，sleep模拟传输耗时
+            time.sleep(size / self.upload_speed)
+        with self._lock:
+            self.calls['upload'] += 1
+            name = f"files/fake-{next(self._ids)}"
+            uploaded = _FakeFile(name, display_name or path, mime_type or 'video/mp4', size,
+                                 time.monotonic() + self.processing_delay, self.video_duration)
+            self.files[name] = uploaded
+        return uploaded
+
+    def get_file(self, name: str):
+        with self._lock:
+            self.calls['get'] += 1
+            if name not in self.files:
+                raise KeyError(f"404 文件不存在: {name}")
+            return self.files[name]
+
+    def delete_file(self, name: str) -> None:
+        with self._lock:
+            self.calls['delete'] += 1
+            self.files.pop(name, None)
+
+    def GenerativeModel(self, model_name: str):
+        return _FakeModel(self, model_name)
+
+    # 请求体的构建与真实接口相同
+    request_body = staticmethod(gemini_rest.request_body)
+
+    async def generate_content(self, session, api_key: str, model: str, contents: list,
+                               generation_config: Optional[dict] = None, **kwargs):
+        """替代gemini_rest.generate_content"""
+        return await self._respond(model, contents, generation_config)
+
+    async def stream_generate_content(self, session, api_key: str, model: str, contents: list,
+                                      generation_config: Optional[dict] = None, **kwargs):
+        """替代gemini_rest.stream_generate_content"""
+        response = await self._respond(model, contents, generation_config)
+        return _FakeStream(response, self._latency() / 10)
+
+    def _video_tokens(self, video: dict, generation_config: Optional[dict]) -> int:
+        """按采样设置估算视频部分的token数（与media_presets的估算方式一致）"""
+        metadata = video.get('video_metadata') or {}
+        start = float(str(metadata.get('start_offset', '0s')).rstrip('s'))
+        end = float(str(metadata.get('end_offset', f"{self.video_duration}s")).rstrip('s'))
+        low = (generation_config or {}).get('media_resolution') == 'MEDIA_RESOLUTION_LOW'
+        per_second = float(metadata.get('fps', 1)) * (66 if low else 258) + 32
+        return int(max(0.0, min(end, self.video_duration) - start) * per_second)
+
+    def _count_tokens(self, contents) -> int:
+        if isinstance(contents, str):
+            return len(contents) // 3
+        parts = contents[0]['parts']
+        video = next((p for p in parts if 'file_data' in p), None)
+        prompt = next((p['text'] for p in parts if 'text' in p), '')
+        return len(prompt) // 3 + (self._video_tokens(video, None) if video else 0)
+
+    async def _respond(self, model_name: str, contents: list, generation_config: Optional[dict]):
+        self.calls['generate'] += 1
+        try:
+            await asyncio.sleep(self._generate_delay(model_name))
+        except asyncio.CancelledError:
+            # 调用方放弃的请求（如对冲中较慢的一个）
+            self.calls['cancelled'] += 1
+            raise
+        if model_name in self.failing_models:
+            with self._lock:
+                self.injected['model_down'] += 1
+            raise FakeServerError(f"fake: 503 {model_name} 不可用", 503)
+        self._maybe_fail('generate')
+        parts = contents[0]['parts']
+        prompt = next((p['text'] for p in parts if 'text' in p), '')
+        video = next((p for p in parts if 'file_data' in p), None)
+        uri = (video or {}).get('file_data', {}).get('file_uri', '')
+        media = dict((video or {}).get('video_metadata') or {})
+        if (generation_config or {}).get('media_resolution'):
+            media['media_resolution'] = generation_config['media_resolution']
+        if media:
+            uri = f"{uri}#{','.join(f'{k}={v}' for k, v in sorted(media.items()))}"
+
+        digest = hashlib.sha256(f"{model_name}|{prompt}|{uri}".encode('utf-8')).hexdigest()[:12]
+        if (generation_config or {}).get('response_mime_type') == 'application/json':
+            # 分段分析的结构化输出：品牌时长由摘要决定，结果可重复
+            text = json.dumps({
+                "sponsorship": "无赞助",
+                "sponsorship_evidence": "",
+                "brands": [{"name": "FakeBrand", "seconds": int(digest[:2], 16) % 60,
+                            "percent": round(int(digest[:2], 16) % 60 / self.video_duration * 100, 1),
+                            "sentiment": 4, "opinion": f"片段{digest[:4]}"}],
+                "video_type": "评测",
+                "summary": f"{uri} 的内容",
+                "kol_sentiment": 4,
+                "positives": [],
+                "negatives": [],
+            }, ensure_ascii=False)
+        else:
+            text = (f"# [fake:{model_name}] 分析报告\n\n## 1. 视频\n- {uri}\n\n"
+                    f"## 2. 提示词摘要\n- {prompt[:30]}\n\n## 3. 结果编号\n- {digest}\n")
+        video_tokens = self._video_tokens(video, generation_config) if video else 0
+        return _FakeResponse(text, prompt_tokens=len(prompt) // 3 + video_tokens, output_tokens=len(text) // 3)
+
+
+def install(**options) -> FakeGenAI:
+    """用假后端替换gemini_video_analyzer中的genai和gemini_rest模块
+
+    Args:
+        **options: 透传给FakeGenAI的参数
+
+    Returns:
+        安装好的假后端（可读取calls/files查看调用情况）
+    """
+    import gemini_video_analyzer
+    backend = FakeGenAI(**options)
+    gemini_video_analyzer.genai = backend
+    gemini_video_analyzer.gemini_rest = backend
+    return backend
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Gemini上传文件状态轮询器
+一个后台循环同时跟踪所有处于PROCESSING状态的文件，按文件大小设定初始轮询间隔并指数退避，
+文件变为ACTIVE/FAILED时立即唤醒等待方，超过截止时间则报超时
+"""
+
+import asyncio
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+
+class FileProcessingTimeout(TimeoutError):
+    """文件在截止时间内没有处理完成"""
+
+
+class _PendingFile:
+    """一个正在等待处理完成的文件"""
+
+    def __init__(self, name: str, interval: float, deadline: float):
+        self.name = name
+        self.interval = interval
+        self.deadline = deadline
+        self.next_check = time.monotonic()
+        self.failures = 0
+        self.waiters: List[asyncio.Future] = []
+
+
+class FilePoller:
+    """多个文件共享的自适应状态轮询器"""
+
+    def __init__(self, get_file: Callable[[str], Any], min_interval: float = 0.5,
+                 max_interval: float = 15.0, backoff: float = 1.5,
+                 base_timeout: float = 300.0, timeout_per_mb: float = 0.5,
+                 max_consecutive_errors: int = 3):
+        """初始化轮询器
+
+        Args:
+            get_file: 查询文件状态的同步函数（如genai.get_file），会放到线程池中执行
+            min_interval: 最短轮询间隔（秒）
+            max_interval: 最长轮询间隔（秒）
+            backoff: 每次仍处于PROCESSING时轮询间隔的放大倍数
+            base_timeout: 默认截止时间的基础部分（秒）
+            timeout_per_mb: 默认截止时间中每MB文件增加的秒数
+            max_consecutive_errors: 查询连续失败多少次后放弃该文件
+        """
+        self.get_file = get_file
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.base_timeout = base_timeout
+        self.timeout_per_mb = timeout_per_mb
+        self.max_consecutive_errors = max_consecutive_errors
+        self._pending: Dict[str, _PendingFile] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+
+    def _initial_interval(self, size_bytes: Optional[int]) -> float:
+        """按文件大小估算初始轮询间隔：大约每50MB对应1秒"""
+        if not size_bytes:
+            return self.min_interval
+        return min(self.max_interval, max(self.min_interval, size_bytes / (50 * 1024 * 1024)))
+
+    def _default_timeout(self, size_bytes: Optional[int]) -> float:
+        return self.base_timeout + (size_bytes or 0) / (1024 * 1024) * self.timeout_per_mb
+
+    async def wait(self, name: str, size_bytes: Optional[int] = None, timeout: Optional[float] = None):
+        """等待文件处理结束
+
+        Args:
+            name: Gemini文件名
+            size_bytes: 文件大小，用于设定初始轮询间隔和默认截止时间
+            timeout: 截止时间（秒），不提供时按文件大小估算
+
+        Returns:
+            处理结束后的文件信息（state为ACTIVE或FAILED）
+        """
+        loop = asyncio.get_running_loop()
+        entry = self._pending.get(name)
+        if entry is None:
+            if timeout is None:
+                timeout = self._default_timeout(size_bytes)
+            entry = _PendingFile(name, self._initial_interval(size_bytes), time.monotonic() + timeout)
+            self._pending[name] = entry
+
+        future = loop.create_future()
+        entry.waiters.append(future)
+        self._ensure_running()
+        return await future
+
+    @property
+    def pending_count(self) -> int:
+        """当前正在跟踪的文件数"""
+        return len(self._pending)
+
+    def _ensure_running(self) -> None:
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+        else:
+            self._wakeup.set()
+
+    def _resolve(self, entry: _PendingFile, result=None, error: Optional[BaseException] = None) -> None:
+        self._pending.pop(entry.name, None)
+        for future in entry.waiters:
+            if future.done():
+                continue
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+    async def _check(self, entry: _PendingFile) -> None:
+        """查询一个文件的状态并更新下一次轮询时间"""
+        try:
+            file_info = await asyncio.to_thread(self.get_file, entry.name)
+        except Exception as e:
+            entry.failures += 1
+            if entry.failures >= self.max_consecutive_errors:
+                self._resolve(entry, error=e)
+                return
+        else:
+            entry.failures = 0
+            if file_info.state.name != "PROCESSING":
+                self._resolve(entry, result=file_info)
+                return
+
+        now = time.monotonic()
+        if now >= entry.deadline:
+            self._resolve(entry, error=FileProcessingTimeout(f"视频文件处理超时: {entry.name}"))
+            return
+        entry.next_check = min(now + entry.interval, entry.deadline)
+        entry.interval = min(self.max_interval, entry.interval * self.backoff)
+
+    async def _run(self) -> None:
+        """后台轮询循环，没有待处理文件时退出"""
+        while self._pending:
+            # 所有等待方都已取消的文件不再轮询
+            for entry in list(self._pending.values()):
+                if all(f.done() for f in entry.waiters):
+                    self._pending.pop(entry.name, None)
+
+            now = time.monotonic()
+            due = [e for e in self._pending.values() if e.next_check <= now]
+            if due:
+                await asyncio.gather(*(self._check(e) for e in due))
+                continue
+
+            if not self._pending:
+                break
+            delay = min(e.next_check for e in self._pending.values()) - now
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=max(delay, 0))
+            except asyncio.TimeoutError:
+                pass
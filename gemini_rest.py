@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Gemini generateContent REST接口
+google-generativeai SDK不支持video_metadata（视频片段起止时间、采样帧率）、media_resolution等较新的字段，
+需要这些字段的请求直接通过REST接口发送；响应对象提供与SDK相同的text和usage_metadata属性
+"""
+
+import json
+import re
+from types import SimpleNamespace
+from typing import Optional
+
+import aiohttp
+
+import errors
+
+GEMINI_API_BASE = "https://generativelanguage.googleapis.com/v1beta"
+
+
+class GeminiRestError(Exception):
+    """generateContent请求失败（code为HTTP状态码，429时可由限流器识别并退避）"""
+
+    def __init__(self, code: int, message: str, headers: Optional[dict] = None):
+        super().__init__(f"{code} {message}")
+        self.code = code
+        self.headers = headers or {}
+
+
+def _camel(value, keep_keys: bool = False):
+    """把snake_case的键（与SDK相同的写法）递归转换为REST接口使用的camelCase
+
+    response_schema中properties下的键是输出JSON的字段名，保持原样（keep_keys）。
+    """
+    if isinstance(value, dict):
+        return {(k if keep_keys else re.sub(r'_([a-z])', lambda m: m.group(1).upper(), k)):
+                _camel(v, not keep_keys and k == 'properties') for k, v in value.items()}
+    if isinstance(value, list):
+        return [_camel(v) for v in value]
+    return value
+
+
+class RestResponse:
+    """generateContent的响应"""
+
+    def __init__(self, data: dict):
+        self.data = data
+        usage = data.get('usageMetadata', {})
+        self.usage_metadata = SimpleNamespace(
+            prompt_token_count=usage.get('promptTokenCount', 0),
+            candidates_token_count=usage.get('candidatesTokenCount', 0),
+            total_token_count=usage.get('totalTokenCount', 0))
+
+    @property
+    def text(self) -> str:
+        candidates = self.data.get('candidates') or []
+        if not candidates:
+            reason = self.data.get('promptFeedback', {}).get('blockReason')
+            if reason:
+                raise errors.SafetyBlockedError(f"内容被安全策略拦截: {reason}", 'generate')
+            raise ValueError("Gemini没有返回结果: 没有返回候选结果")
+        if candidates[0].get('finishReason') in errors.SAFETY_REASONS:
+            raise errors.SafetyBlockedError(f"内容被安全策略拦截: {candidates[0]['finishReason']}", 'generate')
+        parts = candidates[0].get('content', {}).get('parts', [])
+        return ''.join(part.get('text', '') for part in parts)
+
+
+class RestStream:
+    """streamGenerateContent的流式响应，迭代得到逐块的RestResponse；迭代结束后usage_metadata为总用量"""
+
+    def __init__(self, response: aiohttp.ClientResponse):
+        self._response = response
+        self.usage_metadata = None
+
+    async def __aiter__(self):
+        try:
+            async for line in self._response.content:
+                line = line.strip()
+                if not line.startswith(b'data:'):
+                    continue
+                chunk = RestResponse(json.loads(line[5:]))
+                if 'usageMetadata' in chunk.data:
+                    self.usage_metadata = chunk.usage_metadata
+                # 只带用量信息的块没有候选结果
+                if chunk.data.get('candidates') or chunk.data.get('promptFeedback', {}).get('blockReason'):
+                    yield chunk
+        finally:
+            self._response.release()
+
+
+def request_body(contents: list, generation_config: Optional[dict]) -> dict:
+    """生成generateContent的请求体（SDK写法的snake_case键转换为camelCase），也用于批量预测的请求"""
+    body = {'contents': _camel(contents)}
+    if generation_config:
+        body['generationConfig'] = _camel(generation_config)
+    return body
+
+
+async def raise_for_error(response: aiohttp.ClientResponse) -> None:
+    """状态码为4xx/5xx时抛出GeminiRestError（消息取自响应中的error.message）"""
+    if response.status < 400:
+        return
+    try:
+        message = (await response.json()).get('error', {}).get('message', response.reason)
+    except (aiohttp.ContentTypeError, ValueError):
+        message = response.reason
+    raise GeminiRestError(response.status, message, dict(response.headers))
+
+
+async def generate_content(session: aiohttp.ClientSession, api_key: str, model: str, contents: list,
+                           generation_config: Optional[dict] = None, timeout: float = 600,
+                           api_base: str = GEMINI_API_BASE) -> RestResponse:
+    """调用generateContent
+
+    Args:
+        session: 共享的aiohttp会话
+        api_key: Google AI API密钥
+        model: 模型名称
+        contents: 请求内容，格式与SDK相同（snake_case），可包含video_metadata等SDK不支持的字段
+        generation_config: 可选的生成配置（snake_case）
+        timeout: 请求超时（秒）
+        api_base: API地址
+
+    Returns:
+        响应对象，提供text和usage_metadata
+    """
+    url = f"{api_base}/models/{model}:generateContent"
+    async with session.post(url, json=request_body(contents, generation_config),
+                            headers={'x-goog-api-key': api_key},
+                            timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+        await raise_for_error(response)
+        return RestResponse(await response.json())
+
+
+async def stream_generate_content(session: aiohttp.ClientSession, api_key: str, model: str, contents: list,
+                                  generation_config: Optional[dict] = None, timeout: float = 600,
+                                  api_base: str = GEMINI_API_BASE) -> RestStream:
+    """调用streamGenerateContent（SSE），参数同generate_content
+
+    返回时已确认请求被接受（错误状态在这里抛出），随后迭代返回值得到逐块结果。
+    """
+    url = f"{api_base}/models/{model}:streamGenerateContent?alt=sse"
+    response = await session.post(url, json=request_body(contents, generation_config),
+                                  headers={'x-goog-api-key': api_key},
+                                  timeout=aiohttp.ClientTimeout(total=timeout))
+    try:
+        await raise_for_error(response)
+    except BaseException:
+        response.release()
+        raise
+    return RestStream(response)
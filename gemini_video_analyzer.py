@@ -5,19 +5,54 @@ Gemini 2.5 Pro 视频分析工具
 支持输入提示词和YouTube视频链接，返回AI分析结果
 """
 
+import asyncio
+import json
 import os
+import re
 import sys
-import requests
-import json
 import tempfile
-import urllib.request
+import threading
+import time
 import urllib.parse
-import mimetypes
-from typing import Optional
-import google.generativeai as genai
+from datetime import datetime
+from typing import AsyncIterator, Awaitable, Callable, Dict, Iterator, List, Optional, Tuple
+import aiohttp
+import errors
+import gemini_rest
+import hedging
+import job_journal
+import lazy_import
+import media_presets
+import retry_policy
+import segmented_analysis
+import structured_report
+from circuit_breaker import CircuitBreaker
+from file_poller import FilePoller
+from hedging import HedgingPolicy
+from media_presets import MediaPreset, PresetSpec
+from metrics import Metrics
+from rate_limiter import UPLOAD_KEY, RateLimiter
+from report_sections import SectionSplitter
+from result_cache import ResultCache
+from result_store import ResultStore
+from retry_policy import RetryPolicy
+from single_flight import SingleFlight
+from streaming_upload import GEMINI_UPLOAD_URL, stream_to_gemini
+from structured_report import VideoReport
+from upload_registry import UploadRegistry
+from video_downloader import RangedDownloader
+from webhook_dispatcher import WebhookDispatcher
+from video_identity import content_identity, file_identity, file_sha256, url_identity, youtube_identity
 
-class GeminiVideoAnalyzer:
-    """Gemini视频分析器"""
+# SDK（连同grpc/protobuf）在第一次上传或调用模型时才导入，缓存命中和纯REST请求不需要它
+genai = lazy_import.LazyModule('google.generativeai')
+
+class AsyncGeminiVideoAnalyzer:
+    """Gemini视频分析器（asyncio版本）
+
+    下载、上传、状态轮询、生成和webhook推送都不会阻塞事件循环，
+    单个进程可以同时保持数百个分析请求在途。
+    """
     
     # 默认的YouTube科技视频分析提示词
     DEFAULT_PROMPT = """你是YouTube科技视频分析专家。分析视频并输出Markdown格式报告。
@@ -51,16 +86,134 @@ class GeminiVideoAnalyzer:
 
 请用中文分析，基于视频实际内容。"""
     
-    def __init__(self, api_key: str):
+    # 下载网络视频时使用的请求头
+    DOWNLOAD_HEADERS = {
+        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+    }
+    
+    # Gemini Files API上传地址（流式上传使用）
+    UPLOAD_ENDPOINT = GEMINI_UPLOAD_URL
+    
+    # 两次自动回收闲置上传之间的最小间隔（秒）
+    REAP_INTERVAL = 600
+    
+    def __init__(self, api_key: str, cache: Optional[ResultCache] = None, refresh_cache: bool = False,
+                 upload_registry: Optional[UploadRegistry] = None, download_connections: int = 4,
+                 stream_uploads: bool = False, processing_timeout: Optional[float] = None,
+                 webhook_dispatcher: Optional[WebhookDispatcher] = None,
+                 rate_limiter: Optional[RateLimiter] = None, coalesce: bool = True,
+                 metrics: Optional[Metrics] = None, segment_seconds: Optional[float] = None,
+                 segment_overlap: float = segmented_analysis.DEFAULT_OVERLAP, segment_retries: int = 2,
+                 media_preset: PresetSpec = None, token_budget: Optional[int] = None,
+                 retry_policies: Optional[Dict[str, RetryPolicy]] = None,
+                 circuit_breaker: Optional[CircuitBreaker] = None, return_error_strings: bool = False,
+                 hedging_policy: Optional[HedgingPolicy] = None, result_store: Optional[ResultStore] = None):
         """初始化分析器
         
         Args:
             api_key: Google AI API密钥
+            cache: 可选的结果缓存，命中时直接返回缓存结果而不调用Gemini
+            refresh_cache: 为True时忽略已有缓存，重新分析并覆盖缓存结果
+            upload_registry: 可选的上传登记表，启用后同一文件的重复分析复用仍有效的上传，
+                上传文件由回收器按闲置时长删除，而不是分析后立即删除
+            download_connections: 下载网络视频时的并发分段连接数（服务器不支持Range时使用单连接）
+            stream_uploads: 为True时分析网络视频边下载边上传到Gemini，不再先完整下载到临时文件；
+                无法流式上传（如未知文件大小）时自动退回到临时文件方式
+            processing_timeout: 等待上传文件处理完成的截止时间（秒），不提供时按文件大小估算
+            webhook_dispatcher: 后台webhook投递器，不提供时使用默认配置创建；
+                分析结果放入投递队列后analyze_*方法即返回，不等待接收端响应
+            rate_limiter: 调度所有生成和上传请求的限流器，不提供时创建一个不限速的限流器
+                （仍会在收到429时暂停并退避重试）
+            coalesce: 为True时合并并发的相同请求（同一视频、提示词和模型），
+                重复请求等待正在进行的分析并共享结果，各自的webhook仍分别发送
+            metrics: 分阶段耗时统计，不提供时创建一个只在内存中汇总的Metrics
+                （可通过render_prometheus导出）
+            segment_seconds: 设置后，时长超过该值的视频按时间窗口分段并行分析，再合并为一份报告；
+                None表示整段分析
+            segment_overlap: 相邻分段窗口的重叠（秒）
+            segment_retries: 分段失败后逐个重试的次数
+            media_preset: 默认的视频采样预设（fast / balanced / full / auto 或MediaPreset），
+                控制媒体分辨率、采样帧率和起止时间；None表示使用Gemini的默认采样
+            token_budget: 每次生成请求的输入token预算，预设为auto时据此选择预设
+            retry_policies: 按阶段（download / upload / generate）覆盖默认的重试策略，
+                只有临时故障（5xx、超时、连接中断）会重试
+            circuit_breaker: 按模型和上传接口熔断的熔断器，不提供时使用默认阈值创建
+            return_error_strings: 兼容旧版本的行为：为True时analyze_*方法失败时返回错误信息文本，
+                流式方法以错误信息作为最后一块；默认抛出errors.AnalysisError的子类
+            hedging_policy: 可选的对冲与降级策略：生成请求超过近期延迟分位数时发出对冲请求，
+                模型出现后端故障时按降级链改用其他模型；实际给出结果的模型记录在answered_by字段
+            result_store: 可选的本地结果库，每个成功的分析结果（缓存命中除外）都写入其中，
+                供 `cli_analyzer.py query` 按品牌、赞助、时间和模型查询；写入在后台线程中批量进行
         """
-        genai.configure(api_key=api_key)
+        lazy_import.call_when_loaded(genai, 'configure', api_key=api_key)
+        self._api_key = api_key
+        self.cache = cache
+        self.refresh_cache = refresh_cache
+        self.upload_registry = upload_registry
+        self.download_connections = download_connections
+        self.stream_uploads = stream_uploads
+        self.processing_timeout = processing_timeout
+        self._poller: Optional[FilePoller] = None
+        self.webhooks = webhook_dispatcher or WebhookDispatcher()
+        self.limiter = rate_limiter or RateLimiter()
+        self.flights: Optional[SingleFlight] = SingleFlight() if coalesce else None
+        self.metrics = metrics or Metrics()
+        if segment_seconds is not None:
+            # 参数无效时在创建时报错
+            segmented_analysis.plan_segments(0, segment_seconds, segment_overlap)
+        self.segment_seconds = segment_seconds
+        self.segment_overlap = segment_overlap
+        self.segment_retries = segment_retries
+        self.media_preset = media_presets.get_preset(media_preset)
+        self.token_budget = token_budget
+        self.retry_policies = dict(retry_policy.DEFAULT_POLICIES, **(retry_policies or {}))
+        self.breaker = circuit_breaker or CircuitBreaker()
+        self.return_error_strings = return_error_strings
+        self.hedging = hedging_policy
+        self.result_store = result_store
+        if self.webhooks.metrics is None:
+            self.webhooks.metrics = self.metrics
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._upload_locks: Dict[str, asyncio.Lock] = {}
+        self._last_reap = 0.0
+        self._reap_task: Optional[asyncio.Task] = None
+        self._store_timer: Optional[asyncio.TimerHandle] = None
+        self._store_task: Optional[asyncio.Task] = None
     
-    def send_to_webhook(self, webhook_url: str, data: dict) -> bool:
-        """发送数据到webhook
+    async def _get_session(self) -> aiohttp.ClientSession:
+        """获取共享的HTTP会话（首次使用时在当前事件循环中创建）"""
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession()
+        return self._session
+    
+    async def close(self):
+        """投递完待发送的webhook、等待进行中的上传回收、写入结果库中缓冲的结果和缓存的访问时间，并关闭共享的HTTP会话"""
+        await self.webhooks.close()
+        if self._reap_task is not None:
+            await asyncio.gather(self._reap_task, return_exceptions=True)
+            self._reap_task = None
+        if self.result_store is not None:
+            if self._store_timer is not None:
+                self._store_timer.cancel()
+                self._store_timer = None
+            if self._store_task is not None:
+                await asyncio.gather(self._store_task, return_exceptions=True)
+                self._store_task = None
+            await asyncio.to_thread(self.result_store.flush)
+        if self.cache is not None:
+            await asyncio.to_thread(self.cache.flush)
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+    
+    async def __aenter__(self):
+        return self
+    
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+    
+    async def send_to_webhook(self, webhook_url: str, data: dict) -> bool:
+        """发送数据到webhook并等待结果（5xx和超时会自动重试）
         
         Args:
             webhook_url: webhook地址
@@ -69,31 +222,664 @@ class GeminiVideoAnalyzer:
         Returns:
             发送是否成功
         """
+        return await self.webhooks.send(webhook_url, data)
+    
+    async def flush_webhooks(self):
+        """等待后台队列中的webhook全部投递完成"""
+        await self.webhooks.flush()
+    
+    async def replay_webhooks(self) -> int:
+        """重新投递发件箱中此前未送达的webhook（投递器未配置发件箱时不做任何事）
+        
+        Returns:
+            重新投递的条数
+        """
+        return await self.webhooks.replay()
+    
+    async def _cache_get(self, cache_key: Optional[str]) -> Optional[str]:
+        """读取缓存结果，未启用缓存或要求刷新时返回None（SQLite查询在线程中执行，不阻塞事件循环）"""
+        if self.cache is None or cache_key is None or self.refresh_cache:
+            return None
+        result = await asyncio.to_thread(self.cache.get, cache_key)
+        if result is not None:
+            print("✓ 命中结果缓存")
+        return result
+    
+    async def _lookup(self, cache_key: Optional[str]) -> Optional[str]:
+        """查询缓存并计入命中统计"""
+        result = await self._cache_get(cache_key)
+        if cache_key is not None:
+            self.metrics.count("cache_lookups_total", result="miss" if result is None else "hit")
+        return result
+    
+    def _cache_identity(self, identity: Optional[str]) -> Optional[str]:
+        """缓存使用的视频标识：分段分析的结果与整段分析的结果分开缓存"""
+        if identity is not None and self.segment_seconds is not None:
+            return f"{identity}#segments={self.segment_seconds:g}/{self.segment_overlap:g}"
+        return identity
+    
+    async def _cache_put(self, cache_key: Optional[str], result: str):
+        """写入缓存结果（写入、淘汰和提交在线程中执行，不阻塞事件循环）"""
+        if self.cache is not None and cache_key is not None:
+            await asyncio.to_thread(self.cache.put, cache_key, result)
+    
+    async def _call(self, stage: str, key: Optional[str], request: Callable[[], Awaitable]):
+        """按阶段的重试策略执行请求，key不为None时经过熔断器（失败时抛出归类后的AnalysisError）"""
+        def on_retry(error: errors.AnalysisError):
+            self.metrics.count("retries_total", stage=stage, error_type=error.kind)
+        
+        return await retry_policy.call(stage, request, self.retry_policies.get(stage), self.breaker, key, on_retry)
+    
+    def _failure(self, error: BaseException, prefix: str = "分析过程中出现错误") -> dict:
+        """失败的结果：错误信息、错误类型（写入webhook）以及归类后的异常（不写入webhook）"""
+        error = errors.classify(error)
+        self.metrics.count("errors_total", error_type=error.kind)
+        return {"error": f"{prefix}: {str(error)}", "error_type": error.kind, "exception": error}
+    
+    async def _wait_for_file(self, name: str, size_bytes: Optional[int] = None):
+        """等待上传的文件处理完成
+        
+        所有等待中的文件由同一个轮询器统一查询，轮询间隔按文件大小设定并逐步放大，
+        超过截止时间时抛出FileProcessingTimeout。
+        
+        Args:
+            name: Gemini文件名
+            size_bytes: 文件大小（字节），用于设定轮询间隔和截止时间
+            
+        Returns:
+            处理结束后的文件信息
+        """
+        if self._poller is None:
+            self._poller = FilePoller(genai.get_file)
+        with self.metrics.span("processing"):
+            return await self._poller.wait(name, size_bytes=size_bytes, timeout=self.processing_timeout)
+    
+    async def _upload_and_wait(self, video_path: str):
+        """上传视频文件并等待处理完成，返回处理结束后的文件信息"""
+        # 上传视频文件（SDK只提供同步上传，放到线程池中执行以免阻塞事件循环）
+        print("正在上传视频文件...")
+        async def upload():
+            with self.metrics.span("upload"):
+                return await asyncio.to_thread(genai.upload_file, path=video_path)
+        
+        uploaded_file = await self._call(retry_policy.UPLOAD, UPLOAD_KEY, lambda: self.limiter.call(UPLOAD_KEY, upload))
+        
+        # 等待文件处理完成
+        print("等待文件处理完成...")
+        return await self._wait_for_file(uploaded_file.name, size_bytes=os.path.getsize(video_path))
+    
+    async def _acquire_upload(self, video_path: str):
+        """获取视频文件在Gemini中的可用上传，优先复用登记表中仍有效的上传
+        
+        Args:
+            video_path: 本地视频文件路径
+            
+        Returns:
+            处理结束后的文件信息（state为ACTIVE或FAILED）
+        """
+        if self.upload_registry is None:
+            file_info = await self._upload_and_wait(video_path)
+            if file_info.state.name == "ACTIVE":
+                job_journal.note(job_journal.UPLOADED, file=file_info.name)
+            return file_info
+        
+        content_hash = await asyncio.to_thread(file_sha256, video_path)
+        # 同一进程内对同一文件的并发分析只上传一次
+        lock = self._upload_locks.setdefault(content_hash, asyncio.Lock())
+        async with lock:
+            # 登记表的读写在线程中执行，持锁等待期间不阻塞事件循环
+            entry = await asyncio.to_thread(self.upload_registry.lookup, content_hash)
+            if entry is not None:
+                try:
+                    file_info = await asyncio.to_thread(genai.get_file, name=entry.name)
+                    if file_info.state.name == "PROCESSING":
+                        file_info = await self._wait_for_file(entry.name)
+                    if file_info.state.name == "ACTIVE":
+                        print(f"✓ 复用已上传的视频文件: {entry.name}")
+                        job_journal.note(job_journal.UPLOADED, file=entry.name,
+                                         identity=content_identity(content_hash))
+                        return file_info
+                except Exception as e:
+                    print(f"⚠ 已登记的上传不可用，重新上传: {str(e)}")
+                await asyncio.to_thread(self.upload_registry.remove, content_hash)
+            
+            file_info = await self._upload_and_wait(video_path)
+            if file_info.state.name == "ACTIVE":
+                await asyncio.to_thread(self.upload_registry.register, content_hash, file_info)
+                job_journal.note(job_journal.UPLOADED, file=file_info.name,
+                                 identity=content_identity(content_hash))
+            self._schedule_reap()
+            return file_info
+    
+    async def _resumed_upload(self):
+        """续跑的批量任务在中断前完成的上传，仍然有效时返回文件信息，否则返回None"""
+        upload = job_journal.resumable_upload()
+        if upload is None:
+            return None
         try:
-            headers = {
-                'Content-Type': 'application/json',
-                'User-Agent': 'Gemini-Video-Analyzer/1.0'
-            }
+            file_info = await asyncio.to_thread(genai.get_file, name=upload.name)
+            if file_info.state.name == "PROCESSING":
+                file_info = await self._wait_for_file(upload.name)
+        except Exception as e:
+            print(f"⚠ 中断前的上传不可用，重新处理: {str(e)}")
+            return None
+        if file_info.state.name != "ACTIVE":
+            return None
+        print(f"✓ 复用中断前上传的视频文件: {upload.name}")
+        return file_info
+    
+    async def _release_upload(self, file_info):
+        """分析结束后释放上传：未启用登记表时立即删除，否则留给回收器处理"""
+        if self.upload_registry is None or file_info.state.name != "ACTIVE":
+            await asyncio.to_thread(genai.delete_file, name=file_info.name)
+    
+    async def _discard_upload(self, name: str):
+        """删除一个未登记的上传（在清理路径中调用，删除失败只打印警告，不掩盖原来的错误）"""
+        try:
+            await asyncio.to_thread(genai.delete_file, name=name)
+        except Exception as e:
+            print(f"⚠ 删除上传文件失败 {name}: {str(e)}")
+    
+    def _schedule_reap(self):
+        """距离上次回收超过REAP_INTERVAL时，在后台回收闲置的上传"""
+        now = time.monotonic()
+        if self._last_reap and now - self._last_reap < self.REAP_INTERVAL:
+            return
+        if self._reap_task is not None and not self._reap_task.done():
+            return
+        self._last_reap = now
+        self._reap_task = asyncio.create_task(self.reap_uploads())
+    
+    async def reap_uploads(self) -> int:
+        """删除登记表中闲置超时或即将过期的Gemini上传文件
+        
+        Returns:
+            删除的文件数量
+        """
+        if self.upload_registry is None:
+            return 0
+        
+        reaped = 0
+        for entry in await asyncio.to_thread(self.upload_registry.due_for_reaping):
+            try:
+                await asyncio.to_thread(genai.delete_file, name=entry.name)
+                reaped += 1
+            except Exception as e:
+                # 文件可能已被Gemini自动过期删除，登记记录照常移除
+                print(f"⚠ 删除上传文件失败 {entry.name}: {str(e)}")
+            await asyncio.to_thread(self.upload_registry.remove, entry.content_hash)
+        if reaped:
+            print(f"✓ 已回收 {reaped} 个闲置的上传文件")
+        return reaped
+        
+    def _normalize_prompts(self, prompts: List[Optional[str]]) -> List[str]:
+        """把None替换为默认提示词并去重（保持顺序），空列表时只使用默认提示词"""
+        normalized = [self.DEFAULT_PROMPT if p is None else p for p in prompts] or [self.DEFAULT_PROMPT]
+        return list(dict.fromkeys(normalized))
+    
+    @staticmethod
+    def _request(prompt: str, file_data: Optional[dict], video_metadata: Optional[dict],
+                 generation_config: Optional[dict], preset: Optional[MediaPreset]):
+        """构建请求内容和生成配置，并判断是否需要走REST接口
+        
+        Returns:
+            (contents, generation_config, 是否使用REST接口)
+        """
+        # 构建请求内容 - 使用官方推荐的file_data格式
+        parts = [{"text": prompt}]
+        if file_data is not None:
+            video_part = {"file_data": file_data}
+            # 采样预设的设置在前，片段起止时间覆盖预设中的起止时间
+            metadata = dict((preset and preset.video_metadata()) or {}, **(video_metadata or {}))
+            if metadata:
+                video_part["video_metadata"] = metadata
+            parts.append(video_part)
+            preset_config = preset and preset.generation_config()
+            if preset_config:
+                generation_config = dict(generation_config or {}, **preset_config)
+        contents = [{"parts": parts}]
+        # SDK不支持video_metadata和media_resolution，带这些字段的请求改用REST接口
+        use_rest = len(parts) > 1 and ("video_metadata" in parts[1] or "media_resolution" in (generation_config or {}))
+        return contents, generation_config, use_rest
+    
+    async def _generate(self, model: str, prompt: str, file_data: Optional[dict] = None,
+                        video_metadata: Optional[dict] = None, generation_config: Optional[dict] = None,
+                        preset: Optional[MediaPreset] = None) -> str:
+        """对一个视频（或纯文本）执行一个提示词，返回生成的文本
+        
+        Args:
+            model: 模型名称
+            prompt: 提示词
+            file_data: 视频引用，为None时只发送文本
+            video_metadata: 可选的片段起止时间
+            generation_config: 可选的生成配置
+            preset: 可选的视频采样预设
+        """
+        contents, generation_config, use_rest = self._request(
+            prompt, file_data, video_metadata, generation_config, preset)
+        
+        # 调用Gemini API（经限流器调度，429时自动暂停并重试；临时故障按重试策略重试）
+        if use_rest:
+            async def send():
+                return await gemini_rest.generate_content(
+                    await self._get_session(), self._api_key, model, contents, generation_config)
+        else:
+            model_instance = genai.GenerativeModel(model)
             
-            response = requests.post(
-                webhook_url,
-                json=data,
-                headers=headers,
-                timeout=30
-            )
+            async def send():
+                return await model_instance.generate_content_async(contents, generation_config=generation_config)
+        
+        async def request():
+            with self.metrics.span("generate", model=model):
+                return await send()
+        
+        response = await self._call(retry_policy.GENERATE, model, lambda: self.limiter.call(
+            model, request, usage=lambda r: r.usage_metadata.total_token_count))
+        self.metrics.record_usage(model, getattr(response, 'usage_metadata', None))
+        return errors.response_text(response)
+    
+    async def _answer(self, model: str, prompt: str, file_data: Optional[dict] = None,
+                      video_metadata: Optional[dict] = None, generation_config: Optional[dict] = None,
+                      preset: Optional[MediaPreset] = None) -> Tuple[str, str]:
+        """按对冲与降级策略执行一个提示词（参数同_generate）
+        
+        Returns:
+            (生成的文本, 实际给出结果的模型)
+        """
+        if self.hedging is None:
+            return await self._generate(model, prompt, file_data, video_metadata, generation_config, preset), model
+        
+        def request(candidate: str):
+            return self._generate(candidate, prompt, file_data, video_metadata, generation_config, preset)
+        
+        def on_hedge(hedge_model: str):
+            self.metrics.count("hedges_total", model=hedge_model)
+        
+        def on_fallback(failed: str, error: errors.AnalysisError):
+            self.metrics.count("fallbacks_total", model=failed, error_type=error.kind)
+        
+        return await hedging.with_fallback(
+            self.hedging, model, lambda candidate: hedging.hedged(self.hedging, candidate, request, on_hedge),
+            on_fallback)
+    
+    async def _generate_stream(self, model: str, prompt: str, file_data: Optional[dict] = None,
+                               preset: Optional[MediaPreset] = None) -> AsyncIterator[str]:
+        """流式执行一个提示词，逐块产出生成的文本"""
+        contents, generation_config, use_rest = self._request(
+            prompt, file_data, None, structured_report.generation_config(prompt), preset)
+        
+        # 返回时已收到第一块（或已确认请求被接受），429和临时故障会在这里抛出并重试，开始输出后不再重试
+        if use_rest:
+            async def request():
+                return await gemini_rest.stream_generate_content(
+                    await self._get_session(), self._api_key, model, contents, generation_config)
+        else:
+            model_instance = genai.GenerativeModel(model)
             
-            if response.status_code == 200:
-                print(f"✓ 成功发送到webhook: {webhook_url}")
-                return True
-            else:
-                print(f"✗ Webhook响应错误: {response.status_code}")
-                return False
-                
-        except requests.exceptions.RequestException as e:
-            print(f"✗ 发送到webhook失败: {str(e)}")
+            async def request():
+                return await model_instance.generate_content_async(
+                    contents, generation_config=generation_config, stream=True)
+        
+        with self.metrics.span("generate", model=model, stream=True):
+            response = await self._call(retry_policy.GENERATE, model, lambda: self.limiter.call(model, request))
+            async for chunk in response:
+                text = errors.response_text(chunk)
+                if text:
+                    yield text
+        self.metrics.record_usage(model, getattr(response, 'usage_metadata', None))
+    
+    async def _resolve_preset(self, preset: PresetSpec, model: str, prompts: List[str],
+                              file_data: dict) -> Optional[MediaPreset]:
+        """确定本次分析使用的采样预设；auto时先用count_tokens估算完整采样的token数，再按预算选择"""
+        preset = media_presets.get_preset(preset)
+        if preset != media_presets.AUTO:
+            return preset
+        if not self.token_budget:
+            return media_presets.PRESETS["full"]
+        
+        model_instance = genai.GenerativeModel(model)
+        prompt = max(prompts, key=len)
+        try:
+            with self.metrics.span("count_tokens", model=model):
+                total, prompt_only = await asyncio.gather(
+                    model_instance.count_tokens_async([{"parts": [{"text": prompt}, {"file_data": file_data}]}]),
+                    model_instance.count_tokens_async(prompt))
+            video_tokens = total.total_tokens - prompt_only.total_tokens
+            prompt_tokens = prompt_only.total_tokens
+        except Exception as e:
+            # 无法计数时按视频时长估算
+            duration = await self._video_duration(file_data)
+            if duration is None:
+                print(f"⚠ 无法估算token数（{str(e)}），使用balanced预设")
+                return media_presets.PRESETS["balanced"]
+            video_tokens = duration * media_presets.PRESETS["full"].tokens_per_second()
+            prompt_tokens = len(prompt) // 2
+        
+        chosen, estimate = media_presets.choose_preset(video_tokens, prompt_tokens, self.token_budget)
+        if estimate > self.token_budget:
+            print(f"⚠ 预估 {estimate} tokens，即使使用{chosen.name}预设也超过预算 {self.token_budget}")
+        else:
+            print(f"✓ 预估 {estimate} tokens，使用{chosen.name}预设（预算 {self.token_budget}）")
+        return chosen
+    
+    def _effective_preset(self, preset: PresetSpec):
+        """本次调用使用的采样预设：未指定时使用分析器的默认预设"""
+        return media_presets.get_preset(self.media_preset if preset is None else preset)
+    
+    def _preset_identity(self, identity: Optional[str], preset: PresetSpec) -> Optional[str]:
+        """缓存和请求合并使用的视频标识：不同采样预设的结果分开保存"""
+        preset = media_presets.get_preset(preset)
+        if identity is None or preset is None or preset == media_presets.PRESETS["full"]:
+            return identity
+        if preset == media_presets.AUTO:
+            return f"{identity}#preset=auto/{self.token_budget}"
+        return f"{identity}#preset={preset.key}"
+    
+    async def _fan_out(self, prompts: List[str], model: str, identity: Optional[str],
+                       acquire: Callable[[], Awaitable[dict]],
+                       release: Optional[Callable[[], Awaitable[None]]] = None,
+                       preset: PresetSpec = None) -> Dict[str, dict]:
+        """对同一个视频并行执行多个提示词
+        
+        先逐个查询结果缓存；只要还有未命中的提示词，就调用一次acquire获取视频（下载/上传只做一次），
+        然后让这些提示词并行引用同一个file_data生成结果。
+        
+        Args:
+            prompts: 已归一化的提示词列表
+            model: 使用的模型名称
+            identity: 视频归一化标识，未启用缓存时为None
+            acquire: 获取视频的协程函数，返回file_data
+            release: 可选的协程函数，所有提示词完成后释放视频
+            preset: 视频采样预设（标识中应已包含预设，见_preset_identity）
+            
+        Returns:
+            提示词 -> 结果，结果为 {"result": 文本, "cached": 是否命中缓存, "answered_by": 给出结果的模型}
+            或 {"error": 错误信息}；命中缓存的结果没有answered_by
+        """
+        outcomes: Dict[str, dict] = {}
+        cache_keys: Dict[str, Optional[str]] = {}
+        identity = self._cache_identity(identity)
+        for prompt in prompts:
+            cache_key = None
+            if self.cache is not None and identity is not None:
+                cache_key = ResultCache.make_key(identity, prompt, model)
+            cache_keys[prompt] = cache_key
+            result = await self._lookup(cache_key)
+            if result is not None:
+                outcomes[prompt] = {"result": result, "cached": True}
+        
+        missing = [p for p in prompts if p not in outcomes]
+        if not missing:
+            return outcomes
+        
+        file_data = await acquire()
+        try:
+            media = await self._resolve_preset(preset, model, missing, file_data)
+        except BaseException:
+            if release is not None:
+                await release()
+            raise
+        duration = None
+        if self.segment_seconds is not None:
+            duration = await self._video_duration(file_data)
+            if duration is None:
+                print("⚠ 无法确定视频时长，改为整段分析")
+        
+        async def run(prompt: str):
+            try:
+                if self._needs_segments(duration, media):
+                    result, answered_by = await self._generate_segmented(
+                        model, prompt, file_data, duration, identity, media)
+                else:
+                    result, answered_by = await self._answer(
+                        model, prompt, file_data, generation_config=structured_report.generation_config(prompt),
+                        preset=media)
+                # 结构化模式的结果校验后以紧凑JSON缓存
+                result = structured_report.normalize(prompt, result)
+            except Exception as e:
+                return prompt, self._failure(e)
+            await self._cache_put(cache_keys[prompt], result)
+            job_journal.note(job_journal.GENERATED)
+            return prompt, {"result": result, "cached": False, "answered_by": answered_by}
+        
+        try:
+            outcomes.update(await asyncio.gather(*(run(p) for p in missing)))
+        finally:
+            if release is not None:
+                await release()
+        return outcomes
+    
+    async def _video_duration(self, file_data: dict) -> Optional[float]:
+        """读取视频时长（秒）：YouTube视频读取观看页，上传文件读取处理后的video_metadata；无法确定时返回None"""
+        uri = file_data["file_uri"]
+        if youtube_identity(uri).startswith("youtube:"):
+            return await segmented_analysis.fetch_youtube_duration(
+                await self._get_session(), uri, headers=self.DOWNLOAD_HEADERS)
+        match = re.search(r'(files/[^/?]+)$', uri)
+        if match is None:
+            return None
+        try:
+            file_info = await asyncio.to_thread(genai.get_file, match.group(1))
+        except Exception as e:
+            print(f"⚠ 读取视频时长失败: {str(e)}")
+            return None
+        return segmented_analysis.file_duration(file_info)
+    
+    @staticmethod
+    def _analyzed_range(duration: float, preset: Optional[MediaPreset]) -> Tuple[float, float]:
+        """视频中实际分析的时间范围：采样预设设置了片段（--clip）时限定在片段内"""
+        start = (preset and preset.start_offset) or 0.0
+        end = duration
+        if preset is not None and preset.end_offset is not None:
+            end = min(end, preset.end_offset)
+        return start, max(start, end)
+    
+    def _needs_segments(self, duration: Optional[float], preset: Optional[MediaPreset]) -> bool:
+        """分析范围是否长于分段时长（需要分段分析）"""
+        if self.segment_seconds is None or duration is None:
             return False
+        start, end = self._analyzed_range(duration, preset)
+        return end - start > self.segment_seconds
+    
+    async def _generate_segmented(self, model: str, prompt: str, file_data: dict, duration: float,
+                                  identity: Optional[str], preset: Optional[MediaPreset] = None) -> Tuple[str, str]:
+        """按时间窗口分段并行分析一个视频，再合并为一份报告，返回 (报告, 给出合并结果的模型)"""
+        reduce_prompt = await self._map_segments(model, prompt, file_data, duration, identity, preset)
+        return await self._answer(model, reduce_prompt, generation_config=structured_report.generation_config(prompt))
+    
+    async def _map_segments(self, model: str, prompt: str, file_data: dict, duration: float,
+                            identity: Optional[str], preset: Optional[MediaPreset] = None) -> str:
+        """并行分析各时间片段，返回合并各片段结果的提示词
+        
+        并行阶段失败的片段在其余片段完成后逐个重试；启用缓存时每个片段的结果单独缓存，
+        重新分析时只需要补做失败的片段。
+        
+        Args:
+            model: 模型名称
+            prompt: 原始提示词
+            file_data: 视频引用
+            duration: 视频时长（秒）
+            identity: 视频标识（用于缓存片段结果），未启用缓存时为None
+            preset: 视频采样预设（片段的起止时间覆盖预设中的起止时间；预设设置了片段时只在其范围内分段）
+            
+        Returns:
+            合并用的提示词（纯文本请求）
+        """
+        start, end = self._analyzed_range(duration, preset)
+        segments = segmented_analysis.plan_segments(end, self.segment_seconds, self.segment_overlap, start)
+        structured = prompt == self.DEFAULT_PROMPT or structured_report.is_structured(prompt)
+        generation_config = {"response_mime_type": "application/json"} if structured else None
+        print(f"分析范围 {segmented_analysis.format_clock(start)}-{segmented_analysis.format_clock(end)}，"
+              f"分为 {len(segments)} 个片段并行分析")
         
-    def analyze_youtube_video(self, youtube_url: str, prompt: Optional[str] = None, model: str = "gemini-2.5-flash", webhook_url: Optional[str] = None) -> str:
+        async def run(segment: segmented_analysis.Segment) -> str:
+            segment_prompt = segmented_analysis.segment_prompt(prompt, segment, structured)
+            cache_key = None
+            if self.cache is not None and identity is not None:
+                cache_key = ResultCache.make_key(
+                    f"{identity}@{segment.start:g}-{segment.end:g}", segment_prompt, model)
+            result = await self._cache_get(cache_key)
+            if result is None:
+                result, _ = await self._answer(model, segment_prompt, file_data,
+                                               segmented_analysis.video_metadata(segment), generation_config, preset)
+                if structured:
+                    # 输出不是有效JSON时按失败处理并重试
+                    segmented_analysis.parse_segment_report(result)
+                await self._cache_put(cache_key, result)
+            return result
+        
+        results = await asyncio.gather(*(run(segment) for segment in segments), return_exceptions=True)
+        for segment in segments:
+            label = f"片段 {segment.index + 1}/{len(segments)}"
+            for attempt in range(1, self.segment_retries + 1):
+                if not isinstance(results[segment.index], BaseException):
+                    break
+                print(f"⚠ {label} 分析失败，重试 ({attempt}/{self.segment_retries}): {str(results[segment.index])}")
+                try:
+                    results[segment.index] = await run(segment)
+                except Exception as e:
+                    results[segment.index] = e
+            if isinstance(results[segment.index], BaseException):
+                error = errors.classify(results[segment.index], retry_policy.GENERATE)
+                raise type(error)(f"{label} 分析失败: {str(error)}", error.stage) from error
+        
+        return segmented_analysis.reduce_prompt(prompt, segments, results, end - start, structured)
+    
+    async def _deliver(self, webhook_url: Optional[str], analysis_type: str, source: dict,
+                       model: str, outcomes: Dict[str, dict], event: Optional[str] = None):
+        """把每个提示词的结果（或错误信息）分别放入webhook后台投递队列
+        
+        Args:
+            event: 可选的事件类型字段（逐节推送时最终结果标记为"final"）
+        """
+        self._store(analysis_type, source, model, outcomes)
+        if not webhook_url:
+            return
+        for prompt, outcome in outcomes.items():
+            webhook_data = {
+                "type": analysis_type,
+                "prompt": prompt,
+                **source,
+                "model": model,
+                **{k: v for k, v in outcome.items() if k != "exception"},
+                "timestamp": datetime.now().isoformat()
+            }
+            if structured_report.is_structured(prompt) and "result" in webhook_data:
+                # 结构化模式直接推送JSON对象，接收端不需要再解析文本
+                webhook_data["report"] = json.loads(webhook_data.pop("result"))
+            if event is not None:
+                webhook_data["event"] = event
+            await self.webhooks.submit(webhook_url, webhook_data)
+    
+    def _store(self, analysis_type: str, source: dict, model: str, outcomes: Dict[str, dict]):
+        """把成功的结果放入结果库的写入缓冲区（缓存命中已在首次分析时写入）
+        
+        攒满一批时立即在后台线程中写入，否则在flush_interval后写入，不阻塞事件循环。
+        """
+        if self.result_store is None:
+            return
+        video_type = self._VIDEO_TYPES[analysis_type]
+        source_value = next(iter(source.values()))
+        due = False
+        for prompt, outcome in outcomes.items():
+            if "result" in outcome and not outcome.get("cached"):
+                due = self.result_store.add(video_type, source_value, model, prompt, outcome["result"],
+                                            answered_by=outcome.get("answered_by")) or due
+        if due:
+            self._flush_store()
+        elif self._store_timer is None:
+            loop = asyncio.get_running_loop()
+            self._store_timer = loop.call_later(self.result_store.flush_interval, self._flush_store)
+    
+    def _flush_store(self):
+        """在后台线程中写入结果库的缓冲区（已有写入在进行时，剩余的结果由下一次定时写入）"""
+        if self._store_timer is not None:
+            self._store_timer.cancel()
+            self._store_timer = None
+        if self._store_task is not None and not self._store_task.done():
+            loop = asyncio.get_running_loop()
+            self._store_timer = loop.call_later(self.result_store.flush_interval, self._flush_store)
+            return
+        self._store_task = asyncio.create_task(self._write_store())
+    
+    async def _write_store(self):
+        try:
+            await asyncio.to_thread(self.result_store.flush)
+        except Exception as e:
+            print(f"⚠ 写入结果库失败: {str(e)}")
+    
+    async def _coalesce(self, identity: Optional[str], prompts: List[str], model: str,
+                        compute: Callable[[List[str]], Awaitable[Dict[str, dict]]]) -> Dict[str, dict]:
+        """合并并发的相同请求
+        
+        已有相同（视频标识, 提示词, 模型）的分析在进行时，该提示词直接等待并共享其结果；
+        其余提示词由本次调用执行，执行期间到来的相同请求会等待本次的结果。
+        
+        Args:
+            identity: 视频标识，为None时不合并
+            prompts: 已归一化的提示词列表
+            model: 使用的模型名称
+            compute: 对一组提示词执行分析的协程函数，返回每个提示词的结果
+            
+        Returns:
+            提示词 -> 结果，共享得到的结果带有 "coalesced": True
+        """
+        if self.flights is None or identity is None:
+            return await compute(prompts)
+        
+        keys = {p: SingleFlight.make_key(identity, p, model) for p in prompts}
+        waiting = {}
+        leading = []
+        for prompt in prompts:
+            future = self.flights.join(keys[prompt])
+            if future is not None:
+                waiting[prompt] = future
+            else:
+                self.flights.start(keys[prompt])
+                leading.append(prompt)
+        
+        outcomes: Dict[str, dict] = {}
+        try:
+            if leading:
+                outcomes = await compute(leading)
+        except BaseException as e:
+            error = errors.TransientError("合并的分析请求已被取消") if isinstance(e, asyncio.CancelledError) else e
+            for prompt in leading:
+                self.flights.finish(keys[prompt], error=error)
+            raise
+        for prompt in leading:
+            self.flights.finish(keys[prompt], outcomes[prompt])
+        
+        for prompt, future in waiting.items():
+            try:
+                # shield：跟随者被取消时不影响正在进行的分析和其他跟随者
+                shared = await asyncio.shield(future)
+            except Exception as e:
+                shared = self._failure(e)
+            outcomes[prompt] = dict(shared, coalesced=True)
+        return {p: outcomes[p] for p in prompts}
+    
+    def coalescing_stats(self) -> dict:
+        """请求合并统计：实际执行的分析数、被合并而节省的分析数、当前在途数"""
+        if self.flights is None:
+            return {"leaders": 0, "coalesced": 0, "in_flight": 0}
+        return self.flights.stats()
+    
+    @property
+    def _error_strings(self) -> bool:
+        """失败时是否返回错误信息文本（兼容模式，且调用方不在errors.raising上下文中）"""
+        return self.return_error_strings and not errors.raising_enabled()
+    
+    def _texts(self, outcomes: Dict[str, dict]) -> Dict[str, str]:
+        """提取每个提示词的结果文本；有提示词失败时抛出其错误（兼容模式下失败的提示词返回错误信息）"""
+        hedging.note_answers(outcomes)
+        if not self._error_strings:
+            for outcome in outcomes.values():
+                if "error" in outcome:
+                    raise outcome.get("exception") or errors.AnalysisError(outcome["error"])
+        return {prompt: outcome.get("result", outcome.get("error")) for prompt, outcome in outcomes.items()}
+        
+    async def analyze_youtube_video(self, youtube_url: str, prompt: Optional[str] = None, model: str = "gemini-2.5-flash", webhook_url: Optional[str] = None, preset: PresetSpec = None) -> str:
         """分析YouTube视频
         
         Args:
@@ -101,64 +887,54 @@ class GeminiVideoAnalyzer:
             prompt: 用户提示词，如果不提供则使用默认的YouTube科技视频分析提示词
             model: 使用的模型名称
             webhook_url: 可选的webhook地址，用于发送分析结果
+            preset: 视频采样预设（fast / balanced / full / auto），不提供时使用创建分析器时设置的默认预设
             
         Returns:
             分析结果文本
-        """
-        # 如果没有提供prompt，使用默认的YouTube科技视频分析提示词
-        if prompt is None:
-            prompt = self.DEFAULT_PROMPT
-        try:
-            # 构建请求内容 - 使用官方推荐的file_data格式
-            contents = [{
-                "parts": [
-                    {"text": prompt},
-                    {
-                        "file_data": {
-                            "file_uri": youtube_url
-                        }
-                    }
-                ]
-            }]
-            
-            # 调用Gemini API
-            model_instance = genai.GenerativeModel(model)
-            response = model_instance.generate_content(contents)
-            
-            result = response.text
-            
-            # 如果提供了webhook地址，发送结果
-            if webhook_url:
-                webhook_data = {
-                    "type": "youtube_video_analysis",
-                    "prompt": prompt,
-                    "video_url": youtube_url,
-                    "model": model,
-                    "result": result,
-                    "timestamp": __import__('datetime').datetime.now().isoformat()
-                }
-                self.send_to_webhook(webhook_url, webhook_data)
-            
-            return result
             
-        except Exception as e:
-            error_msg = f"分析过程中出现错误: {str(e)}"
+        Raises:
+            errors.AnalysisError: 分析失败（return_error_strings为True时改为返回错误信息）
+        """
+        results = await self.analyze_youtube_video_multi(youtube_url, [prompt], model, webhook_url, preset)
+        return next(iter(results.values()))
+    
+    async def analyze_youtube_video_multi(self, youtube_url: str, prompts: List[Optional[str]], model: str = "gemini-2.5-flash", webhook_url: Optional[str] = None, preset: PresetSpec = None) -> Dict[str, str]:
+        """用多个提示词并行分析同一个YouTube视频
+        
+        Args:
+            youtube_url: YouTube视频链接
+            prompts: 提示词列表，其中的None表示默认的YouTube科技视频分析提示词
+            model: 使用的模型名称
+            webhook_url: 可选的webhook地址，每个提示词的结果分别发送一次
+            preset: 视频采样预设（fast / balanced / full / auto），不提供时使用创建分析器时设置的默认预设
             
-            # 如果提供了webhook地址，也发送错误信息
-            if webhook_url:
-                webhook_data = {
-                    "type": "youtube_video_analysis",
-                    "prompt": prompt,
-                    "video_url": youtube_url,
-                    "model": model,
-                    "error": error_msg,
-                    "timestamp": __import__('datetime').datetime.now().isoformat()
-                }
-                self.send_to_webhook(webhook_url, webhook_data)
+        Returns:
+            提示词 -> 分析结果文本
             
-            return error_msg
+        Raises:
+            errors.AnalysisError: 任一提示词失败（其余提示词的结果照常缓存和发送webhook）
+        """
+        prompts = self._normalize_prompts(prompts)
+        preset = self._effective_preset(preset)
+        identity = self._preset_identity(youtube_identity(youtube_url), preset)
+        
+        async def acquire():
+            # YouTube视频直接通过链接引用，无需下载和上传
+            return {"file_uri": youtube_url}
+        
+        async def compute(pending: List[str]) -> Dict[str, dict]:
+            try:
+                return await self._fan_out(pending, model, identity, acquire, preset=preset)
+            except Exception as e:
+                return {p: self._failure(e) for p in pending}
+        
+        with self.metrics.job("youtube", youtube_url, model, len(prompts)) as job:
+            outcomes = await self._coalesce(identity, prompts, model, compute)
+            job.set_outcomes(outcomes)
+        await self._deliver(webhook_url, "youtube_video_analysis", {"video_url": youtube_url}, model, outcomes)
+        return self._texts(outcomes)
     
-    def analyze_local_video(self, video_path: str, prompt: Optional[str] = None, model: str = "gemini-2.5-flash", webhook_url: Optional[str] = None) -> str:
+    async def analyze_local_video(self, video_path: str, prompt: Optional[str] = None, model: str = "gemini-2.5-flash", webhook_url: Optional[str] = None, preset: PresetSpec = None) -> str:
         """分析本地视频文件
         
         Args:
@@ -166,83 +942,86 @@ class GeminiVideoAnalyzer:
             prompt: 用户提示词，如果不提供则使用默认的YouTube科技视频分析提示词
             model: 使用的模型名称
             webhook_url: 可选的webhook地址，用于发送分析结果
+            preset: 视频采样预设（fast / balanced / full / auto），不提供时使用创建分析器时设置的默认预设
             
         Returns:
             分析结果文本
-        """
-        # 如果没有提供prompt，使用默认的YouTube科技视频分析提示词
-        if prompt is None:
-            prompt = self.DEFAULT_PROMPT
-        try:
-            # 上传视频文件
-            print("正在上传视频文件...")
-            uploaded_file = genai.upload_file(path=video_path)
-            
-            # 等待文件处理完成
-            print("等待文件处理完成...")
-            file_info = genai.get_file(name=uploaded_file.name)
-            while file_info.state.name == "PROCESSING":
-                import time
-                time.sleep(2)
-                file_info = genai.get_file(name=uploaded_file.name)
             
+        Raises:
+            errors.AnalysisError: 分析失败（return_error_strings为True时改为返回错误信息）
+        """
+        results = await self.analyze_local_video_multi(video_path, [prompt], model, webhook_url, preset)
+        return next(iter(results.values()))
+    
+    def _local_video_handles(self, video_path: str):
+        """本地视频的获取/释放函数：acquire上传（或复用）视频并返回file_data，release清理上传"""
+        file_info = None
+        
+        async def acquire():
+            nonlocal file_info
+            # 获取上传文件（续跑时优先使用中断前的上传，启用登记表时复用仍有效的上传）
+            file_info = await self._resumed_upload() or await self._acquire_upload(video_path)
             if file_info.state.name == "FAILED":
-                return "视频文件处理失败"
-            
-            # 构建请求内容 - 使用官方推荐的file_data格式
-            contents = [{
-                "parts": [
-                    {"text": prompt},
-                    {
-                        "file_data": {
-                            "mime_type": uploaded_file.mime_type,
-                            "file_uri": uploaded_file.uri
-                        }
-                    }
-                ]
-            }]
-            
-            # 调用Gemini API
-            model_instance = genai.GenerativeModel(model)
-            response = model_instance.generate_content(contents)
-            
-            result = response.text
-            
+                await self._release_upload(file_info)
+                raise errors.ProcessingFailedError("视频文件处理失败", retry_policy.PROCESSING)
+            return {"mime_type": file_info.mime_type, "file_uri": file_info.uri}
+        
+        async def release():
             # 清理上传的文件
-            genai.delete_file(name=uploaded_file.name)
-            
-            # 如果提供了webhook地址，发送结果
-            if webhook_url:
-                webhook_data = {
-                    "type": "local_video_analysis",
-                    "prompt": prompt,
-                    "video_path": video_path,
-                    "model": model,
-                    "result": result,
-                    "timestamp": __import__('datetime').datetime.now().isoformat()
-                }
-                self.send_to_webhook(webhook_url, webhook_data)
-            
-            return result
-            
+            await self._release_upload(file_info)
+        
+        return acquire, release
+    
+    async def _local_video_outcomes(self, video_path: str, prompts: List[str], model: str,
+                                    preset: PresetSpec = None) -> Dict[str, dict]:
+        """上传一次本地视频并执行所有提示词，返回每个提示词的结果"""
+        acquire, release = self._local_video_handles(video_path)
+        try:
+            identity = None
+            if self.cache is not None:
+                # 按文件内容计算标识，同一视频的不同副本（包括下载的临时文件）共享缓存
+                identity = self._preset_identity(await asyncio.to_thread(file_identity, video_path), preset)
+            return await self._fan_out(prompts, model, identity, acquire, release, preset)
         except Exception as e:
-            error_msg = f"分析过程中出现错误: {str(e)}"
+            return {p: self._failure(e) for p in prompts}
+    
+    async def analyze_local_video_multi(self, video_path: str, prompts: List[Optional[str]], model: str = "gemini-2.5-flash", webhook_url: Optional[str] = None, preset: PresetSpec = None) -> Dict[str, str]:
+        """用多个提示词并行分析同一个本地视频文件，视频只上传和处理一次
+        
+        Args:
+            video_path: 本地视频文件路径
+            prompts: 提示词列表，其中的None表示默认的YouTube科技视频分析提示词
+            model: 使用的模型名称
+            webhook_url: 可选的webhook地址，每个提示词的结果分别发送一次
+            preset: 视频采样预设（fast / balanced / full / auto），不提供时使用创建分析器时设置的默认预设
             
-            # 如果提供了webhook地址，也发送错误信息
-            if webhook_url:
-                webhook_data = {
-                    "type": "local_video_analysis",
-                    "prompt": prompt,
-                    "video_path": video_path,
-                    "model": model,
-                    "error": error_msg,
-                    "timestamp": __import__('datetime').datetime.now().isoformat()
-                }
-                self.send_to_webhook(webhook_url, webhook_data)
+        Returns:
+            提示词 -> 分析结果文本
             
-            return error_msg
+        Raises:
+            errors.AnalysisError: 任一提示词失败（其余提示词的结果照常缓存和发送webhook）
+        """
+        prompts = self._normalize_prompts(prompts)
+        preset = self._effective_preset(preset)
+        
+        async def compute(pending: List[str]) -> Dict[str, dict]:
+            return await self._local_video_outcomes(video_path, pending, model, preset)
+        
+        with self.metrics.job("local", video_path, model, len(prompts)) as job:
+            identity = None
+            if self.flights is not None:
+                try:
+                    with self.metrics.span("hash"):
+                        identity = self._preset_identity(await asyncio.to_thread(file_identity, video_path), preset)
+                except OSError:
+                    # 文件不可读时不合并，由分析流程报告错误
+                    pass
+            outcomes = await self._coalesce(identity, prompts, model, compute)
+            job.set_outcomes(outcomes)
+        await self._deliver(webhook_url, "local_video_analysis", {"video_path": video_path}, model, outcomes)
+        return self._texts(outcomes)
     
-    def download_video(self, video_url: str) -> str:
+    async def download_video(self, video_url: str) -> str:
         """从网络链接下载视频到临时文件
         
         Args:
@@ -253,6 +1032,7 @@ class GeminiVideoAnalyzer:
         """
         try:
             print(f"正在下载视频: {video_url}")
+            job_journal.note(job_journal.DOWNLOADING)
             
             # 获取文件扩展名
             parsed_url = urllib.parse.urlparse(video_url)
@@ -271,37 +1051,132 @@ class GeminiVideoAnalyzer:
             temp_path = temp_file.name
             temp_file.close()
             
-            # 下载视频
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-            }
-            
-            req = urllib.request.Request(video_url, headers=headers)
+            # 下载视频（服务器支持Range时多连接分段下载）
+            # 重试只由下载阶段的重试策略负责，下载器自身不再重试分段，避免两层重试次数相乘
+            downloader = RangedDownloader(
+                await self._get_session(),
+                connections=self.download_connections,
+                max_retries=0,
+                headers=self.DOWNLOAD_HEADERS
+            )
+            try:
+                # 临时故障重试时从已完成的分段续传
+                with self.metrics.span("download"):
+                    await self._call(retry_policy.DOWNLOAD, None, lambda: downloader.download(video_url, temp_path))
+            except BaseException:
+                # 可续传的部分已被移到保留位置，这里只清理剩下的临时文件
+                if os.path.exists(temp_path):
+                    os.unlink(temp_path)
+                raise
             
-            with urllib.request.urlopen(req) as response:
-                total_size = int(response.headers.get('Content-Length', 0))
-                downloaded = 0
-                
-                with open(temp_path, 'wb') as f:
-                    while True:
-                        chunk = response.read(8192)
-                        if not chunk:
-                            break
-                        f.write(chunk)
-                        downloaded += len(chunk)
-                        
-                        if total_size > 0:
-                            progress = (downloaded / total_size) * 100
-                            print(f"\r下载进度: {progress:.1f}%", end='', flush=True)
-            
-            print(f"\n✓ 视频下载完成: {temp_path}")
+            print(f"✓ 视频下载完成: {temp_path}")
             return temp_path
             
         except Exception as e:
             print(f"\n✗ 视频下载失败: {str(e)}")
             raise
     
-    def analyze_video_url(self, video_url: str, prompt: Optional[str] = None, model: str = "gemini-2.5-flash", webhook_url: Optional[str] = None) -> str:
+    async def _url_version(self, video_url: str) -> Optional[str]:
+        """用HEAD请求取得网络视频当前版本的标识（链接 + ETag，或Last-Modified和大小），无法确定时返回None"""
+        try:
+            session = await self._get_session()
+            async with session.head(video_url, headers=self.DOWNLOAD_HEADERS, allow_redirects=True,
+                                    timeout=aiohttp.ClientTimeout(total=30)) as response:
+                if response.status >= 400:
+                    return None
+                etag = response.headers.get('ETag')
+                modified = response.headers.get('Last-Modified')
+                length = response.headers.get('Content-Length')
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            return None
+        # 弱ETag（W/前缀）不保证内容相同
+        if etag and not etag.startswith('W/'):
+            return f"{url_identity(video_url)}#etag={etag}"
+        if modified and length:
+            return f"{url_identity(video_url)}#modified={modified}/{length}"
+        return None
+    
+    async def _streamed_url_outcomes(self, video_url: str, prompts: List[str], model: str,
+                                     preset: PresetSpec = None) -> Optional[Dict[str, dict]]:
+        """边下载边上传网络视频并执行所有提示词
+        
+        启用缓存时先用HEAD请求取得视频版本，按版本查询结果缓存，只为未命中的提示词上传视频。
+        
+        Returns:
+            每个提示词的结果；流式上传不可用或中途失败时返回None，由调用方退回到临时文件方式
+        """
+        # 上传前按链接及其版本（ETag / Last-Modified）查询结果缓存，全部命中时不必下载和上传视频
+        outcomes: Dict[str, dict] = {}
+        version_keys: Dict[str, str] = {}
+        version = await self._url_version(video_url) if self.cache is not None else None
+        if version is not None:
+            version_identity = self._cache_identity(self._preset_identity(version, preset))
+            for prompt in prompts:
+                cache_key = ResultCache.make_key(version_identity, prompt, model)
+                result = await self._lookup(cache_key)
+                if result is not None:
+                    outcomes[prompt] = {"result": result, "cached": True}
+                else:
+                    version_keys[prompt] = cache_key
+            if not version_keys:
+                return outcomes
+        missing = [p for p in prompts if p not in outcomes]
+        
+        print(f"正在流式上传视频: {video_url}")
+        job_journal.note(job_journal.DOWNLOADING)
+        
+        async def upload():
+            with self.metrics.span("stream_upload"):
+                return await stream_to_gemini(
+                    await self._get_session(), self._api_key, video_url,
+                    headers=self.DOWNLOAD_HEADERS, upload_endpoint=self.UPLOAD_ENDPOINT)
+        
+        try:
+            # 与其他上传一样经过限流器（429时退避）、重试策略和熔断器
+            streamed = await self._call(retry_policy.UPLOAD, UPLOAD_KEY, lambda: self.limiter.call(UPLOAD_KEY, upload))
+        except Exception as e:
+            print(f"⚠ 流式上传失败，改为先下载到临时文件: {str(e)}")
+            return None
+        if streamed is None:
+            print("⚠ 无法确定视频大小，改为先下载到临时文件")
+            return None
+        
+        uploaded, content_hash = streamed
+        # 登记前的任何失败（处理超时、处理失败、取消）都要删除这次上传，否则回收器也找不到它
+        file_info = None
+        registered = False
+        try:
+            print("等待文件处理完成...")
+            file_info = await self._wait_for_file(uploaded['name'], size_bytes=int(uploaded.get('sizeBytes') or 0))
+            if file_info.state.name == "FAILED":
+                raise errors.ProcessingFailedError("视频文件处理失败", retry_policy.PROCESSING)
+            job_journal.note(job_journal.UPLOADED, file=file_info.name, identity=content_identity(content_hash))
+            
+            if self.upload_registry is not None:
+                # 流式上传前无法知道内容哈希，如已有同内容的旧上传，以新上传替换
+                previous = await asyncio.to_thread(self.upload_registry.lookup, content_hash)
+                await asyncio.to_thread(self.upload_registry.register, content_hash, file_info)
+                registered = True
+                if previous is not None and previous.name != file_info.name:
+                    await asyncio.to_thread(genai.delete_file, name=previous.name)
+                self._schedule_reap()
+            
+            async def acquire():
+                return {"mime_type": file_info.mime_type, "file_uri": file_info.uri}
+            
+            identity = self._preset_identity(content_identity(content_hash), preset)
+            outcomes.update(await self._fan_out(missing, model, identity, acquire, preset=preset))
+            for prompt, cache_key in version_keys.items():
+                if "result" in outcomes[prompt]:
+                    await self._cache_put(cache_key, outcomes[prompt]["result"])
+            return {p: outcomes[p] for p in prompts}
+        finally:
+            if registered:
+                await self._release_upload(file_info)
+            else:
+                await self._discard_upload(uploaded['name'])
+    
+    async def analyze_video_url(self, video_url: str, prompt: Optional[str] = None, model: str = "gemini-2.5-flash", webhook_url: Optional[str] = None, preset: PresetSpec = None) -> str:
         """分析网络视频链接
         
         Args:
@@ -309,56 +1184,111 @@ class GeminiVideoAnalyzer:
             prompt: 用户提示词，如果不提供则使用默认的YouTube科技视频分析提示词
             model: 使用的模型名称
             webhook_url: 可选的webhook地址，用于发送分析结果
+            preset: 视频采样预设（fast / balanced / full / auto），不提供时使用创建分析器时设置的默认预设
             
         Returns:
             分析结果文本
+            
+        Raises:
+            errors.AnalysisError: 分析失败（return_error_strings为True时改为返回错误信息）
         """
-        # 如果没有提供prompt，使用默认的YouTube科技视频分析提示词
-        if prompt is None:
-            prompt = self.DEFAULT_PROMPT
-        temp_path = None
-        try:
-            # 下载视频到临时文件
-            temp_path = self.download_video(video_url)
-            
-            # 使用本地视频分析方法
-            result = self.analyze_local_video(
-                video_path=temp_path,
-                prompt=prompt,
-                model=model,
-                webhook_url=None  # 不在这里发送webhook，在最后统一发送
-            )
+        results = await self.analyze_video_url_multi(video_url, [prompt], model, webhook_url, preset)
+        return next(iter(results.values()))
+    
+    async def analyze_report(self, video_type: str, source: str, model: str = "gemini-2.5-flash",
+                             webhook_url: Optional[str] = None, preset: PresetSpec = None) -> VideoReport:
+        """以结构化模式分析一个视频，返回校验过的结构化报告（需要Markdown时调用to_markdown）
+        
+        Args:
+            video_type: youtube / local / url
+            source: YouTube链接、本地文件路径或网络视频链接
+            model: 使用的模型名称
+            webhook_url: 可选的webhook地址，推送的结果为report字段中的JSON对象
+            preset: 视频采样预设
             
-            # 如果提供了webhook地址，发送结果
-            if webhook_url:
-                webhook_data = {
-                    "type": "video_url_analysis",
-                    "prompt": prompt,
-                    "video_url": video_url,
-                    "model": model,
-                    "result": result,
-                    "timestamp": __import__('datetime').datetime.now().isoformat()
-                }
-                self.send_to_webhook(webhook_url, webhook_data)
+        Returns:
+            structured_report.VideoReport
             
-            return result
+        Raises:
+            errors.AnalysisError: 分析失败（不受return_error_strings影响）
+        """
+        analyze = {
+            'youtube': self.analyze_youtube_video,
+            'local': self.analyze_local_video,
+            'url': self.analyze_video_url,
+        }[video_type]
+        text = await analyze(source, structured_report.PROMPT, model, webhook_url, preset)
+        try:
+            return structured_report.parse_report(text)
+        except errors.MalformedOutputError:
+            if self._error_strings:
+                # 兼容模式下失败时返回的是错误信息
+                raise errors.AnalysisError(text) from None
+            raise
+    
+    async def analyze_video_url_multi(self, video_url: str, prompts: List[Optional[str]], model: str = "gemini-2.5-flash", webhook_url: Optional[str] = None, preset: PresetSpec = None) -> Dict[str, str]:
+        """用多个提示词并行分析同一个网络视频，视频只下载、上传和处理一次
+        
+        Args:
+            video_url: 网络视频链接
+            prompts: 提示词列表，其中的None表示默认的YouTube科技视频分析提示词
+            model: 使用的模型名称
+            webhook_url: 可选的webhook地址，每个提示词的结果分别发送一次
+            preset: 视频采样预设（fast / balanced / full / auto），不提供时使用创建分析器时设置的默认预设
             
-        except Exception as e:
-            error_msg = f"分析网络视频时出现错误: {str(e)}"
+        Returns:
+            提示词 -> 分析结果文本
             
-            # 如果提供了webhook地址，也发送错误信息
-            if webhook_url:
-                webhook_data = {
-                    "type": "video_url_analysis",
-                    "prompt": prompt,
-                    "video_url": video_url,
-                    "model": model,
-                    "error": error_msg,
-                    "timestamp": __import__('datetime').datetime.now().isoformat()
-                }
-                self.send_to_webhook(webhook_url, webhook_data)
+        Raises:
+            errors.AnalysisError: 任一提示词失败（其余提示词的结果照常缓存和发送webhook）
+        """
+        prompts = self._normalize_prompts(prompts)
+        preset = self._effective_preset(preset)
+        # 下载前还不知道内容哈希，按链接合并
+        with self.metrics.job("url", video_url, model, len(prompts)) as job:
+            outcomes = await self._coalesce(
+                self._preset_identity(url_identity(video_url), preset), prompts, model,
+                lambda pending: self._url_outcomes(video_url, pending, model, preset))
+            job.set_outcomes(outcomes)
+        await self._deliver(webhook_url, "video_url_analysis", {"video_url": video_url}, model, outcomes)
+        return self._texts(outcomes)
+    
+    async def _uploaded_outcomes(self, file_info, identity: Optional[str], prompts: List[str], model: str,
+                                 preset: PresetSpec = None) -> Dict[str, dict]:
+        """对已上传并处理完成的视频执行所有提示词，完成后释放上传"""
+        async def acquire():
+            return {"mime_type": file_info.mime_type, "file_uri": file_info.uri}
+        
+        async def release():
+            await self._release_upload(file_info)
+        
+        return await self._fan_out(prompts, model, self._preset_identity(identity, preset), acquire, release, preset)
+    
+    async def _url_outcomes(self, video_url: str, prompts: List[str], model: str,
+                            preset: PresetSpec = None) -> Dict[str, dict]:
+        """获取网络视频（流式上传或下载到临时文件）并执行所有提示词，返回每个提示词的结果"""
+        temp_path = None
+        try:
+            outcomes = None
+            resumed = await self._resumed_upload()
+            if resumed is not None:
+                # 续跑时中断前的上传仍然有效，不再下载
+                outcomes = await self._uploaded_outcomes(
+                    resumed, job_journal.resumable_upload().identity, prompts, model, preset)
+            elif self.stream_uploads:
+                # 边下载边上传，失败时退回到临时文件方式
+                outcomes = await self._streamed_url_outcomes(video_url, prompts, model, preset)
             
-            return error_msg
+            if outcomes is None:
+                # 下载视频到临时文件
+                temp_path = await self.download_video(video_url)
+                
+                # 使用本地视频分析流程
+                outcomes = await self._local_video_outcomes(temp_path, prompts, model, preset)
+            
+        except Exception as e:
+            failure = self._failure(e, "分析网络视频时出现错误")
+            outcomes = {p: failure for p in prompts}
             
         finally:
             # 清理临时文件
@@ -368,6 +1298,399 @@ class GeminiVideoAnalyzer:
                     print(f"✓ 临时文件已清理: {temp_path}")
                 except Exception as e:
                     print(f"⚠ 清理临时文件失败: {str(e)}")
+        
+        return outcomes
+    
+    # 离线批量预测（batch_prediction.py）中各视频的类型：webhook中的type字段和视频地址字段
+    BATCH_ANALYSIS_TYPES = {
+        'youtube': ("youtube_video_analysis", "video_url"),
+        'local': ("local_video_analysis", "video_path"),
+        'url': ("video_url_analysis", "video_url"),
+    }
+    # webhook中的type字段 -> 视频类型（写入结果库时使用）
+    _VIDEO_TYPES = {analysis_type: video_type for video_type, (analysis_type, _) in BATCH_ANALYSIS_TYPES.items()}
+    
+    def _batch_preset(self) -> Optional[MediaPreset]:
+        """离线批量预测使用的采样预设：不做count_tokens预估，auto按full处理"""
+        preset = self._effective_preset(None)
+        return media_presets.PRESETS["full"] if preset == media_presets.AUTO else preset
+    
+    async def prepare_video(self, video_type: str, source: str):
+        """获取视频，供离线批量预测在请求中引用
+        
+        Args:
+            video_type: youtube / local / url（网络视频先下载到临时文件再上传，上传后删除临时文件）
+            source: 视频地址
+            
+        Returns:
+            (file_data, 视频标识（未启用缓存时为None）, 释放上传的协程函数（YouTube视频为None）)
+        """
+        if video_type == 'youtube':
+            return {"file_uri": source}, self._preset_identity(youtube_identity(source), self._batch_preset()), None
+        
+        temp_path = await self.download_video(source) if video_type == 'url' else None
+        try:
+            video_path = temp_path or source
+            identity = None
+            if self.cache is not None:
+                identity = self._preset_identity(await asyncio.to_thread(file_identity, video_path), self._batch_preset())
+            acquire, release = self._local_video_handles(video_path)
+            file_data = await acquire()
+        finally:
+            if temp_path and os.path.exists(temp_path):
+                os.unlink(temp_path)
+        return file_data, identity, release
+    
+    def build_request(self, prompt: str, file_data: dict) -> dict:
+        """生成REST格式的GenerateContentRequest（应用默认采样预设）"""
+        contents, generation_config, _ = self._request(
+            prompt, file_data, None, structured_report.generation_config(prompt), self._batch_preset())
+        return gemini_rest.request_body(contents, generation_config)
+    
+    async def lookup_result(self, identity: Optional[str], prompt: str, model: str) -> Optional[str]:
+        """查询整段分析的缓存结果"""
+        if self.cache is None or identity is None:
+            return None
+        return await self._lookup(ResultCache.make_key(identity, prompt, model))
+    
+    async def store_result(self, identity: Optional[str], prompt: str, model: str, result: str):
+        """缓存整段分析的结果"""
+        if identity is not None:
+            await self._cache_put(ResultCache.make_key(identity, prompt, model), result)
+    
+    async def deliver_result(self, webhook_url: Optional[str], video_type: str, source: str, model: str,
+                             prompt: str, outcome: dict):
+        """把离线批量预测中一个任务的结果放入webhook投递队列（格式与analyze_*方法相同）"""
+        analysis_type, source_field = self.BATCH_ANALYSIS_TYPES[video_type]
+        await self._deliver(webhook_url, analysis_type, {source_field: source}, model, {prompt: outcome})
+    
+    async def _stream_outcome(self, prompt: str, model: str, identity: Optional[str],
+                              acquire: Callable[[], Awaitable[dict]],
+                              release: Optional[Callable[[], Awaitable[None]]],
+                              emit: Callable[[str], Awaitable[None]],
+                              preset: PresetSpec = None) -> dict:
+        """流式执行一个提示词，每收到一块文本调用一次emit
+        
+        缓存命中时整个结果作为一块输出；超过分段时长的视频先并行分析各片段，再流式输出合并结果。
+        流式请求不发对冲请求；设置了降级链时，在输出第一块之前失败会改用下一个模型。
+        
+        Returns:
+            {"result": 文本, "cached": 是否命中缓存, "answered_by": 给出结果的模型} 或 {"error": 错误信息}
+        """
+        identity = self._cache_identity(identity)
+        cache_key = None
+        if self.cache is not None and identity is not None:
+            cache_key = ResultCache.make_key(identity, prompt, model)
+        result = await self._lookup(cache_key)
+        if result is not None:
+            await emit(result)
+            return {"result": result, "cached": True}
+        
+        parts = []
+        try:
+            file_data = await acquire()
+            try:
+                media = await self._resolve_preset(preset, model, [prompt], file_data)
+                text_prompt, video = prompt, file_data
+                if self.segment_seconds is not None:
+                    duration = await self._video_duration(file_data)
+                    if self._needs_segments(duration, media):
+                        text_prompt = await self._map_segments(model, prompt, file_data, duration, identity, media)
+                        video = None
+                
+                async def attempt(candidate: str) -> str:
+                    async for chunk in self._generate_stream(candidate, text_prompt, video, media if video else None):
+                        parts.append(chunk)
+                        await emit(chunk)
+                    return candidate
+                
+                if self.hedging is None:
+                    answered_by = await attempt(model)
+                else:
+                    # 开始输出后失败不再降级，避免调用方收到两个模型拼接的结果
+                    answered_by = await hedging.with_fallback(
+                        self.hedging, model, attempt, can_fall_back=lambda: not parts)
+            finally:
+                if release is not None:
+                    await release()
+            result = structured_report.normalize(prompt, ''.join(parts))
+        except Exception as e:
+            return self._failure(e)
+        
+        await self._cache_put(cache_key, result)
+        return {"result": result, "cached": False, "answered_by": answered_by}
+    
+    async def _stream_analysis(self, job_type: str, analysis_type: str, source: dict, video: str,
+                               prompt: Optional[str], model: str, webhook_url: Optional[str],
+                               progressive_webhook: bool, identity: Optional[str],
+                               acquire: Callable[[], Awaitable[dict]],
+                               release: Optional[Callable[[], Awaitable[None]]] = None,
+                               preset: PresetSpec = None) -> AsyncIterator[str]:
+        """在后台任务中执行流式分析，把文本块依次交给调用方
+        
+        分析在独立任务中运行（调用方迭代的快慢不影响生成），调用方提前停止迭代时取消分析。
+        失败时输出完已收到的文本块后抛出errors.AnalysisError（兼容模式下最后一块为错误信息）。
+        """
+        prompt = self._normalize_prompts([prompt])[0]
+        preset = self._effective_preset(preset)
+        identity = self._preset_identity(identity, preset)
+        chunks: asyncio.Queue = asyncio.Queue()
+        splitter = SectionSplitter() if webhook_url and progressive_webhook else None
+        sections_sent = 0
+        failure: Optional[errors.AnalysisError] = None
+        
+        async def send_sections(sections):
+            nonlocal sections_sent
+            for title, content in sections:
+                sections_sent += 1
+                await self.webhooks.submit(webhook_url, {
+                    "type": analysis_type,
+                    "event": "section",
+                    "prompt": prompt,
+                    **source,
+                    "model": model,
+                    "section": title,
+                    "index": sections_sent,
+                    "content": content,
+                    "timestamp": datetime.now().isoformat()
+                })
+        
+        async def emit(text: str):
+            await chunks.put(text)
+            if splitter is not None:
+                await send_sections(splitter.feed(text))
+        
+        async def produce():
+            nonlocal failure
+            try:
+                with self.metrics.job(job_type, video, model, 1) as job:
+                    outcome = await self._stream_outcome(prompt, model, identity, acquire, release, emit, preset)
+                    job.set_outcomes({prompt: outcome})
+                if "error" in outcome:
+                    if self._error_strings:
+                        await chunks.put(outcome["error"])
+                    else:
+                        failure = outcome["exception"]
+                elif splitter is not None:
+                    await send_sections(splitter.finish())
+                await self._deliver(webhook_url, analysis_type, source, model, {prompt: outcome},
+                                    event="final" if splitter is not None else None)
+            finally:
+                await chunks.put(None)
+        
+        task = asyncio.create_task(produce())
+        try:
+            while True:
+                chunk = await chunks.get()
+                if chunk is None:
+                    break
+                yield chunk
+            await task
+        finally:
+            if not task.done():
+                task.cancel()
+        if failure is not None:
+            raise failure
+    
+    async def stream_youtube_video(self, youtube_url: str, prompt: Optional[str] = None, model: str = "gemini-2.5-flash",
+                                   webhook_url: Optional[str] = None, progressive_webhook: bool = False,
+                                   preset: PresetSpec = None) -> AsyncIterator[str]:
+        """流式分析YouTube视频，生成的文本到达一块就产出一块
+        
+        Args:
+            youtube_url: YouTube视频链接
+            prompt: 用户提示词，如果不提供则使用默认的YouTube科技视频分析提示词
+            model: 使用的模型名称
+            webhook_url: 可选的webhook地址，分析完成后发送完整结果
+            progressive_webhook: 为True时报告每完成一个二级标题章节就先发送一次章节事件
+            preset: 视频采样预设（fast / balanced / full / auto），不提供时使用创建分析器时设置的默认预设
+            
+        Returns:
+            文本块的异步迭代器
+        """
+        async def acquire():
+            return {"file_uri": youtube_url}
+        
+        async for chunk in self._stream_analysis(
+                "youtube", "youtube_video_analysis", {"video_url": youtube_url}, youtube_url, prompt, model,
+                webhook_url, progressive_webhook, youtube_identity(youtube_url), acquire, preset=preset):
+            yield chunk
+    
+    async def stream_local_video(self, video_path: str, prompt: Optional[str] = None, model: str = "gemini-2.5-flash",
+                                 webhook_url: Optional[str] = None, progressive_webhook: bool = False,
+                                 preset: PresetSpec = None) -> AsyncIterator[str]:
+        """流式分析本地视频文件（参数同stream_youtube_video）"""
+        identity = None
+        if self.cache is not None:
+            try:
+                identity = await asyncio.to_thread(file_identity, video_path)
+            except OSError:
+                # 文件不可读时由上传步骤报告错误
+                pass
+        acquire, release = self._local_video_handles(video_path)
+        async for chunk in self._stream_analysis(
+                "local", "local_video_analysis", {"video_path": video_path}, video_path, prompt, model,
+                webhook_url, progressive_webhook, identity, acquire, release, preset):
+            yield chunk
+    
+    async def stream_video_url(self, video_url: str, prompt: Optional[str] = None, model: str = "gemini-2.5-flash",
+                               webhook_url: Optional[str] = None, progressive_webhook: bool = False,
+                               preset: PresetSpec = None) -> AsyncIterator[str]:
+        """流式分析网络视频（先下载到临时文件再上传，参数同stream_youtube_video）"""
+        temp_path = None
+        release_upload = None
+        
+        async def acquire():
+            nonlocal temp_path, release_upload
+            temp_path = await self.download_video(video_url)
+            acquire_upload, release_upload = self._local_video_handles(temp_path)
+            return await acquire_upload()
+        
+        async def release():
+            await release_upload()
+        
+        try:
+            async for chunk in self._stream_analysis(
+                    "url", "video_url_analysis", {"video_url": video_url}, video_url, prompt, model,
+                    webhook_url, progressive_webhook, None, acquire, release, preset):
+                yield chunk
+        finally:
+            # 清理临时文件
+            if temp_path and os.path.exists(temp_path):
+                os.unlink(temp_path)
+
+class GeminiVideoAnalyzer:
+    """Gemini视频分析器（同步版本）
+
+    AsyncGeminiVideoAnalyzer的轻量封装：所有调用都提交到一个专用的后台事件循环中执行，
+    因此可以在普通脚本或多个线程中直接调用。
+    """
+    
+    DEFAULT_PROMPT = AsyncGeminiVideoAnalyzer.DEFAULT_PROMPT
+    
+    def __init__(self, api_key: str, **options):
+        """初始化分析器
+        
+        Args:
+            api_key: Google AI API密钥
+            **options: 其余参数（如cache、upload_registry、stream_uploads）透传给AsyncGeminiVideoAnalyzer
+        """
+        self._async = AsyncGeminiVideoAnalyzer(api_key, **options)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_lock = threading.Lock()
+    
+    def _run(self, coro):
+        """在后台事件循环中执行协程并等待结果"""
+        with self._loop_lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(
+                    target=self._loop.run_forever,
+                    name="gemini-video-analyzer-loop",
+                    daemon=True
+                ).start()
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result()
+    
+    def _iterate(self, stream: AsyncIterator[str]) -> Iterator[str]:
+        """在后台事件循环中逐块迭代异步迭代器"""
+        async def next_chunk():
+            try:
+                return await stream.__anext__()
+            except StopAsyncIteration:
+                return None
+        
+        try:
+            while True:
+                chunk = self._run(next_chunk())
+                if chunk is None:
+                    return
+                yield chunk
+        finally:
+            # 调用方提前停止迭代时取消后台分析
+            self._run(stream.aclose())
+    
+    def close(self):
+        """投递完待发送的webhook，关闭HTTP会话并停止后台事件循环"""
+        with self._loop_lock:
+            loop, self._loop = self._loop, None
+        if loop is not None:
+            asyncio.run_coroutine_threadsafe(self._async.close(), loop).result()
+            loop.call_soon_threadsafe(loop.stop)
+    
+    def send_to_webhook(self, webhook_url: str, data: dict) -> bool:
+        """发送数据到webhook，参数说明见AsyncGeminiVideoAnalyzer.send_to_webhook"""
+        return self._run(self._async.send_to_webhook(webhook_url, data))
+    
+    def flush_webhooks(self):
+        """等待后台队列中的webhook全部投递完成"""
+        self._run(self._async.flush_webhooks())
+    
+    def replay_webhooks(self) -> int:
+        """重新投递发件箱中此前未送达的webhook，参数说明见AsyncGeminiVideoAnalyzer.replay_webhooks"""
+        return self._run(self._async.replay_webhooks())
+        
+    def analyze_youtube_video(self, youtube_url: str, prompt: Optional[str] = None, model: str = "gemini-2.5-flash", webhook_url: Optional[str] = None, preset: PresetSpec = None) -> str:
+        """分析YouTube视频，参数说明见AsyncGeminiVideoAnalyzer.analyze_youtube_video"""
+        return self._run(self._async.analyze_youtube_video(youtube_url, prompt, model, webhook_url, preset))
+    
+    def analyze_youtube_video_multi(self, youtube_url: str, prompts: List[Optional[str]], model: str = "gemini-2.5-flash", webhook_url: Optional[str] = None, preset: PresetSpec = None) -> Dict[str, str]:
+        """用多个提示词分析同一个YouTube视频，参数说明见AsyncGeminiVideoAnalyzer.analyze_youtube_video_multi"""
+        return self._run(self._async.analyze_youtube_video_multi(youtube_url, prompts, model, webhook_url, preset))
+    
+    def analyze_local_video(self, video_path: str, prompt: Optional[str] = None, model: str = "gemini-2.5-flash", webhook_url: Optional[str] = None, preset: PresetSpec = None) -> str:
+        """分析本地视频文件，参数说明见AsyncGeminiVideoAnalyzer.analyze_local_video"""
+        return self._run(self._async.analyze_local_video(video_path, prompt, model, webhook_url, preset))
+    
+    def analyze_local_video_multi(self, video_path: str, prompts: List[Optional[str]], model: str = "gemini-2.5-flash", webhook_url: Optional[str] = None, preset: PresetSpec = None) -> Dict[str, str]:
+        """用多个提示词分析同一个本地视频文件，参数说明见AsyncGeminiVideoAnalyzer.analyze_local_video_multi"""
+        return self._run(self._async.analyze_local_video_multi(video_path, prompts, model, webhook_url, preset))
+    
+    def stream_youtube_video(self, youtube_url: str, prompt: Optional[str] = None, model: str = "gemini-2.5-flash",
+                             webhook_url: Optional[str] = None, progressive_webhook: bool = False,
+                             preset: PresetSpec = None) -> Iterator[str]:
+        """流式分析YouTube视频，返回文本块迭代器，参数说明见AsyncGeminiVideoAnalyzer.stream_youtube_video"""
+        return self._iterate(self._async.stream_youtube_video(youtube_url, prompt, model, webhook_url, progressive_webhook, preset))
+    
+    def stream_local_video(self, video_path: str, prompt: Optional[str] = None, model: str = "gemini-2.5-flash",
+                           webhook_url: Optional[str] = None, progressive_webhook: bool = False,
+                           preset: PresetSpec = None) -> Iterator[str]:
+        """流式分析本地视频文件，返回文本块迭代器，参数说明见AsyncGeminiVideoAnalyzer.stream_youtube_video"""
+        return self._iterate(self._async.stream_local_video(video_path, prompt, model, webhook_url, progressive_webhook, preset))
+    
+    def stream_video_url(self, video_url: str, prompt: Optional[str] = None, model: str = "gemini-2.5-flash",
+                         webhook_url: Optional[str] = None, progressive_webhook: bool = False,
+                         preset: PresetSpec = None) -> Iterator[str]:
+        """流式分析网络视频，返回文本块迭代器，参数说明见AsyncGeminiVideoAnalyzer.stream_youtube_video"""
+        return self._iterate(self._async.stream_video_url(video_url, prompt, model, webhook_url, progressive_webhook, preset))
+    
+    def coalescing_stats(self) -> dict:
+        """请求合并统计，参数说明见AsyncGeminiVideoAnalyzer.coalescing_stats"""
+        return self._async.coalescing_stats()
+    
+    def render_metrics(self) -> str:
+        """以Prometheus文本格式导出分阶段耗时、token用量和任务计数"""
+        return self._async.metrics.render_prometheus()
+    
+    def reap_uploads(self) -> int:
+        """删除闲置超时的Gemini上传文件，参数说明见AsyncGeminiVideoAnalyzer.reap_uploads"""
+        return self._run(self._async.reap_uploads())
+    
+    def download_video(self, video_url: str) -> str:
+        """从网络链接下载视频到临时文件，参数说明见AsyncGeminiVideoAnalyzer.download_video"""
+        return self._run(self._async.download_video(video_url))
+    
+    def analyze_video_url(self, video_url: str, prompt: Optional[str] = None, model: str = "gemini-2.5-flash", webhook_url: Optional[str] = None, preset: PresetSpec = None) -> str:
+        """分析网络视频链接，参数说明见AsyncGeminiVideoAnalyzer.analyze_video_url"""
+        return self._run(self._async.analyze_video_url(video_url, prompt, model, webhook_url, preset))
+    
+    def analyze_report(self, video_type: str, source: str, model: str = "gemini-2.5-flash",
+                       webhook_url: Optional[str] = None, preset: PresetSpec = None) -> VideoReport:
+        """以结构化模式分析一个视频，参数说明见AsyncGeminiVideoAnalyzer.analyze_report"""
+        return self._run(self._async.analyze_report(video_type, source, model, webhook_url, preset))
+    
+    def analyze_video_url_multi(self, video_url: str, prompts: List[Optional[str]], model: str = "gemini-2.5-flash", webhook_url: Optional[str] = None, preset: PresetSpec = None) -> Dict[str, str]:
+        """用多个提示词分析同一个网络视频，参数说明见AsyncGeminiVideoAnalyzer.analyze_video_url_multi"""
+        return self._run(self._async.analyze_video_url_multi(video_url, prompts, model, webhook_url, preset))
 
 def main():
     """主函数"""
@@ -382,8 +1705,8 @@ def main():
             print("错误: 需要提供API密钥")
             sys.exit(1)
     
-    # 初始化分析器
-    analyzer = GeminiVideoAnalyzer(api_key)
+    # 初始化分析器（交互模式下失败时直接显示错误信息，继续下一次分析）
+    analyzer = GeminiVideoAnalyzer(api_key, return_error_strings=True)
     
     while True:
         print("\n选择分析模式:")
@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+对冲请求与模型降级链
+生成请求超过该模型近期延迟的某个分位数仍未返回时，再发出一个对冲请求（同一模型或指定的对冲模型），
+采用先成功返回的结果并取消另一个；某个模型出现后端故障（重试后仍为临时故障、配额耗尽、熔断）时，
+按降级链改用下一个模型。实际给出结果的模型写入结果的answered_by字段
+"""
+
+import asyncio
+import collections
+import contextlib
+import contextvars
+import threading
+import time
+from typing import Awaitable, Callable, Deque, Dict, List, Optional, Sequence, Tuple, TypeVar
+
+import errors
+
+T = TypeVar('T')
+
+# 当前analyze_*调用中各提示词实际给出结果的模型（见recording_answers）
+_answers: contextvars.ContextVar = contextvars.ContextVar('hedging_answers', default=None)
+
+
+class HedgingPolicy:
+    """对冲与降级策略（默认都不启用，按需打开）"""
+
+    def __init__(self, percentile: Optional[float] = None, hedge_model: Optional[str] = None,
+                 fallback_models: Sequence[str] = (), min_samples: int = 20, initial_delay: float = 30.0,
+                 min_delay: float = 1.0, window: int = 200):
+        """初始化策略
+
+        Args:
+            percentile: 延迟超过该模型近期延迟的这个分位数（如95）时发出对冲请求，None表示不对冲
+            hedge_model: 对冲请求使用的模型，None表示与原请求相同
+            fallback_models: 降级链：原模型出现后端故障时依次改用的模型
+            min_samples: 某个模型的延迟样本少于这个数时使用initial_delay作为对冲等待时间
+            initial_delay: 样本不足时的对冲等待时间（秒）
+            min_delay: 对冲等待时间的下限（秒），避免对快速请求也成倍发送
+            window: 每个模型保留的最近延迟样本数
+        """
+        if percentile is not None and not 0 < percentile < 100:
+            raise ValueError(f"对冲分位数必须在0到100之间: {percentile}")
+        self.percentile = percentile
+        self.hedge_model = hedge_model
+        self.fallback_models = list(fallback_models)
+        self.min_samples = max(1, min_samples)
+        self.initial_delay = initial_delay
+        self.min_delay = min_delay
+        self._samples: Dict[str, Deque[float]] = collections.defaultdict(
+            lambda: collections.deque(maxlen=window))
+        self._lock = threading.Lock()
+
+    def record(self, model: str, latency: float) -> None:
+        """记录一次生成请求的延迟（被取消的请求记录取消前已等待的时间）"""
+        with self._lock:
+            self._samples[model].append(latency)
+
+    def hedge_delay(self, model: str) -> float:
+        """model的请求等待多少秒仍未返回时发出对冲请求"""
+        with self._lock:
+            samples = sorted(self._samples[model])
+        if len(samples) < self.min_samples:
+            return max(self.min_delay, self.initial_delay)
+        index = min(len(samples) - 1, int(round(self.percentile / 100 * (len(samples) - 1))))
+        return max(self.min_delay, samples[index])
+
+    def chain(self, model: str) -> List[str]:
+        """model及其降级链（去重，保持顺序）"""
+        return list(dict.fromkeys([model, *self.fallback_models]))
+
+    @staticmethod
+    def falls_back(error: BaseException) -> bool:
+        """这个失败是否应该改用降级链中的下一个模型
+
+        后端故障（重试后仍失败的临时故障、配额耗尽）和熔断说明这个模型当前不可用；
+        输入无效、安全拦截换模型也不会成功。
+        """
+        error = errors.classify(error)
+        return error.backend_failure or isinstance(error, errors.CircuitOpenError)
+
+
+def from_options(percentile: Optional[float] = None, hedge_model: Optional[str] = None,
+                 fallback_models: Optional[Sequence[str]] = None) -> Optional[HedgingPolicy]:
+    """按命令行参数创建策略，都未设置时返回None（不启用）
+
+    只设置了对冲模型时按95分位数对冲。
+    """
+    if percentile is None and hedge_model is None and not fallback_models:
+        return None
+    if percentile is None and hedge_model is not None:
+        percentile = 95
+    return HedgingPolicy(percentile, hedge_model, fallback_models or ())
+
+
+async def _timed(policy: HedgingPolicy, model: str, request: Callable[[str], Awaitable[T]]) -> Tuple[T, str]:
+    start = time.monotonic()
+    try:
+        result = await request(model)
+    except asyncio.CancelledError:
+        # 对冲输掉的请求：至少这么慢，同样计入样本，分位数才不会被低估
+        policy.record(model, time.monotonic() - start)
+        raise
+    policy.record(model, time.monotonic() - start)
+    return result, model
+
+
+async def _cancel(tasks) -> None:
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def hedged(policy: HedgingPolicy, model: str, request: Callable[[str], Awaitable[T]],
+                 on_hedge: Optional[Callable[[str], None]] = None) -> Tuple[T, str]:
+    """执行一个请求，超过对冲等待时间仍未返回时再发出一个对冲请求，取先成功的结果
+
+    Args:
+        policy: 对冲策略（percentile为None时直接执行，不对冲）
+        model: 原请求的模型
+        request: 参数为模型名称、返回协程的函数
+        on_hedge: 发出对冲请求时调用，参数为对冲模型
+
+    Returns:
+        (结果, 给出结果的模型)
+
+    Raises:
+        两个请求都失败时抛出原请求的错误
+    """
+    if policy.percentile is None:
+        return await _timed(policy, model, request)
+    delay = policy.hedge_delay(model)
+    primary = asyncio.ensure_future(_timed(policy, model, request))
+    try:
+        done, _ = await asyncio.wait({primary}, timeout=delay)
+    except BaseException:
+        await _cancel([primary])
+        raise
+    if done:
+        return primary.result()
+
+    hedge_model = policy.hedge_model or model
+    print(f"⚠ {model} 超过 {delay:.1f} 秒未返回，发出对冲请求（{hedge_model}）")
+    if on_hedge is not None:
+        on_hedge(hedge_model)
+    hedge = asyncio.ensure_future(_timed(policy, hedge_model, request))
+    pending = {primary, hedge}
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+        # 都失败了：报告原请求的错误
+        return primary.result()
+    finally:
+        await _cancel(pending)
+
+
+async def with_fallback(policy: HedgingPolicy, model: str, attempt: Callable[[str], Awaitable[T]],
+                        on_fallback: Optional[Callable[[str, errors.AnalysisError], None]] = None,
+                        can_fall_back: Optional[Callable[[], bool]] = None) -> T:
+    """按降级链依次尝试：某个模型出现后端故障时改用下一个模型
+
+    Args:
+        policy: 对冲与降级策略
+        model: 首选模型
+        attempt: 参数为模型名称、返回协程的函数
+        on_fallback: 改用下一个模型前调用，参数为失败的模型和归类后的错误
+        can_fall_back: 失败后调用，返回False时不再降级（如流式请求已经开始输出）
+
+    Returns:
+        第一个成功的模型的结果
+
+    Raises:
+        不应降级的错误立即抛出；所有模型都失败时抛出最后一个错误
+    """
+    chain = policy.chain(model)
+    for index, candidate in enumerate(chain):
+        try:
+            return await attempt(candidate)
+        except Exception as e:
+            if index + 1 >= len(chain) or not policy.falls_back(e):
+                raise
+            if can_fall_back is not None and not can_fall_back():
+                raise
+            error = errors.classify(e)
+            print(f"⚠ {candidate} 不可用（{error.kind}），改用 {chain[index + 1]}: {str(error)}")
+            if on_fallback is not None:
+                on_fallback(candidate, error)
+    raise AssertionError("降级链不能为空")
+
+
+@contextlib.contextmanager
+def recording_answers():
+    """在此上下文中（以及其中创建的异步任务中）记录每个提示词实际给出结果的模型
+
+    Yields:
+        提示词 -> 模型 的字典，analyze_*返回后即可读取
+    """
+    answers: Dict[str, str] = {}
+    token = _answers.set(answers)
+    try:
+        yield answers
+    finally:
+        _answers.reset(token)
+
+
+def note_answers(outcomes: Dict[str, dict]) -> None:
+    """把结果中的answered_by写入当前recording_answers上下文，不在上下文中时不做任何事"""
+    answers = _answers.get()
+    if answers is None:
+        return
+    for prompt, outcome in outcomes.items():
+        if outcome.get("answered_by"):
+            answers[prompt] = outcome["answered_by"]
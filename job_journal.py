@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+批量任务日志（断点续跑）
+批量运行中每个任务经过的阶段（queued / downloading / uploaded / generated / delivered / failed）
+以JSON Lines追加写入日志文件并fsync。写入由后台线程成组提交：一次fsync落盘期间到达的所有记录
+在下一次写入中一起提交，高并发时fsync次数远少于记录数，记录阶段的调用方也不需要等待磁盘。
+运行中断（OOM、超时、Ctrl-C）后用同一个日志续跑，已完成的任务直接跳过，仍有效的上传继续使用
+"""
+
+import contextlib
+import contextvars
+import json
+import os
+import threading
+import time
+from typing import Dict, List, NamedTuple, Optional
+
+# 任务阶段
+QUEUED = 'queued'
+DOWNLOADING = 'downloading'
+UPLOADED = 'uploaded'
+GENERATED = 'generated'
+DELIVERED = 'delivered'
+FAILED = 'failed'
+
+
+class ResumableUpload(NamedTuple):
+    """中断前已完成的上传"""
+    name: str
+    identity: Optional[str] = None
+
+
+class _Tracking(NamedTuple):
+    journal: 'JobJournal'
+    job_id: str
+    upload: Optional[ResumableUpload]
+
+
+_current: contextvars.ContextVar = contextvars.ContextVar('job_journal_tracking', default=None)
+
+
+def load_journal(path: str) -> Dict[str, dict]:
+    """读取日志，返回每个任务的最新状态
+
+    Returns:
+        任务ID -> {"state": 最新阶段, "source": 视频地址, "upload": 最近一次上传（ResumableUpload或None）}
+    """
+    jobs: Dict[str, dict] = {}
+    if not os.path.exists(path):
+        return jobs
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                # 进程中断时最后一行可能只写了一半
+                continue
+            job = jobs.setdefault(entry['id'], {"state": None, "source": None, "upload": None})
+            job["state"] = entry['state']
+            if entry.get('source') is not None:
+                job["source"] = entry['source']
+            if entry['state'] == UPLOADED and entry.get('file'):
+                job["upload"] = ResumableUpload(entry['file'], entry.get('identity'))
+    return jobs
+
+
+class JobJournal:
+    """追加写入、成组fsync的任务日志"""
+
+    def __init__(self, path: str, resume: bool = False):
+        """打开日志
+
+        Args:
+            path: 日志文件路径
+            resume: 为True时读取已有记录并继续追加，否则清空重新记录
+        """
+        self.path = path
+        self.previous: Dict[str, dict] = load_journal(path) if resume else {}
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(path, 'a' if resume else 'w', encoding='utf-8')
+        self._pending: List[str] = []
+        self._submitted = 0
+        self._durable = 0
+        self._closed = False
+        self._error: Optional[BaseException] = None
+        self._cond = threading.Condition()
+        self.commits = 0
+        self._thread = threading.Thread(target=self._writer, name='job-journal-writer', daemon=True)
+        self._thread.start()
+
+    def mark(self, job_id: str, state: str, **fields) -> int:
+        """记录任务进入某个阶段（不等待落盘）
+
+        Returns:
+            记录序号，可传给sync等待其落盘
+        """
+        entry = {"id": job_id, "state": state, "t": round(time.time(), 3)}
+        entry.update((k, v) for k, v in fields.items() if v is not None)
+        line = json.dumps(entry, ensure_ascii=False) + '\n'
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("任务日志已关闭")
+            self._pending.append(line)
+            self._submitted += 1
+            self._cond.notify_all()
+            return self._submitted
+
+    def sync(self, seq: Optional[int] = None) -> None:
+        """等待序号不大于seq的记录（默认为目前所有记录）落盘"""
+        with self._cond:
+            target = self._submitted if seq is None else seq
+            while self._durable < target and self._error is None:
+                self._cond.wait()
+            if self._error is not None:
+                raise self._error
+
+    def _writer(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if not self._pending:
+                    return
+                lines, self._pending = self._pending, []
+                target = self._submitted
+            try:
+                # 一次写入、一次fsync提交这一组记录
+                self._file.write(''.join(lines))
+                self._file.flush()
+                os.fsync(self._file.fileno())
+            except OSError as e:
+                with self._cond:
+                    self._error = e
+                    self._cond.notify_all()
+                return
+            with self._cond:
+                self._durable = target
+                self.commits += 1
+                self._cond.notify_all()
+
+    def close(self) -> None:
+        """提交剩余记录并关闭日志"""
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join()
+        self._file.close()
+
+    def is_complete(self, job_id: str, source: str) -> bool:
+        """任务在中断前是否已经完成（视频地址变化时视为新任务）"""
+        job = self.previous.get(job_id)
+        return job is not None and job["state"] == DELIVERED and job["source"] in (None, source)
+
+    def resumable_upload(self, job_id: str, source: str) -> Optional[ResumableUpload]:
+        """任务在中断前完成的上传（仍需调用方确认其是否有效）"""
+        job = self.previous.get(job_id)
+        if job is None or job["source"] not in (None, source):
+            return None
+        return job["upload"]
+
+    @contextlib.contextmanager
+    def tracking(self, job_id: str, upload: Optional[ResumableUpload] = None):
+        """在此上下文中（以及其中创建的异步任务中）通过note记录的阶段归属于job_id
+
+        Args:
+            job_id: 任务ID
+            upload: 可复用的中断前上传
+        """
+        token = _current.set(_Tracking(self, job_id, upload))
+        try:
+            yield
+        finally:
+            _current.reset(token)
+
+
+def note(state: str, **fields) -> None:
+    """记录当前任务进入某个阶段，不在JobJournal.tracking上下文中时不做任何事"""
+    tracking = _current.get()
+    if tracking is not None:
+        tracking.journal.mark(tracking.job_id, state, **fields)
+
+
+def resumable_upload() -> Optional[ResumableUpload]:
+    """当前任务在中断前完成、可以尝试复用的上传"""
+    tracking = _current.get()
+    return tracking.upload if tracking is not None else None
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+延迟导入
+google.generativeai（连同grpc/protobuf）的导入需要约1秒，而命令行的--help、参数错误和缓存命中都用不到它。
+模块代理在第一次访问属性时才真正导入，导入后执行登记的回调（如用API密钥配置SDK）
+"""
+
+import importlib
+import threading
+from typing import Callable, List
+
+
+class LazyModule:
+    """第一次访问属性时才导入的模块代理"""
+
+    def __init__(self, name: str):
+        """初始化代理
+
+        Args:
+            name: 模块全名，如 "google.generativeai"
+        """
+        self._name = name
+        self._module = None
+        self._lock = threading.RLock()
+        self._on_load: List[Callable] = []
+
+    def _load(self):
+        if self._module is None:
+            with self._lock:
+                if self._module is None:
+                    module = importlib.import_module(self._name)
+                    for callback in self._on_load:
+                        callback(module)
+                    self._on_load = []
+                    self._module = module
+        return self._module
+
+    def __getattr__(self, attr: str):
+        return getattr(self._load(), attr)
+
+    @property
+    def loaded(self) -> bool:
+        """模块是否已经导入"""
+        return self._module is not None
+
+    def when_loaded(self, callback: Callable) -> None:
+        """模块导入后调用callback(模块)；已经导入时立即调用"""
+        with self._lock:
+            if self._module is None:
+                self._on_load.append(callback)
+                return
+        callback(self._module)
+
+
+def load(module) -> None:
+    """立即导入延迟的模块（如常驻进程启动时预热），普通模块不做任何事"""
+    if isinstance(module, LazyModule):
+        module._load()
+
+
+def call_when_loaded(module, function: str, *args, **kwargs) -> None:
+    """模块导入后调用其中的函数；模块已导入或不是延迟模块（如测试替身）时立即调用"""
+    if isinstance(module, LazyModule):
+        module.when_loaded(lambda loaded: getattr(loaded, function)(*args, **kwargs))
+    else:
+        getattr(module, function)(*args, **kwargs)
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+视频采样预设
+赞助和品牌分析大多只需要音轨加稀疏的画面。预设控制发送给Gemini的媒体分辨率（generation_config的
+media_resolution）、每秒采样帧数和起止时间（file_data所在part的video_metadata），以减少视频token和延迟；
+auto模式先用count_tokens估算完整采样的token数，再选出不超过预算的最高质量预设
+"""
+
+from typing import Dict, NamedTuple, Optional, Tuple, Union
+
+# 默认采样下每帧的token数、低分辨率下每帧的token数、每秒音频的token数
+DEFAULT_FRAME_TOKENS = 258
+LOW_FRAME_TOKENS = 66
+AUDIO_TOKENS_PER_SECOND = 32
+DEFAULT_FPS = 1.0
+
+# 根据token预算自动选择预设
+AUTO = 'auto'
+
+
+class MediaPreset(NamedTuple):
+    """视频采样设置，字段为None时使用Gemini的默认值"""
+    name: str
+    media_resolution: Optional[str] = None
+    fps: Optional[float] = None
+    start_offset: Optional[float] = None
+    end_offset: Optional[float] = None
+
+    def video_metadata(self) -> Optional[dict]:
+        """file_data所在part的video_metadata，全部使用默认值时为None"""
+        metadata = {}
+        if self.fps is not None:
+            metadata["fps"] = self.fps
+        if self.start_offset is not None:
+            metadata["start_offset"] = f"{self.start_offset:g}s"
+        if self.end_offset is not None:
+            metadata["end_offset"] = f"{self.end_offset:g}s"
+        return metadata or None
+
+    def generation_config(self) -> Optional[dict]:
+        """需要合并到generation_config中的设置"""
+        if self.media_resolution is None:
+            return None
+        return {"media_resolution": self.media_resolution}
+
+    def tokens_per_second(self) -> float:
+        """估算每秒视频消耗的token数（画面 + 音频）"""
+        frame_tokens = LOW_FRAME_TOKENS if self.media_resolution == "MEDIA_RESOLUTION_LOW" else DEFAULT_FRAME_TOKENS
+        fps = DEFAULT_FPS if self.fps is None else self.fps
+        return fps * frame_tokens + AUDIO_TOKENS_PER_SECOND
+
+    @property
+    def key(self) -> str:
+        """用于缓存和请求合并的标识"""
+        if self.name in PRESETS and PRESETS[self.name] == self:
+            return self.name
+        return ",".join(f"{k}={v}" for k, v in self._asdict().items() if v is not None)
+
+
+# 从低到高排列
+PRESETS: Dict[str, MediaPreset] = {
+    "fast": MediaPreset("fast", media_resolution="MEDIA_RESOLUTION_LOW", fps=0.25),
+    "balanced": MediaPreset("balanced", media_resolution="MEDIA_RESOLUTION_LOW", fps=1.0),
+    "full": MediaPreset("full"),
+}
+
+PresetSpec = Union[str, MediaPreset, None]
+
+
+def get_preset(spec: PresetSpec) -> Union[MediaPreset, str, None]:
+    """把预设名称解析为MediaPreset（"auto"原样返回）
+
+    Raises:
+        ValueError: 未知的预设名称
+    """
+    if spec is None or isinstance(spec, MediaPreset) or spec == AUTO:
+        return spec
+    if spec not in PRESETS:
+        raise ValueError(f"未知的采样预设: {spec}（可选 {' / '.join(PRESETS)} / {AUTO}）")
+    return PRESETS[spec]
+
+
+def with_clip(preset: Optional[MediaPreset], start: Optional[float], end: Optional[float]) -> MediaPreset:
+    """在预设上附加起止时间（秒）"""
+    return (preset or PRESETS["full"])._replace(start_offset=start, end_offset=end)
+
+
+def parse_clip(spec: str) -> Tuple[Optional[float], Optional[float]]:
+    """解析 START-END 格式的时间范围（秒），任一端可以省略，如 "60-600"、"-300"
+
+    Raises:
+        ValueError: 格式无效
+    """
+    start, sep, end = spec.partition('-')
+    if not sep:
+        raise ValueError(f"时间范围格式应为 START-END（秒）: {spec}")
+    start_s = float(start) if start.strip() else None
+    end_s = float(end) if end.strip() else None
+    if start_s is not None and end_s is not None and end_s <= start_s:
+        raise ValueError(f"结束时间必须大于开始时间: {spec}")
+    return start_s, end_s
+
+
+def estimate_tokens(preset: MediaPreset, video_tokens: float, prompt_tokens: float) -> int:
+    """按完整采样下的视频token数估算使用预设时一次请求的输入token数"""
+    ratio = preset.tokens_per_second() / PRESETS["full"].tokens_per_second()
+    return int(prompt_tokens + video_tokens * ratio)
+
+
+def choose_preset(video_tokens: float, prompt_tokens: float, budget: float) -> Tuple[MediaPreset, int]:
+    """选出估算token数不超过预算的最高质量预设；都超过预算时使用最省的预设
+
+    Args:
+        video_tokens: 完整采样下视频部分的token数
+        prompt_tokens: 提示词的token数
+        budget: 每次请求的输入token预算
+
+    Returns:
+        (预设, 估算的token数)
+    """
+    for name in reversed(list(PRESETS)):
+        estimate = estimate_tokens(PRESETS[name], video_tokens, prompt_tokens)
+        if estimate <= budget:
+            return PRESETS[name], estimate
+    cheapest = PRESETS[next(iter(PRESETS))]
+    return cheapest, estimate_tokens(cheapest, video_tokens, prompt_tokens)
@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+分析流程的分阶段耗时统计
+每个阶段（下载、上传、等待处理、生成、webhook投递）用计时span包裹，结果同时汇总为：
+按任务的结构化记录（JSON Lines）、Prometheus文本格式的直方图和计数器，
+以及可选的外部tracer钩子（兼容OpenTelemetry的tracer.start_as_current_span）
+"""
+
+import contextlib
+import contextvars
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+# 阶段耗时直方图的桶上限（秒）
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+_current_job: contextvars.ContextVar = contextvars.ContextVar('gemini_metrics_job', default=None)
+
+_LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict[str, object]) -> _LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items() if v is not None))
+
+
+def _format_labels(key: _LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+    items = list(key) + ([extra] if extra else [])
+    if not items:
+        return ''
+
+    def escape(value: str) -> str:
+        return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+    return '{' + ','.join(f'{k}="{escape(v)}"' for k, v in items) + '}'
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class _Histogram:
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.total += 1
+        self.sum += value
+
+
+class JobRecord:
+    """一次analyze_*调用的结构化记录"""
+
+    def __init__(self, analysis_type: str, source: str, model: str, prompts: int):
+        self.data = {
+            "type": analysis_type,
+            "source": source,
+            "model": model,
+            "prompts": prompts,
+            "started_at": datetime.now().isoformat(),
+            "stages": [],
+            "tokens": {"prompt": 0, "output": 0, "total": 0},
+        }
+        self._start = time.monotonic()
+
+    def add_stage(self, stage: str, duration: float, status: str, labels: Dict[str, object]) -> None:
+        entry = {"stage": stage, "duration_s": round(duration, 4), "status": status}
+        entry.update({k: v for k, v in labels.items() if v is not None})
+        self.data["stages"].append(entry)
+
+    def set_outcomes(self, outcomes: Dict[str, dict]) -> None:
+        """记录每个提示词的结果状态"""
+        self.data["succeeded"] = sum(1 for o in outcomes.values() if "result" in o)
+        self.data["failed"] = sum(1 for o in outcomes.values() if "error" in o)
+        self.data["cached"] = sum(1 for o in outcomes.values() if o.get("cached"))
+        self.data["coalesced"] = sum(1 for o in outcomes.values() if o.get("coalesced"))
+        answered = sorted({o["answered_by"] for o in outcomes.values() if o.get("answered_by")})
+        if answered:
+            self.data["answered_by"] = answered
+
+
+class _Span:
+    """计时span：同时记录到直方图、当前任务记录和外部tracer"""
+
+    def __init__(self, metrics: 'Metrics', stage: str, labels: Dict[str, object]):
+        self.metrics = metrics
+        self.stage = stage
+        self.labels = labels
+        self._tracer_cm = None
+
+    def __enter__(self):
+        tracer = self.metrics.tracer
+        if tracer is not None:
+            attributes = {k: str(v) for k, v in self.labels.items() if v is not None}
+            self._tracer_cm = tracer.start_as_current_span(f"gemini.{self.stage}", attributes=attributes)
+            self._tracer_cm.__enter__()
+        self._start = time.monotonic()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        duration = time.monotonic() - self._start
+        status = "ok" if exc_type is None else "error"
+        self.metrics.observe(self.stage, duration, status, self.labels)
+        if self._tracer_cm is not None:
+            self._tracer_cm.__exit__(exc_type, exc, tb)
+        return False
+
+
+class Metrics:
+    """分阶段耗时、token用量和任务计数的汇总"""
+
+    def __init__(self, jobs_path: Optional[str] = None, tracer=None,
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        """初始化统计
+
+        Args:
+            jobs_path: 可选的JSONL文件路径，每次analyze_*调用结束后追加一行任务记录
+            tracer: 可选的外部tracer，需提供 start_as_current_span(name, attributes=...)
+                并返回上下文管理器（如OpenTelemetry的Tracer）
+            buckets: 阶段耗时直方图的桶上限（秒）
+        """
+        self.jobs_path = jobs_path
+        self.tracer = tracer
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._histograms: Dict[_LabelKey, _Histogram] = {}
+        self._counters: Dict[str, Dict[_LabelKey, float]] = {}
+
+    def span(self, stage: str, **labels) -> _Span:
+        """为一个阶段计时
+
+        用法: with metrics.span("generate", model=model): ...
+        """
+        return _Span(self, stage, labels)
+
+    def observe(self, stage: str, duration: float, status: str = "ok", labels: Optional[Dict[str, object]] = None) -> None:
+        """记录一个阶段的耗时"""
+        labels = labels or {}
+        key = _label_key(dict(labels, stage=stage, status=status))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = _Histogram(self.buckets)
+            histogram.observe(duration)
+        job = _current_job.get()
+        if job is not None:
+            job.add_stage(stage, duration, status, labels)
+
+    def count(self, name: str, value: float = 1, **labels) -> None:
+        """累加一个计数器"""
+        key = _label_key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def record_usage(self, model: str, usage_metadata) -> None:
+        """记录一次生成请求的token用量（来自response.usage_metadata）"""
+        if usage_metadata is None:
+            return
+        tokens = {
+            "prompt": getattr(usage_metadata, 'prompt_token_count', 0) or 0,
+            "output": getattr(usage_metadata, 'candidates_token_count', 0) or 0,
+            "total": getattr(usage_metadata, 'total_token_count', 0) or 0,
+        }
+        for kind, value in tokens.items():
+            self.count("tokens_total", value, model=model, kind=kind)
+        job = _current_job.get()
+        if job is not None:
+            for kind, value in tokens.items():
+                job.data["tokens"][kind] += value
+
+    @contextlib.contextmanager
+    def job(self, analysis_type: str, source: str, model: str, prompts: int = 1):
+        """记录一次analyze_*调用；其中（包括其创建的异步任务中）的span都会归入该任务记录"""
+        record = JobRecord(analysis_type, source, model, prompts)
+        token = _current_job.set(record)
+        status = "ok"
+        try:
+            yield record
+        except BaseException:
+            status = "error"
+            raise
+        finally:
+            _current_job.reset(token)
+            if status == "ok" and record.data.get("failed") and not record.data.get("succeeded"):
+                status = "error"
+            record.data["status"] = status
+            record.data["duration_s"] = round(time.monotonic() - record._start, 4)
+            self.count("jobs_total", type=analysis_type, status=status)
+            self._write_job(record)
+
+    def _write_job(self, record: JobRecord) -> None:
+        if not self.jobs_path:
+            return
+        line = json.dumps(record.data, ensure_ascii=False) + '\n'
+        with self._lock:
+            with open(self.jobs_path, 'a', encoding='utf-8') as f:
+                f.write(line)
+
+    def render_prometheus(self) -> str:
+        """导出Prometheus文本格式"""
+        lines: List[str] = []
+        with self._lock:
+            if self._histograms:
+                lines.append("# HELP gva_stage_duration_seconds 分析各阶段耗时")
+                lines.append("# TYPE gva_stage_duration_seconds histogram")
+                for key in sorted(self._histograms):
+                    histogram = self._histograms[key]
+                    for bound, count in zip(histogram.buckets, histogram.counts):
+                        lines.append(f"gva_stage_duration_seconds_bucket{_format_labels(key, ('le', repr(float(bound))))} {count}")
+                    lines.append(f"gva_stage_duration_seconds_bucket{_format_labels(key, ('le', '+Inf'))} {histogram.total}")
+                    lines.append(f"gva_stage_duration_seconds_sum{_format_labels(key)} {histogram.sum:.6f}")
+                    lines.append(f"gva_stage_duration_seconds_count{_format_labels(key)} {histogram.total}")
+            for name in sorted(self._counters):
+                metric = f"gva_{name}"
+                lines.append(f"# TYPE {metric} counter")
+                for key, value in sorted(self._counters[name].items()):
+                    lines.append(f"{metric}{_format_labels(key)} {_format_value(value)}")
+        return '\n'.join(lines) + '\n'
+
+    def write_prometheus(self, path: str) -> None:
+        """把Prometheus文本原子地写入文件（可供node_exporter的textfile collector读取）"""
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(self.render_prometheus())
+        os.replace(tmp_path, path)
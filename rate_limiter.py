@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Gemini调用的客户端限流与配额调度
+每个模型（以及文件上传）各有一组令牌桶限制每分钟请求数和每分钟token数；
+收到429时暂停该模型的所有调用并按Retry-After退避后重试；
+交互式请求与批量任务分为两条优先级通道，交互式请求优先获得配额
+"""
+
+import asyncio
+import contextlib
+import contextvars
+import heapq
+import itertools
+import random
+import re
+import time
+from typing import Any, Awaitable, Callable, Dict, List, NamedTuple, Optional
+
+# 优先级通道：数值越小越优先
+INTERACTIVE = 0
+BULK = 1
+
+# 文件上传使用的配额键
+UPLOAD_KEY = 'files'
+
+_current_priority: contextvars.ContextVar = contextvars.ContextVar('gemini_priority', default=INTERACTIVE)
+
+_RETRY_DELAY_RE = re.compile(r'retry_delay\s*\{\s*seconds:\s*(\d+)')
+_RETRY_IN_RE = re.compile(r'retry in\s*([\d.]+)\s*s', re.IGNORECASE)
+
+
+class Quota(NamedTuple):
+    """一个模型的配额，None表示不限制"""
+    rpm: Optional[float] = None
+    tpm: Optional[float] = None
+
+
+@contextlib.contextmanager
+def priority_lane(priority: int):
+    """在此上下文中（以及其中创建的异步任务中）发起的Gemini调用使用指定的优先级通道"""
+    token = _current_priority.set(priority)
+    try:
+        yield
+    finally:
+        _current_priority.reset(token)
+
+
+def is_rate_limited(error: BaseException) -> bool:
+    """判断异常是否为429配额错误（google.api_core的ResourceExhausted或HTTP 429）"""
+    for attr in ('code', 'status'):
+        value = getattr(error, attr, None)
+        if isinstance(value, int) and value == 429:
+            return True
+    return type(error).__name__ in ('ResourceExhausted', 'TooManyRequests')
+
+
+def retry_after_seconds(error: BaseException) -> Optional[float]:
+    """从429错误中提取服务器建议的等待时间（Retry-After响应头或RetryInfo）"""
+    headers = getattr(error, 'headers', None)
+    if headers:
+        value = headers.get('Retry-After')
+        if value:
+            try:
+                return float(value)
+            except ValueError:
+                pass
+    text = str(error)
+    match = _RETRY_DELAY_RE.search(text) or _RETRY_IN_RE.search(text)
+    return float(match.group(1)) if match else None
+
+
+class TokenBucket:
+    """按速率连续补充的令牌桶，允许透支（按实际用量修正时余额可以为负）"""
+
+    def __init__(self, rate_per_minute: float, burst_seconds: float):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = max(1.0, self.rate * burst_seconds)
+        self.level = self.capacity
+        self._updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def delay_for(self, amount: float, now: float) -> float:
+        """距离余额足够支付amount还需等待的秒数（amount超过桶容量时按容量计算）"""
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        return 0.0 if self.level >= amount else (amount - self.level) / self.rate
+
+    def consume(self, amount: float) -> None:
+        self.level -= amount
+
+
+class _Lane:
+    """一个配额键（模型或文件上传）的调度状态"""
+
+    def __init__(self, quota: Quota, burst_seconds: float, initial_tokens: float):
+        self.requests = TokenBucket(quota.rpm, burst_seconds) if quota.rpm else None
+        self.tokens = TokenBucket(quota.tpm, burst_seconds) if quota.tpm else None
+        self.paused_until = 0.0
+        self.avg_tokens = initial_tokens
+        self.waiters: List[list] = []
+        self.wakeup = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+
+
+class RateLimiter:
+    """按模型的令牌桶限流器，所有Gemini调用都经过它调度"""
+
+    def __init__(self, quotas: Optional[Dict[str, Quota]] = None, default_quota: Quota = Quota(),
+                 burst_seconds: float = 10.0, initial_request_tokens: float = 30000,
+                 max_retries: int = 5, base_delay: float = 2.0, max_delay: float = 60.0):
+        """初始化限流器
+
+        Args:
+            quotas: 模型名称（或UPLOAD_KEY） -> 配额
+            default_quota: 未单独配置的模型使用的配额（不作用于UPLOAD_KEY）
+            burst_seconds: 令牌桶容量对应的秒数，决定允许的突发量（越小越平滑）
+            initial_request_tokens: 还没有实际用量数据时每个请求预估的token数，
+                之后按实际用量的滑动平均预估
+            max_retries: 遇到429时的最大重试次数
+            base_delay: 429没有给出Retry-After时的基础退避时间（秒）
+            max_delay: 最长退避时间（秒）
+        """
+        self.quotas = dict(quotas or {})
+        self.default_quota = default_quota
+        self.burst_seconds = burst_seconds
+        self.initial_request_tokens = initial_request_tokens
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.rate_limited = 0
+        self._lanes: Dict[str, _Lane] = {}
+        self._seq = itertools.count()
+
+    def _lane(self, key: str) -> _Lane:
+        if key not in self._lanes:
+            # 默认配额只作用于模型，文件上传需要单独配置
+            quota = self.quotas.get(key, Quota() if key == UPLOAD_KEY else self.default_quota)
+            self._lanes[key] = _Lane(quota, self.burst_seconds, self.initial_request_tokens)
+        return self._lanes[key]
+
+    async def acquire(self, key: str, tokens: Optional[float] = None,
+                      priority: Optional[int] = None) -> float:
+        """等待直到key的配额允许再发起一个请求
+
+        Args:
+            key: 模型名称或UPLOAD_KEY
+            tokens: 预估的token数，不提供时按该模型近期的平均用量估算
+            priority: 优先级通道，不提供时使用当前上下文的通道（见priority_lane）
+
+        Returns:
+            本次预扣的token数（用于按实际用量修正）
+        """
+        lane = self._lane(key)
+        if tokens is None:
+            tokens = lane.avg_tokens if lane.tokens is not None else 0
+        if priority is None:
+            priority = _current_priority.get()
+
+        if lane.requests is None and lane.tokens is None and lane.paused_until <= time.monotonic():
+            return tokens
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(lane.waiters, [priority, next(self._seq), future, tokens])
+        if lane.task is None or lane.task.done():
+            lane.task = asyncio.create_task(self._dispatch(lane))
+        else:
+            lane.wakeup.set()
+        await future
+        return tokens
+
+    async def _dispatch(self, lane: _Lane) -> None:
+        """按优先级依次放行等待中的请求，配额不足时等待补充"""
+        while lane.waiters:
+            _, _, future, tokens = lane.waiters[0]
+            if future.done():
+                heapq.heappop(lane.waiters)
+                continue
+
+            now = time.monotonic()
+            delay = lane.paused_until - now
+            if lane.requests is not None:
+                delay = max(delay, lane.requests.delay_for(1, now))
+            if lane.tokens is not None:
+                delay = max(delay, lane.tokens.delay_for(tokens, now))
+            if delay <= 0:
+                heapq.heappop(lane.waiters)
+                if lane.requests is not None:
+                    lane.requests.consume(1)
+                if lane.tokens is not None:
+                    lane.tokens.consume(tokens)
+                future.set_result(None)
+                continue
+
+            # 等待配额补充；期间有新请求（可能优先级更高）加入时重新检查队首
+            lane.wakeup.clear()
+            try:
+                await asyncio.wait_for(lane.wakeup.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+
+    def settle(self, key: str, reserved: float, actual: Optional[float]) -> None:
+        """请求完成后按实际token用量修正令牌桶，并更新该模型的平均用量"""
+        if actual is None:
+            return
+        lane = self._lane(key)
+        lane.avg_tokens = 0.8 * lane.avg_tokens + 0.2 * actual
+        if lane.tokens is not None:
+            lane.tokens.consume(actual - reserved)
+
+    def pause(self, key: str, seconds: float) -> None:
+        """收到429后暂停key的所有请求"""
+        lane = self._lane(key)
+        lane.paused_until = max(lane.paused_until, time.monotonic() + seconds)
+        lane.wakeup.set()
+
+    async def call(self, key: str, request: Callable[[], Awaitable[Any]], tokens: Optional[float] = None,
+                   usage: Optional[Callable[[Any], Optional[float]]] = None) -> Any:
+        """在配额允许时执行请求，遇到429暂停该key并退避重试
+
+        Args:
+            key: 模型名称或UPLOAD_KEY
+            request: 每次调用返回一个新协程的函数
+            tokens: 预估的token数
+            usage: 从响应中取出实际token用量的函数
+
+        Returns:
+            请求的返回值
+        """
+        for attempt in range(self.max_retries + 1):
+            reserved = await self.acquire(key, tokens)
+            try:
+                result = await request()
+            except Exception as e:
+                if not is_rate_limited(e) or attempt >= self.max_retries:
+                    raise
+                self.rate_limited += 1
+                delay = retry_after_seconds(e)
+                if delay is None:
+                    delay = random.uniform(0.5, 1.0) * min(self.max_delay, self.base_delay * 2 ** attempt)
+                print(f"⚠ {key} 配额受限(429)，暂停 {delay:.1f} 秒后重试 ({attempt + 1}/{self.max_retries})")
+                self.pause(key, delay)
+                continue
+            if usage is not None:
+                try:
+                    self.settle(key, reserved, usage(result))
+                except (AttributeError, TypeError):
+                    pass
+            return result
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+流式报告的章节切分
+把逐块到达的Markdown报告按二级标题（"## 1. 赞助信息"等）切分，
+某一节的下一个标题出现时即认为该节已完整，可以提前推送
+"""
+
+from typing import List, Optional, Tuple
+
+# (标题, 正文)
+Section = Tuple[str, str]
+
+
+class SectionSplitter:
+    """增量切分Markdown报告的二级标题章节"""
+
+    def __init__(self):
+        self._buffer = ''
+        self._title: Optional[str] = None
+        self._lines: List[str] = []
+        self._in_code = False
+
+    def feed(self, text: str) -> List[Section]:
+        """输入新到达的文本
+
+        Returns:
+            因此变为完整的章节（通常为0或1个）
+        """
+        self._buffer += text
+        completed = []
+        while '\n' in self._buffer:
+            line, self._buffer = self._buffer.split('\n', 1)
+            section = self._add_line(line)
+            if section is not None:
+                completed.append(section)
+        return completed
+
+    def finish(self) -> List[Section]:
+        """输出结束，返回最后一个章节"""
+        if self._buffer:
+            completed = [s for s in [self._add_line(self._buffer)] if s is not None]
+            self._buffer = ''
+        else:
+            completed = []
+        section = self._close()
+        if section is not None:
+            completed.append(section)
+        return completed
+
+    def _add_line(self, line: str) -> Optional[Section]:
+        if line.lstrip().startswith('```'):
+            self._in_code = not self._in_code
+        elif not self._in_code and line.startswith('## '):
+            section = self._close()
+            self._title = line[3:].strip()
+            return section
+        self._lines.append(line)
+        return None
+
+    def _close(self) -> Optional[Section]:
+        # 第一个二级标题之前的内容（如报告总标题）不单独推送
+        title, lines = self._title, self._lines
+        self._title, self._lines = None, []
+        if title is None:
+            return None
+        return title, '\n'.join(lines).strip()
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+分析结果磁盘缓存
+按 (归一化视频标识, 提示词哈希, 模型) 缓存分析结果，支持TTL过期和按容量的LRU淘汰。
+读取只执行一次SELECT：访问时间先记在内存中，在写入、淘汰或关闭时批量写回。
+淘汰（过期删除和容量检查）每 evict_every 次写入才执行一次，单次写入只有一条INSERT和一次提交
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional
+
+from video_identity import prompt_hash
+
+DEFAULT_CACHE_PATH = os.path.join(
+    os.path.expanduser('~'), '.cache', 'gemini_video_analyzer', 'results.sqlite3')
+
+
+class ResultCache:
+    """基于SQLite的分析结果缓存"""
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, ttl: float = 7 * 24 * 3600,
+                 max_entries: int = 10000, max_bytes: int = 512 * 1024 * 1024, evict_every: int = 50):
+        """初始化缓存
+
+        Args:
+            path: SQLite数据库文件路径
+            ttl: 缓存有效期（秒）
+            max_entries: 最多保留的条目数，超出后按最近最少使用淘汰
+            max_bytes: 结果文本总大小上限（字节），超出后按最近最少使用淘汰
+            evict_every: 每写入多少次执行一次淘汰（两次淘汰之间最多超出容量evict_every条）
+        """
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.evict_every = max(1, evict_every)
+        self._puts = 0
+        self._lock = threading.Lock()
+        # 键 -> 最近一次命中的时间，尚未写回数据库
+        self._accessed: Dict[str, float] = {}
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            " key TEXT PRIMARY KEY,"
+            " result TEXT NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " last_access REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_results_last_access ON results(last_access)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_results_created_at ON results(created_at)")
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(identity: str, prompt: str, model: str) -> str:
+        """根据视频标识、提示词和模型生成缓存键"""
+        raw = f"{identity}\n{prompt_hash(prompt)}\n{model}"
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """读取缓存结果，不存在或已过期时返回None
+
+        命中只记录在内存中，不写数据库（过期条目由之后的淘汰删除）。
+        """
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT result, created_at FROM results WHERE key = ?", (key,)).fetchone()
+            if row is None or now - row[1] > self.ttl:
+                return None
+            self._accessed[key] = now
+            return row[0]
+
+    def _flush_access(self) -> None:
+        """把内存中的访问时间写回数据库（调用方持有锁，由调用方提交）"""
+        if self._accessed:
+            self._conn.executemany("UPDATE results SET last_access = MAX(last_access, ?) WHERE key = ?",
+                                   [(at, key) for key, at in self._accessed.items()])
+            self._accessed.clear()
+
+    def flush(self) -> None:
+        """把内存中的访问时间写回数据库"""
+        with self._lock:
+            self._flush_access()
+            self._conn.commit()
+
+    def put(self, key: str, result: str) -> None:
+        """写入缓存结果，每evict_every次写入淘汰一次过期和超出容量的条目"""
+        now = time.time()
+        size = len(result.encode('utf-8'))
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO results (key, result, size, created_at, last_access)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (key, result, size, now, now))
+            self._puts += 1
+            if self._puts % self.evict_every == 0:
+                self._evict(now)
+            self._conn.commit()
+
+    def _evict(self, now: float) -> None:
+        """删除过期条目，再按LRU把条目数和总大小压到上限以内（调用方持有锁）"""
+        self._flush_access()
+        self._conn.execute("DELETE FROM results WHERE created_at < ?", (now - self.ttl,))
+        count, total = self._conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM results").fetchone()
+        if count <= self.max_entries and total <= self.max_bytes:
+            return
+
+        rows = self._conn.execute(
+            "SELECT key, size FROM results ORDER BY last_access ASC").fetchall()
+        victims = []
+        for key, size in rows:
+            if count <= self.max_entries and total <= self.max_bytes:
+                break
+            victims.append((key,))
+            count -= 1
+            total -= size
+        self._conn.executemany("DELETE FROM results WHERE key = ?", victims)
+
+    def clear(self) -> None:
+        """清空缓存"""
+        with self._lock:
+            self._conn.execute("DELETE FROM results")
+            self._accessed.clear()
+            self._conn.commit()
+
+    def close(self) -> None:
+        """写回访问时间并关闭数据库连接"""
+        with self._lock:
+            self._flush_access()
+            self._conn.commit()
+            self._conn.close()
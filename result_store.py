@@ -0,0 +1,478 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+本地分析结果库
+analyze_*的每个成功结果写入SQLite：报告表按视频标识、模型、时间和赞助判断建索引，
+品牌行单独成表并按品牌名和时间建索引，报告全文建FTS5索引（trigram分词，支持中文子串搜索），
+按日汇总的品牌统计由触发器维护，按品牌汇总时不需要逐行扫描。
+写入先进入缓冲区，攒满一批或超过间隔时在一个事务中批量写入；
+同一视频、提示词和模型只保留最新的结果。查询接口供 `cli_analyzer.py query` 使用
+"""
+
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import List, NamedTuple, Optional, Tuple
+
+from video_identity import prompt_hash, url_identity, youtube_identity, youtube_video_id
+
+DEFAULT_STORE_PATH = os.path.join(
+    os.path.expanduser('~'), '.cache', 'gemini_video_analyzer', 'reports.sqlite3')
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS reports ("
+    " id INTEGER PRIMARY KEY,"
+    " video_id TEXT NOT NULL,"
+    " video_type TEXT NOT NULL,"
+    " source TEXT NOT NULL,"
+    " model TEXT NOT NULL,"
+    " answered_by TEXT,"
+    " prompt_hash TEXT NOT NULL,"
+    " sponsorship TEXT,"
+    " kol_sentiment REAL,"
+    " report TEXT NOT NULL,"
+    " created_at REAL NOT NULL,"
+    " UNIQUE (video_id, prompt_hash, model))",
+    "CREATE INDEX IF NOT EXISTS idx_reports_created_at ON reports(created_at)",
+    "CREATE INDEX IF NOT EXISTS idx_reports_model ON reports(model, created_at)",
+    "CREATE INDEX IF NOT EXISTS idx_reports_sponsorship ON reports(sponsorship, created_at, model, kol_sentiment)",
+    # 品牌行（同一报告中的品牌按名称去重）冗余了模型、赞助判断和时间，按品牌统计时不需要回表
+    "CREATE TABLE IF NOT EXISTS brands ("
+    " report_id INTEGER NOT NULL,"
+    " brand TEXT NOT NULL,"
+    " name TEXT NOT NULL,"
+    " seconds REAL,"
+    " percent REAL,"
+    " sentiment REAL,"
+    " model TEXT NOT NULL,"
+    " sponsorship TEXT,"
+    " created_at REAL NOT NULL)",
+    # 覆盖索引：按品牌或按时间筛选品牌行时只读索引
+    "CREATE INDEX IF NOT EXISTS idx_brands_brand"
+    " ON brands(brand, created_at, model, sponsorship, report_id, seconds, percent, sentiment)",
+    "CREATE INDEX IF NOT EXISTS idx_brands_created_at"
+    " ON brands(created_at, brand, model, sponsorship, report_id, seconds, percent, sentiment)",
+    "CREATE INDEX IF NOT EXISTS idx_brands_report ON brands(report_id)",
+    # 按UTC日期汇总的品牌统计，由品牌行上的触发器维护；
+    # 按品牌汇总时整天的部分读这张表，只有起止时间所在的不完整的一天读品牌行
+    "CREATE TABLE IF NOT EXISTS brand_daily ("
+    " day INTEGER NOT NULL,"
+    " brand TEXT NOT NULL,"
+    " model TEXT NOT NULL,"
+    " sponsorship TEXT NOT NULL,"
+    " name TEXT NOT NULL,"
+    " videos INTEGER NOT NULL,"
+    " seconds REAL NOT NULL,"
+    " percent_sum REAL NOT NULL,"
+    " percent_count INTEGER NOT NULL,"
+    " sentiment_sum REAL NOT NULL,"
+    " sentiment_count INTEGER NOT NULL,"
+    " PRIMARY KEY (day, brand, model, sponsorship)) WITHOUT ROWID",
+    # 按品牌分组或筛选时顺序读取，不需要临时排序
+    "CREATE INDEX IF NOT EXISTS idx_brand_daily_brand ON brand_daily(brand, day, model, sponsorship, name,"
+    " videos, seconds, percent_sum, percent_count, sentiment_sum, sentiment_count)",
+    "CREATE TRIGGER IF NOT EXISTS brands_ai AFTER INSERT ON brands BEGIN"
+    " INSERT INTO brand_daily VALUES (CAST(new.created_at / 86400 AS INTEGER), new.brand, new.model,"
+    " COALESCE(new.sponsorship, ''), new.name, 1, COALESCE(new.seconds, 0),"
+    " COALESCE(new.percent, 0), new.percent IS NOT NULL, COALESCE(new.sentiment, 0), new.sentiment IS NOT NULL)"
+    " ON CONFLICT DO UPDATE SET name = excluded.name, videos = videos + 1, seconds = seconds + excluded.seconds,"
+    " percent_sum = percent_sum + excluded.percent_sum, percent_count = percent_count + excluded.percent_count,"
+    " sentiment_sum = sentiment_sum + excluded.sentiment_sum,"
+    " sentiment_count = sentiment_count + excluded.sentiment_count; END",
+    "CREATE TRIGGER IF NOT EXISTS brands_ad AFTER DELETE ON brands BEGIN"
+    " UPDATE brand_daily SET videos = videos - 1, seconds = seconds - COALESCE(old.seconds, 0),"
+    " percent_sum = percent_sum - COALESCE(old.percent, 0), percent_count = percent_count - (old.percent IS NOT NULL),"
+    " sentiment_sum = sentiment_sum - COALESCE(old.sentiment, 0),"
+    " sentiment_count = sentiment_count - (old.sentiment IS NOT NULL)"
+    " WHERE day = CAST(old.created_at / 86400 AS INTEGER) AND brand = old.brand AND model = old.model"
+    " AND sponsorship = COALESCE(old.sponsorship, '');"
+    " DELETE FROM brand_daily WHERE day = CAST(old.created_at / 86400 AS INTEGER) AND brand = old.brand"
+    " AND model = old.model AND sponsorship = COALESCE(old.sponsorship, '') AND videos <= 0; END",
+    # 报告全文索引（外部内容表，由触发器同步）
+    "CREATE TRIGGER IF NOT EXISTS reports_ai AFTER INSERT ON reports BEGIN"
+    " INSERT INTO reports_fts(rowid, report) VALUES (new.id, new.report); END",
+    "CREATE TRIGGER IF NOT EXISTS reports_ad AFTER DELETE ON reports BEGIN"
+    " INSERT INTO reports_fts(reports_fts, rowid, report) VALUES ('delete', old.id, old.report); END",
+    "CREATE TRIGGER IF NOT EXISTS reports_au AFTER UPDATE OF report ON reports BEGIN"
+    " INSERT INTO reports_fts(reports_fts, rowid, report) VALUES ('delete', old.id, old.report);"
+    " INSERT INTO reports_fts(rowid, report) VALUES (new.id, new.report); END",
+)
+
+_UPSERT = (
+    "INSERT INTO reports (video_id, video_type, source, model, answered_by, prompt_hash,"
+    " sponsorship, kol_sentiment, report, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+    " ON CONFLICT (video_id, prompt_hash, model) DO UPDATE SET"
+    " video_type = excluded.video_type, source = excluded.source, answered_by = excluded.answered_by,"
+    " sponsorship = excluded.sponsorship, kol_sentiment = excluded.kol_sentiment,"
+    " report = excluded.report, created_at = excluded.created_at"
+)
+
+# 默认提示词的Markdown报告中的字段
+_SPONSORSHIP_RE = re.compile(r'判断结果\s*[:：]\s*\**\s*(明确赞助|可能合作|无赞助)')
+_KOL_RE = re.compile(r'KOL情感\s*[:：]\s*\**\s*(\d+(?:\.\d+)?)')
+_NUMBER_RE = re.compile(r'-?\d+(?:\.\d+)?')
+
+# 按日汇总表brand_daily的日期粒度（秒，UTC日期）
+DAY = 86400
+
+_DURATION_RE = re.compile(r'^(\d+(?:\.\d+)?)\s*([smhdw])$')
+_DURATION_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400, 'w': 7 * 86400}
+
+
+class StoredReport(NamedTuple):
+    """待写入的一条结果"""
+    video_id: str
+    video_type: str
+    source: str
+    model: str
+    answered_by: Optional[str]
+    prompt_hash: str
+    report: str
+    created_at: float
+
+
+def video_id(video_type: str, source: str) -> str:
+    """结果库中的视频标识：YouTube视频用视频ID，网络视频用链接，本地文件用绝对路径"""
+    if video_type == 'youtube':
+        return youtube_identity(source)
+    if video_type == 'local':
+        return f"file:{os.path.abspath(source)}"
+    return url_identity(source)
+
+
+def guess_video_id(text: str) -> str:
+    """按输入的形式（YouTube链接、网络链接或本地路径）换算结果库中的视频标识，供查询使用"""
+    if youtube_video_id(text):
+        return video_id('youtube', text)
+    if '://' in text:
+        return video_id('url', text)
+    return video_id('local', text)
+
+
+def parse_time(text: str) -> float:
+    """把 7d / 12h / 30m 这样的相对时间（距现在）或ISO格式的日期时间转换为时间戳
+
+    Raises:
+        ValueError: 无法识别的格式
+    """
+    text = text.strip()
+    match = _DURATION_RE.match(text)
+    if match:
+        return time.time() - float(match.group(1)) * _DURATION_UNITS[match.group(2)]
+    try:
+        return datetime.fromisoformat(text).timestamp()
+    except ValueError:
+        raise ValueError(f"无法识别的时间: {text}（例如 7d、12h 或 2026-10-01）") from None
+
+
+def _number(value) -> Optional[float]:
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    match = _NUMBER_RE.search(str(value or ''))
+    return float(match.group(0)) if match else None
+
+
+def _json_facts(data: dict) -> Tuple[Optional[str], Optional[float], List[tuple]]:
+    brands = []
+    for brand in data.get("brands") or []:
+        if isinstance(brand, dict) and str(brand.get("name", "")).strip():
+            brands.append((str(brand["name"]).strip(), _number(brand.get("seconds")),
+                           _number(brand.get("percent")), _number(brand.get("sentiment"))))
+    return data.get("sponsorship"), _number(data.get("kol_sentiment")), brands
+
+
+def _markdown_facts(text: str) -> Tuple[Optional[str], Optional[float], List[tuple]]:
+    sponsorship = _SPONSORSHIP_RE.search(text)
+    kol = _KOL_RE.search(text)
+    brands = []
+    in_table = False
+    for line in text.splitlines():
+        line = line.strip()
+        if not line.startswith('|'):
+            in_table = False
+            continue
+        cells = [cell.strip().strip('*').strip() for cell in line.strip('|').split('|')]
+        if cells[0].startswith('品牌'):
+            # 品牌表的表头，其他表格不解析
+            in_table = True
+            continue
+        # 数据行：品牌 | 时长 | 占比 | 好感度 | 观点（跳过分隔行和模板占位）
+        if not in_table or len(cells) < 4 or not cells[0] or cells[0].startswith(('[', '-', ':')):
+            continue
+        seconds, percent, sentiment = (_number(cell) for cell in cells[1:4])
+        if seconds is None and percent is None and sentiment is None:
+            continue
+        brands.append((cells[0], seconds, percent, sentiment))
+    return (sponsorship.group(1) if sponsorship else None,
+            float(kol.group(1)) if kol else None, brands)
+
+
+def extract_facts(report: str) -> Tuple[Optional[str], Optional[float], List[tuple]]:
+    """从报告中取出赞助判断、KOL情感和品牌行 (名称, 时长, 占比, 好感度)
+
+    结构化模式的JSON直接读取字段；默认提示词的Markdown报告从品牌表和字段行中解析；
+    其他提示词的结果只建全文索引。
+    """
+    stripped = report.lstrip()
+    if stripped.startswith('{'):
+        try:
+            data = json.loads(stripped)
+        except ValueError:
+            data = None
+        if isinstance(data, dict):
+            return _json_facts(data)
+    return _markdown_facts(report)
+
+
+class ResultStore:
+    """基于SQLite的分析结果库"""
+
+    def __init__(self, path: str = DEFAULT_STORE_PATH, batch_size: int = 200, flush_interval: float = 2.0):
+        """初始化结果库
+
+        Args:
+            path: SQLite数据库文件路径
+            batch_size: 缓冲区中攒满多少条结果时立即写入
+            flush_interval: 缓冲区中最早的结果最多等待多少秒写入
+        """
+        self.path = path
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self._pending: List[StoredReport] = []
+        self._pending_since = 0.0
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        try:
+            self._conn.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS reports_fts"
+                " USING fts5(report, content='reports', content_rowid='id', tokenize='trigram')")
+        except sqlite3.OperationalError:
+            # SQLite早于3.34时没有trigram分词器（中文只能按整段匹配）
+            self._conn.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS reports_fts"
+                " USING fts5(report, content='reports', content_rowid='id')")
+        for statement in _SCHEMA:
+            self._conn.execute(statement)
+        self._conn.commit()
+
+    def add(self, video_type: str, source: str, model: str, prompt: str, report: str,
+            answered_by: Optional[str] = None, created_at: Optional[float] = None) -> bool:
+        """把一条结果放入写入缓冲区
+
+        Args:
+            video_type: youtube / local / url
+            source: 视频地址
+            model: 请求的模型
+            prompt: 提示词
+            report: 结果文本
+            answered_by: 实际给出结果的模型
+            created_at: 时间戳，默认为当前时间
+
+        Returns:
+            缓冲区是否已经攒满一批或等待超时，需要调用flush
+        """
+        now = time.time()
+        entry = StoredReport(video_id(video_type, source), video_type, source, model, answered_by,
+                             prompt_hash(prompt), report, created_at if created_at is not None else now)
+        with self._lock:
+            if not self._pending:
+                self._pending_since = now
+            self._pending.append(entry)
+            return len(self._pending) >= self.batch_size or now - self._pending_since >= self.flush_interval
+
+    def flush(self) -> int:
+        """在一个事务中写入缓冲区中的所有结果，返回写入的条数
+
+        Raises:
+            sqlite3.Error: 写入失败（事务已回滚，这批结果放回缓冲区，下次flush时重试）
+        """
+        with self._lock:
+            pending, self._pending = self._pending, []
+            if pending:
+                try:
+                    self._write(pending)
+                except BaseException:
+                    self._pending = pending + self._pending
+                    raise
+        return len(pending)
+
+    def _write(self, entries: List[StoredReport]) -> None:
+        """写入一批结果并替换其品牌行（调用方持有锁）"""
+        with self._conn:
+            for entry in entries:
+                sponsorship, kol_sentiment, brands = extract_facts(entry.report)
+                self._conn.execute(_UPSERT, (
+                    entry.video_id, entry.video_type, entry.source, entry.model, entry.answered_by,
+                    entry.prompt_hash, sponsorship, kol_sentiment, entry.report, entry.created_at))
+                report_id = self._conn.execute(
+                    "SELECT id FROM reports WHERE video_id = ? AND prompt_hash = ? AND model = ?",
+                    (entry.video_id, entry.prompt_hash, entry.model)).fetchone()[0]
+                self._conn.execute("DELETE FROM brands WHERE report_id = ?", (report_id,))
+                # 同一品牌在报告中出现多次时只保留第一行，按品牌统计的视频数才准确
+                rows = {}
+                for name, seconds, percent, sentiment in brands:
+                    rows.setdefault(name.lower(), (report_id, name.lower(), name, seconds, percent, sentiment,
+                                                   entry.model, sponsorship, entry.created_at))
+                self._conn.executemany(
+                    "INSERT INTO brands (report_id, brand, name, seconds, percent, sentiment, model, sponsorship,"
+                    " created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", list(rows.values()))
+
+    @staticmethod
+    def _clauses(table: str, brand: Optional[str] = None, min_sentiment: Optional[float] = None,
+                 max_sentiment: Optional[float] = None, since: Optional[float] = None,
+                 until: Optional[float] = None, model: Optional[str] = None,
+                 sponsorship: Optional[str] = None, search: Optional[str] = None,
+                 video: Optional[str] = None) -> Tuple[List[str], list]:
+        """把查询条件转换为SQL条件
+
+        Args:
+            table: 条件所在的表：b（品牌行，品牌和好感度条件只能用在品牌行上）或 r（报告）；
+                全文搜索和视频条件总是用在报告表r上
+
+        Returns:
+            (条件列表, 参数列表)
+        """
+        clauses, params = [], []
+        if table == 'b':
+            for clause, value in (("b.brand = ?", brand.strip().lower() if brand is not None else None),
+                                  ("b.sentiment >= ?", min_sentiment), ("b.sentiment <= ?", max_sentiment)):
+                if value is not None:
+                    clauses.append(clause)
+                    params.append(value)
+        for clause, value in ((f"{table}.created_at >= ?", since), (f"{table}.created_at < ?", until),
+                              (f"{table}.model = ?", model), (f"{table}.sponsorship = ?", sponsorship),
+                              ("r.video_id = ?", video)):
+            if value is not None:
+                clauses.append(clause)
+                params.append(value)
+        if search:
+            # 作为短语匹配，搜索文本中的引号和运算符不会被当作FTS语法
+            clauses.append("r.id IN (SELECT rowid FROM reports_fts WHERE reports_fts MATCH ?)")
+            params.append('"' + search.replace('"', '""') + '"')
+        return clauses, params
+
+    @staticmethod
+    def _where(clauses: List[str]) -> str:
+        return " WHERE " + " AND ".join(clauses) if clauses else ""
+
+    def _query(self, sql: str, params: list) -> List[dict]:
+        with self._lock:
+            cursor = self._conn.execute(sql, params)
+            columns = [c[0] for c in cursor.description]
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    def find(self, limit: int = 50, **filters) -> List[dict]:
+        """按条件查询结果，按时间倒序
+
+        Args:
+            limit: 最多返回的条数
+            **filters: brand / min_sentiment / max_sentiment（品牌行的好感度）、since / until（时间戳）、
+                model / sponsorship / search（全文搜索）/ video（视频标识，见guess_video_id）
+
+        Returns:
+            每条结果一个字典；有品牌或好感度条件时每个匹配的品牌行一条，并带有该品牌的时长、占比和好感度
+        """
+        columns = ("r.video_id, r.source, r.model, r.answered_by, r.sponsorship, r.kol_sentiment,"
+                   " datetime(r.created_at, 'unixepoch', 'localtime') AS created_at")
+        if any(filters.get(key) is not None for key in ('brand', 'min_sentiment', 'max_sentiment')):
+            clauses, params = self._clauses('b', **filters)
+            sql = (f"SELECT {columns}, b.name AS brand, b.seconds, b.percent, b.sentiment"
+                   f" FROM brands b JOIN reports r ON r.id = b.report_id{self._where(clauses)}"
+                   " ORDER BY b.created_at DESC LIMIT ?")
+        else:
+            clauses, params = self._clauses('r', **filters)
+            sql = f"SELECT {columns} FROM reports r{self._where(clauses)} ORDER BY r.created_at DESC LIMIT ?"
+        return self._query(sql, params + [limit])
+
+    def brand_stats(self, limit: int = 20, since: Optional[float] = None, until: Optional[float] = None,
+                    **filters) -> List[dict]:
+        """按品牌汇总：提及的视频数、总时长、平均占比和平均好感度，按视频数降序
+
+        只有品牌、时间、模型和赞助条件时从按日汇总表brand_daily读取整天的部分，
+        只有起止时间所在的不完整的一天才读品牌行；有好感度、全文搜索或视频条件时逐行汇总品牌行。
+
+        Args:
+            limit: 最多返回的品牌数
+            since / until: 时间范围（时间戳）
+            **filters: 其余条件同find
+        """
+        raw = ("SELECT b.brand, b.name, 1 AS videos, COALESCE(b.seconds, 0) AS seconds,"
+               " b.percent AS percent_sum, b.percent IS NOT NULL AS percent_count,"
+               " b.sentiment AS sentiment_sum, b.sentiment IS NOT NULL AS sentiment_count"
+               " FROM brands b")
+        if any(filters.get(key) is not None for key in ('min_sentiment', 'max_sentiment', 'search', 'video')):
+            clauses, params = self._clauses('b', since=since, until=until, **filters)
+            parts = [(raw + " JOIN reports r ON r.id = b.report_id" + self._where(clauses), params)]
+        else:
+            first_day = -(-since // DAY) if since is not None else None
+            last_day = until // DAY if until is not None else None
+            if first_day is not None and last_day is not None and first_day >= last_day:
+                # 不足一整天：全部读品牌行
+                clauses, params = self._clauses('b', since=since, until=until, **filters)
+                parts = [(raw + self._where(clauses), params)]
+            else:
+                clauses, params = self._clauses('b', **filters)
+                clauses = [c.replace("b.", "") for c in clauses]
+                if first_day is not None:
+                    clauses.append("day >= ?")
+                    params.append(int(first_day))
+                if last_day is not None:
+                    clauses.append("day < ?")
+                    params.append(int(last_day))
+                parts = [("SELECT brand, name, videos, seconds, percent_sum, percent_count, sentiment_sum,"
+                          " sentiment_count FROM brand_daily" + self._where(clauses), params)]
+                # 起止时间所在的不完整的一天
+                if first_day is not None and since < first_day * DAY:
+                    clauses, params = self._clauses('b', since=since, until=first_day * DAY, **filters)
+                    parts.append((raw + self._where(clauses), params))
+                if last_day is not None and until > last_day * DAY:
+                    clauses, params = self._clauses('b', since=last_day * DAY, until=until, **filters)
+                    parts.append((raw + self._where(clauses), params))
+        sql = ("SELECT MAX(name) AS brand, SUM(videos) AS videos, ROUND(SUM(seconds), 1) AS total_seconds,"
+               " ROUND(SUM(percent_sum) / SUM(percent_count), 1) AS avg_percent,"
+               " ROUND(SUM(sentiment_sum) / SUM(sentiment_count), 2) AS avg_sentiment"
+               f" FROM ({' UNION ALL '.join(part for part, _ in parts)})"
+               " GROUP BY brand ORDER BY videos DESC, total_seconds DESC LIMIT ?")
+        return self._query(sql, [p for _, part_params in parts for p in part_params] + [limit])
+
+    def sponsorship_stats(self, brand: Optional[str] = None, min_sentiment: Optional[float] = None,
+                          max_sentiment: Optional[float] = None, **filters) -> List[dict]:
+        """按赞助判断汇总：结果数和平均KOL情感
+
+        有品牌或好感度条件时只统计有匹配的品牌行的结果；其余条件同find。
+        """
+        clauses, params = self._clauses('r', **filters)
+        brand_clauses, brand_params = self._clauses('b', brand=brand, min_sentiment=min_sentiment,
+                                                    max_sentiment=max_sentiment,
+                                                    since=filters.get('since'), until=filters.get('until'))
+        if brand is not None or min_sentiment is not None or max_sentiment is not None:
+            # 品牌行冗余了时间，子查询可以直接按(品牌, 时间)索引取出匹配的结果
+            clauses.append(f"r.id IN (SELECT b.report_id FROM brands b{self._where(brand_clauses)})")
+            params += brand_params
+        sql = ("SELECT COALESCE(r.sponsorship, '未知') AS sponsorship, COUNT(*) AS reports,"
+               " ROUND(AVG(r.kol_sentiment), 2) AS avg_kol_sentiment"
+               f" FROM reports r{self._where(clauses)} GROUP BY r.sponsorship ORDER BY reports DESC")
+        return self._query(sql, params)
+
+    def count(self) -> int:
+        """已保存的结果数"""
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM reports").fetchone()[0]
+
+    def close(self) -> None:
+        """写入缓冲区中剩余的结果并关闭数据库连接"""
+        self.flush()
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+按阶段的重试策略
+下载、上传、生成各有一个重试策略，只有临时故障（TransientError）按指数退避重试；
+配额耗尽已由限流器按Retry-After重试过，输入无效、处理失败、安全拦截重试也不会成功。
+传入熔断器时每次尝试前检查熔断状态，结果计入熔断器
+"""
+
+import asyncio
+import random
+from typing import Any, Awaitable, Callable, Dict, NamedTuple, Optional
+
+import errors
+from circuit_breaker import CircuitBreaker
+
+DOWNLOAD = 'download'
+UPLOAD = 'upload'
+PROCESSING = 'processing'
+GENERATE = 'generate'
+
+
+class RetryPolicy(NamedTuple):
+    """一个阶段的重试策略"""
+    # 总尝试次数（1表示不重试）
+    attempts: int = 3
+    # 第一次重试前的基础等待时间（秒），之后每次加倍
+    base_delay: float = 1.0
+    # 最长等待时间（秒）
+    max_delay: float = 30.0
+
+    def delay(self, attempt: int) -> float:
+        """第attempt次（从0开始）失败后的等待时间，带随机抖动"""
+        return random.uniform(0.5, 1.0) * min(self.max_delay, self.base_delay * 2 ** attempt)
+
+
+NO_RETRY = RetryPolicy(attempts=1)
+
+DEFAULT_POLICIES: Dict[str, RetryPolicy] = {
+    DOWNLOAD: RetryPolicy(attempts=3, base_delay=2.0),
+    UPLOAD: RetryPolicy(attempts=3, base_delay=2.0),
+    GENERATE: RetryPolicy(attempts=3, base_delay=2.0),
+}
+
+
+def with_attempts(attempts: int) -> Dict[str, RetryPolicy]:
+    """所有阶段使用相同总尝试次数的重试策略（退避时间不变）"""
+    return {stage: policy._replace(attempts=max(1, attempts)) for stage, policy in DEFAULT_POLICIES.items()}
+
+
+async def call(stage: str, request: Callable[[], Awaitable[Any]], policy: Optional[RetryPolicy] = None,
+               breaker: Optional[CircuitBreaker] = None, key: Optional[str] = None,
+               on_retry: Optional[Callable[[errors.AnalysisError], None]] = None) -> Any:
+    """按重试策略执行一个阶段的请求
+
+    Args:
+        stage: 阶段名称（download / upload / generate）
+        request: 每次调用返回一个新协程的函数
+        policy: 重试策略，不提供时不重试
+        breaker: 可选的熔断器
+        key: 熔断器的键（模型名称或接口），为None时不经过熔断器
+        on_retry: 每次重试前调用，参数为本次失败的归类后异常
+
+    Returns:
+        请求的返回值
+
+    Raises:
+        AnalysisError: 归类后的最后一次失败（原始异常在__cause__中）
+    """
+    policy = policy or NO_RETRY
+    breaker = breaker if key is not None else None
+    attempt = 0
+    while True:
+        if breaker is not None:
+            breaker.check(key, stage)
+        try:
+            result = await request()
+        except Exception as e:
+            error = errors.classify(e, stage)
+            if breaker is not None:
+                breaker.record_failure(key, error)
+            if not error.retryable or attempt + 1 >= policy.attempts:
+                if error is e:
+                    raise
+                raise error from e
+            delay = policy.delay(attempt)
+            attempt += 1
+            print(f"⚠ {stage} 临时失败，{delay:.1f} 秒后重试 ({attempt}/{policy.attempts - 1}): {str(error)}")
+            if on_retry is not None:
+                on_retry(error)
+            await asyncio.sleep(delay)
+            continue
+        except BaseException:
+            if breaker is not None:
+                breaker.abandon(key)
+            raise
+        if breaker is not None:
+            breaker.record_success(key)
+        return result
@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+长视频分段分析（map-reduce）
+把视频按时间窗口切成若干片段（通过video_metadata的起止时间引用同一个YouTube链接或上传文件，
+不需要真正剪切视频），各片段并行分析，最后用一次纯文本请求合并为完整报告。
+使用默认提示词时，各片段输出结构化JSON，品牌提及时长在本地累加后再换算占比
+"""
+
+import json
+import re
+from typing import Dict, List, NamedTuple, Optional
+
+import aiohttp
+
+# 默认窗口长度和相邻窗口的重叠（秒）
+DEFAULT_WINDOW = 600
+DEFAULT_OVERLAP = 30
+
+# 赞助判断的强弱顺序，合并时取各片段中最强的结论
+SPONSORSHIP_LEVELS = ("无赞助", "可能合作", "明确赞助")
+
+_YOUTUBE_LENGTH_RE = re.compile(r'"lengthSeconds"\s*:\s*"(\d+)"')
+_JSON_FENCE_RE = re.compile(r'^```(?:json)?\s*|\s*```$')
+
+# 使用默认提示词时每个片段的输出要求
+SEGMENT_JSON_PROMPT = """你是YouTube科技视频分析专家。下面只分析视频的一个时间片段。
+
+只统计 {owned_start} 到 {owned_end} 之间的内容；{context_note}
+输出JSON（不要输出其他内容），字段如下：
+{{
+  "sponsorship": "明确赞助" | "可能合作" | "无赞助",
+  "sponsorship_evidence": "判断依据，没有则为空字符串",
+  "brands": [
+    {{"name": "品牌/产品", "seconds": 该片段中提及或展示的秒数, "sentiment": 好感度1-5, "opinion": "核心观点"}}
+  ],
+  "video_type": "该片段的内容类型",
+  "summary": "该片段内容简介（一两句话）",
+  "kol_sentiment": KOL情感倾向1-5,
+  "positives": ["正面评价"],
+  "negatives": ["负面评价"]
+}}
+
+请用中文分析，基于视频实际内容。"""
+
+# 合并各片段结果的提示词
+REDUCE_PROMPT = """下面是同一个视频按时间分段分析的结果（视频总时长 {duration}，共 {count} 个片段）。
+请把它们合并为一份完整的报告，严格按照原始分析要求中的输出格式输出，不要提及"片段"。
+
+原始分析要求：
+{prompt}
+
+{body}"""
+
+REDUCE_STRUCTURED_BODY = """品牌分析表已按整段视频累加计算，请原样使用其中的时长、占比和好感度，可以润色核心观点：
+{brand_table}
+
+赞助判断（各片段中最强的结论）: {sponsorship}
+赞助依据: {evidence}
+KOL情感（按片段平均）: {kol_sentiment}
+
+各片段摘要与评价（JSON）：
+{segments}"""
+
+
+class Segment(NamedTuple):
+    """一个分析片段：请求的时间范围为[start, end]，只统计[start, owned_end)内的内容"""
+    index: int
+    start: float
+    end: float
+    owned_end: float
+
+
+def plan_segments(duration: float, window: float = DEFAULT_WINDOW, overlap: float = DEFAULT_OVERLAP,
+                  start: float = 0.0) -> List[Segment]:
+    """把视频按时间窗口切分
+
+    相邻窗口重叠overlap秒，重叠部分只作为上下文，由前一个片段之后的片段统计，
+    因此各片段统计的范围首尾相接、互不重复，累加的时长不会重复计算。
+
+    Args:
+        duration: 视频总时长（秒），即切分范围的终点
+        window: 窗口长度（秒）
+        overlap: 相邻窗口的重叠（秒），必须小于窗口长度
+        start: 切分范围的起点（秒），只分析视频中的一段时使用
+
+    Returns:
+        片段列表（起止时间都在[start, duration]内）
+    """
+    if window <= 0 or not 0 <= overlap < window:
+        raise ValueError("分段窗口必须大于0，重叠必须小于窗口长度")
+    step = window - overlap
+    starts = []
+    while True:
+        starts.append(start)
+        if start + window >= duration:
+            break
+        start += step
+    return [
+        Segment(i, start, min(start + window, duration),
+                starts[i + 1] if i + 1 < len(starts) else duration)
+        for i, start in enumerate(starts)
+    ]
+
+
+def format_clock(seconds: float) -> str:
+    """把秒数格式化为 m:ss 或 h:mm:ss"""
+    seconds = int(round(seconds))
+    hours, rest = divmod(seconds, 3600)
+    minutes, secs = divmod(rest, 60)
+    return f"{hours}:{minutes:02d}:{secs:02d}" if hours else f"{minutes}:{secs:02d}"
+
+
+def video_metadata(segment: Segment) -> dict:
+    """片段对应的video_metadata（generateContent中与file_data同一个part）"""
+    return {"start_offset": f"{segment.start:g}s", "end_offset": f"{segment.end:g}s"}
+
+
+def segment_prompt(prompt: str, segment: Segment, structured: bool) -> str:
+    """生成一个片段使用的提示词
+
+    Args:
+        prompt: 原始提示词
+        segment: 片段
+        structured: 为True时要求输出结构化JSON（原始提示词为默认提示词时使用）
+    """
+    owned_start, owned_end = format_clock(segment.start), format_clock(segment.owned_end)
+    if segment.owned_end < segment.end:
+        context_note = f"{owned_end} 之后的部分只作为上下文，其中的内容由下一个片段统计。"
+    else:
+        context_note = "这是视频的最后一个片段。"
+    if structured:
+        return SEGMENT_JSON_PROMPT.format(owned_start=owned_start, owned_end=owned_end, context_note=context_note)
+    return (f"{prompt}\n\n注意：当前只提供了视频的一个片段，请只分析 {owned_start} 到 {owned_end} 之间的内容，"
+            f"{context_note}")
+
+
+def parse_segment_report(text: str) -> dict:
+    """解析片段输出的JSON（容忍Markdown代码块包裹）
+
+    Raises:
+        ValueError: 输出不是有效的JSON对象
+    """
+    data = json.loads(_JSON_FENCE_RE.sub('', text.strip()))
+    if not isinstance(data, dict):
+        raise ValueError("片段结果不是JSON对象")
+    return data
+
+
+def _number(value, default: float = 0.0) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def merge_segment_reports(reports: List[dict], duration: float) -> dict:
+    """合并各片段的结构化结果
+
+    品牌按名称（忽略大小写）累加提及时长，占比按视频总时长换算，好感度按时长加权平均；
+    赞助判断取最强的结论。
+
+    Returns:
+        合并结果，包含 brands / sponsorship / evidence / kol_sentiment / segments
+    """
+    brands: Dict[str, dict] = {}
+    sponsorship = SPONSORSHIP_LEVELS[0]
+    evidence = []
+    sentiments = []
+    for report in reports:
+        level = report.get("sponsorship")
+        if level in SPONSORSHIP_LEVELS and SPONSORSHIP_LEVELS.index(level) > SPONSORSHIP_LEVELS.index(sponsorship):
+            sponsorship = level
+        if report.get("sponsorship_evidence"):
+            evidence.append(report["sponsorship_evidence"])
+        if report.get("kol_sentiment") is not None:
+            sentiments.append(_number(report["kol_sentiment"], 3))
+
+        for brand in report.get("brands") or []:
+            name = str(brand.get("name", "")).strip()
+            if not name:
+                continue
+            seconds = max(0.0, _number(brand.get("seconds")))
+            entry = brands.setdefault(name.lower(), {
+                "name": name, "seconds": 0.0, "weighted": 0.0, "weight": 0.0, "opinions": []})
+            entry["seconds"] += seconds
+            # 时长为0的提及也计入好感度，权重按1秒计
+            weight = max(seconds, 1.0)
+            entry["weighted"] += _number(brand.get("sentiment"), 3) * weight
+            entry["weight"] += weight
+            if brand.get("opinion"):
+                entry["opinions"].append(str(brand["opinion"]))
+
+    merged_brands = []
+    for entry in sorted(brands.values(), key=lambda e: e["seconds"], reverse=True):
+        merged_brands.append({
+            "name": entry["name"],
+            "seconds": round(entry["seconds"], 1),
+            "percent": round(entry["seconds"] / duration * 100, 1) if duration > 0 else 0.0,
+            "sentiment": round(entry["weighted"] / entry["weight"], 1),
+            "opinions": entry["opinions"],
+        })
+    return {
+        "brands": merged_brands,
+        "sponsorship": sponsorship,
+        "evidence": evidence,
+        "kol_sentiment": round(sum(sentiments) / len(sentiments), 1) if sentiments else None,
+        "segments": [
+            {k: report.get(k) for k in ("video_type", "summary", "positives", "negatives")}
+            for report in reports
+        ],
+    }
+
+
+def brand_table(brands: List[dict]) -> str:
+    """把合并后的品牌统计渲染为默认报告格式中的Markdown表格"""
+    lines = ["| 品牌/产品 | 时长(秒) | 占比(%) | 好感度(1-5) | 核心观点 |", "|---|---|---|---|---|"]
+    for brand in brands:
+        opinion = "；".join(dict.fromkeys(brand["opinions"])) or "-"
+        lines.append(f"| {brand['name']} | {brand['seconds']:g} | {brand['percent']:g} | "
+                     f"{brand['sentiment']:g} | {opinion} |")
+    return "\n".join(lines)
+
+
+def reduce_prompt(prompt: str, segments: List[Segment], results: List[str], duration: float,
+                  structured: bool) -> str:
+    """生成合并各片段结果的提示词
+
+    Args:
+        prompt: 原始提示词
+        segments: 片段列表
+        results: 各片段的输出文本（与segments一一对应）
+        duration: 分析范围的时长（秒），整段分析时为视频总时长
+        structured: 片段结果是否为结构化JSON
+    """
+    if structured:
+        merged = merge_segment_reports([parse_segment_report(text) for text in results], duration)
+        for segment, entry in zip(segments, merged["segments"]):
+            entry["time"] = f"{format_clock(segment.start)}-{format_clock(segment.owned_end)}"
+        body = REDUCE_STRUCTURED_BODY.format(
+            brand_table=brand_table(merged["brands"]),
+            sponsorship=merged["sponsorship"],
+            evidence="；".join(merged["evidence"]) or "无",
+            kol_sentiment=merged["kol_sentiment"] if merged["kol_sentiment"] is not None else "未知",
+            segments=json.dumps(merged["segments"], ensure_ascii=False, indent=1))
+    else:
+        body = "\n\n".join(
+            f"### 片段 {s.index + 1}（{format_clock(s.start)}-{format_clock(s.owned_end)}）\n{text}"
+            for s, text in zip(segments, results))
+    return REDUCE_PROMPT.format(duration=format_clock(duration), count=len(segments), prompt=prompt, body=body)
+
+
+def file_duration(file_info) -> Optional[float]:
+    """从Gemini上传文件的video_metadata中读取视频时长（秒），处理完成前可能没有"""
+    duration = getattr(getattr(file_info, 'video_metadata', None), 'video_duration', None)
+    if duration is None:
+        return None
+    if hasattr(duration, 'total_seconds'):
+        seconds = duration.total_seconds()
+    else:
+        seconds = _number(getattr(duration, 'seconds', duration))
+    return seconds or None
+
+
+async def fetch_youtube_duration(session: aiohttp.ClientSession, youtube_url: str,
+                                 headers: Optional[dict] = None) -> Optional[float]:
+    """从YouTube观看页读取视频时长（秒），读取失败时返回None"""
+    try:
+        async with session.get(youtube_url, headers=headers,
+                               timeout=aiohttp.ClientTimeout(total=30)) as response:
+            if response.status != 200:
+                return None
+            match = _YOUTUBE_LENGTH_RE.search(await response.text())
+    except (aiohttp.ClientError, TimeoutError):
+        return None
+    return float(match.group(1)) if match else None
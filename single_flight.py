@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+相同分析请求的合并（single-flight）
+以（视频标识, 提示词哈希, 模型）为键记录正在进行的分析；同一个键的并发重复请求不再各自调用Gemini，
+而是等待正在进行的那一次并共享其结果
+"""
+
+import asyncio
+from typing import Dict, Hashable, Optional, Tuple
+
+from video_identity import prompt_hash
+
+
+class SingleFlight:
+    """进程内的在途请求合并表"""
+
+    def __init__(self):
+        self._flights: Dict[Hashable, asyncio.Future] = {}
+        self.leaders = 0
+        self.coalesced = 0
+
+    @staticmethod
+    def make_key(identity: str, prompt: str, model: str) -> Tuple[str, str, str]:
+        """合并键：视频标识 + 提示词哈希 + 模型"""
+        return identity, prompt_hash(prompt), model
+
+    def join(self, key: Hashable) -> Optional[asyncio.Future]:
+        """查找相同键的在途请求
+
+        Returns:
+            在途请求的结果Future；没有在途请求时返回None，调用方应当自己执行并调用start
+        """
+        future = self._flights.get(key)
+        if future is None:
+            return None
+        self.coalesced += 1
+        return future
+
+    def start(self, key: Hashable) -> None:
+        """登记一个由调用方执行的在途请求"""
+        future = asyncio.get_running_loop().create_future()
+        # 没有跟随者时异常不会被读取，避免"exception was never retrieved"警告
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self._flights[key] = future
+        self.leaders += 1
+
+    def finish(self, key: Hashable, result=None, error: Optional[BaseException] = None) -> None:
+        """结束在途请求，把结果（或异常）交给所有等待的跟随者"""
+        future = self._flights.pop(key, None)
+        if future is None or future.done():
+            return
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    @property
+    def in_flight(self) -> int:
+        """当前在途的请求数"""
+        return len(self._flights)
+
+    def stats(self) -> dict:
+        """合并统计：实际执行的请求数、被合并（节省）的请求数"""
+        return {"leaders": self.leaders, "coalesced": self.coalesced, "in_flight": self.in_flight}
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+网络视频流式上传
+边下载边通过Gemini Files API的可续传分块上传协议转发，
+内存中只保留有限个分块，不需要把整个视频先写到本地磁盘
+"""
+
+import asyncio
+import hashlib
+import mimetypes
+import os
+import urllib.parse
+from typing import Dict, Optional, Tuple
+
+import aiohttp
+
+GEMINI_UPLOAD_URL = "https://generativelanguage.googleapis.com/upload/v1beta/files"
+
+
+class ResumableUpload:
+    """Gemini Files API可续传上传会话"""
+
+    def __init__(self, session: aiohttp.ClientSession, api_key: str,
+                 upload_endpoint: str = GEMINI_UPLOAD_URL, max_retries: int = 3):
+        """初始化上传会话
+
+        Args:
+            session: 共享的aiohttp会话
+            api_key: Google AI API密钥
+            upload_endpoint: Files API上传地址
+            max_retries: 单个分块的最大重试次数
+        """
+        self.session = session
+        self.api_key = api_key
+        self.upload_endpoint = upload_endpoint
+        self.max_retries = max_retries
+        self.upload_url: Optional[str] = None
+
+    async def start(self, total_size: int, mime_type: str, display_name: str) -> int:
+        """开始上传会话
+
+        Returns:
+            服务器要求的分块粒度（字节），除最后一块外每块大小都必须是它的整数倍
+        """
+        headers = {
+            'x-goog-api-key': self.api_key,
+            'X-Goog-Upload-Protocol': 'resumable',
+            'X-Goog-Upload-Command': 'start',
+            'X-Goog-Upload-Header-Content-Length': str(total_size),
+            'X-Goog-Upload-Header-Content-Type': mime_type,
+        }
+        async with self.session.post(self.upload_endpoint, headers=headers,
+                                     json={'file': {'display_name': display_name}}) as response:
+            response.raise_for_status()
+            self.upload_url = response.headers['X-Goog-Upload-URL']
+            return int(response.headers.get('X-Goog-Upload-Chunk-Granularity', 256 * 1024))
+
+    async def send(self, data: bytes, offset: int, finalize: bool) -> Optional[dict]:
+        """上传一个分块，失败时查询服务器已接收的位置并补传剩余部分
+
+        Returns:
+            finalize为True时返回服务器的文件信息（JSON中的file字段），否则返回None
+        """
+        sent = 0
+        for attempt in range(self.max_retries + 1):
+            try:
+                headers = {
+                    'X-Goog-Upload-Offset': str(offset + sent),
+                    'X-Goog-Upload-Command': 'upload, finalize' if finalize else 'upload',
+                }
+                async with self.session.post(self.upload_url, headers=headers, data=data[sent:]) as response:
+                    response.raise_for_status()
+                    if finalize:
+                        return (await response.json()).get('file')
+                    return None
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if attempt >= self.max_retries:
+                    raise
+                print(f"\n⚠ 分块上传失败，重试 ({attempt + 1}/{self.max_retries}): {str(e)}")
+                await asyncio.sleep(min(2 ** attempt, 10))
+                received = await self._query_received()
+                sent = max(0, min(received - offset, len(data)))
+
+    async def _query_received(self) -> int:
+        """查询服务器已经接收的字节数"""
+        headers = {'X-Goog-Upload-Command': 'query'}
+        async with self.session.post(self.upload_url, headers=headers) as response:
+            response.raise_for_status()
+            return int(response.headers.get('X-Goog-Upload-Size-Received', 0))
+
+
+def _guess_mime_type(video_url: str, content_type: Optional[str]) -> str:
+    """根据响应头或链接扩展名推断视频的MIME类型"""
+    if content_type and content_type.split(';')[0].strip().startswith('video/'):
+        return content_type.split(';')[0].strip()
+    guessed, _ = mimetypes.guess_type(urllib.parse.urlparse(video_url).path)
+    return guessed if guessed and guessed.startswith('video/') else 'video/mp4'
+
+
+async def stream_to_gemini(session: aiohttp.ClientSession, api_key: str, video_url: str,
+                           headers: Optional[Dict[str, str]] = None,
+                           chunk_size: int = 8 * 1024 * 1024, buffer_chunks: int = 4,
+                           upload_endpoint: str = GEMINI_UPLOAD_URL) -> Optional[Tuple[dict, str]]:
+    """边下载边把网络视频上传到Gemini
+
+    Args:
+        session: 共享的aiohttp会话
+        api_key: Google AI API密钥
+        video_url: 网络视频链接
+        headers: 下载时附加的请求头
+        chunk_size: 上传分块大小（会向上取整为服务器分块粒度的整数倍）
+        buffer_chunks: 下载与上传之间最多缓冲的分块数，决定内存占用上限
+        upload_endpoint: Files API上传地址
+
+    Returns:
+        (Gemini文件信息, 内容sha256)；响应没有给出Content-Length、无法流式上传时返回None
+    """
+    async with session.get(video_url, headers=headers or {},
+                           timeout=aiohttp.ClientTimeout(total=None, sock_read=60)) as response:
+        response.raise_for_status()
+        total = response.content_length
+        if not total or response.headers.get('Content-Encoding'):
+            return None
+
+        mime_type = _guess_mime_type(video_url, response.headers.get('Content-Type'))
+        display_name = os.path.basename(urllib.parse.urlparse(video_url).path) or 'video'
+        upload = ResumableUpload(session, api_key, upload_endpoint)
+        granularity = await upload.start(total, mime_type, display_name)
+        chunk_size = max(granularity, -(-chunk_size // granularity) * granularity)
+
+        queue: asyncio.Queue = asyncio.Queue(maxsize=buffer_chunks)
+        digest = hashlib.sha256()
+
+        async def produce():
+            buffer = bytearray()
+            async for data in response.content.iter_chunked(1024 * 1024):
+                digest.update(data)
+                buffer += data
+                while len(buffer) >= chunk_size:
+                    await queue.put(bytes(buffer[:chunk_size]))
+                    del buffer[:chunk_size]
+            if buffer:
+                await queue.put(bytes(buffer))
+            await queue.put(None)
+
+        async def consume():
+            # 预读下一块，才能知道当前块是否是最后一块（最后一块需要带finalize命令）
+            offset = 0
+            current = await queue.get()
+            while current is not None:
+                following = await queue.get()
+                file_info = await upload.send(current, offset, finalize=following is None)
+                offset += len(current)
+                progress = offset / total * 100
+                print(f"\r流式上传进度: {progress:.1f}%", end='', flush=True)
+                current = following
+            print()
+            if offset != total:
+                raise IOError(f"下载的数据长度与Content-Length不一致: {offset}/{total}")
+            return file_info
+
+        producer = asyncio.create_task(produce())
+        consumer = asyncio.create_task(consume())
+        try:
+            # 任一方出错都立即结束，避免另一方在队列上永远等待
+            done, _ = await asyncio.wait({producer, consumer}, return_when=asyncio.FIRST_EXCEPTION)
+            for task in done:
+                task.result()
+            file_info = consumer.result()
+        finally:
+            for task in (producer, consumer):
+                if not task.done():
+                    task.cancel()
+            await asyncio.gather(producer, consumer, return_exceptions=True)
+
+    return file_info, digest.hexdigest()
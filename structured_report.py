@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+结构化报告模式
+默认提示词要求Markdown报告，下游需要再从表格中解析品牌数据，模型稍微改变格式就会解析失败。
+结构化模式使用固定的提示词PROMPT，并在生成配置中附带response_schema，要求Gemini直接输出符合结构的JSON；
+结果经过校验后以紧凑JSON缓存和推送，需要时再渲染为与默认报告相同格式的Markdown
+"""
+
+import json
+import re
+from typing import List, NamedTuple, Optional
+
+import segmented_analysis
+from errors import MalformedOutputError
+
+SPONSORSHIP_LEVELS = segmented_analysis.SPONSORSHIP_LEVELS
+
+_JSON_FENCE_RE = re.compile(r'^```(?:json)?\s*|\s*```$')
+
+# 结构化模式的提示词（输出结构由RESPONSE_SCHEMA约束，提示词只说明分析要求）
+PROMPT = """你是YouTube科技视频分析专家。分析视频并按给定的JSON结构输出分析结果。
+
+分析要求：
+1. 赞助信息：判断是否有赞助（明确赞助/可能合作/无赞助），并给出判断依据，没有则为空字符串
+2. 品牌分析：统计提及的科技品牌/产品，包括提及或展示的时长（秒）、占视频总时长的百分比、好感度评分(1-5分)和核心观点
+3. 内容分类：视频类型、内容简介（一两句话）、KOL情感倾向(1-5分)
+4. 核心观点：分别列出正面评价和负面评价
+
+请用中文分析，基于视频实际内容。"""
+
+# 字段名与分段分析的片段JSON一致（见segmented_analysis.SEGMENT_JSON_PROMPT），品牌多一个percent
+RESPONSE_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "sponsorship": {"type": "STRING", "format": "enum", "enum": list(SPONSORSHIP_LEVELS)},
+        "sponsorship_evidence": {"type": "STRING"},
+        "brands": {
+            "type": "ARRAY",
+            "items": {
+                "type": "OBJECT",
+                "properties": {
+                    "name": {"type": "STRING"},
+                    "seconds": {"type": "NUMBER", "description": "提及或展示的秒数"},
+                    "percent": {"type": "NUMBER", "description": "占视频总时长的百分比（0-100）"},
+                    "sentiment": {"type": "NUMBER", "description": "好感度（1-5）"},
+                    "opinion": {"type": "STRING"},
+                },
+                "required": ["name", "seconds", "percent", "sentiment", "opinion"],
+            },
+        },
+        "video_type": {"type": "STRING"},
+        "summary": {"type": "STRING"},
+        "kol_sentiment": {"type": "NUMBER", "description": "KOL情感倾向（1-5）"},
+        "positives": {"type": "ARRAY", "items": {"type": "STRING"}},
+        "negatives": {"type": "ARRAY", "items": {"type": "STRING"}},
+    },
+    "required": ["sponsorship", "sponsorship_evidence", "brands", "video_type", "summary",
+                 "kol_sentiment", "positives", "negatives"],
+}
+
+
+class BrandRow(NamedTuple):
+    """品牌分析表中的一行"""
+    name: str
+    seconds: float
+    percent: float
+    # 好感度（1-5）
+    sentiment: float
+    opinion: str
+
+
+class VideoReport(NamedTuple):
+    """结构化的视频分析报告"""
+    sponsorship: str
+    sponsorship_evidence: str
+    brands: List[BrandRow]
+    video_type: str
+    summary: str
+    kol_sentiment: float
+    positives: List[str]
+    negatives: List[str]
+
+    def to_dict(self) -> dict:
+        """转换为可JSON序列化的字典（字段与RESPONSE_SCHEMA相同）"""
+        return dict(self._asdict(), brands=[brand._asdict() for brand in self.brands])
+
+    def to_json(self) -> str:
+        """紧凑的JSON文本（用于缓存、webhook和命令行输出）"""
+        return json.dumps(self.to_dict(), ensure_ascii=False, separators=(',', ':'))
+
+    def to_markdown(self) -> str:
+        """渲染为与默认提示词相同格式的Markdown报告"""
+        table = segmented_analysis.brand_table([
+            dict(brand._asdict(), opinions=[brand.opinion] if brand.opinion else [])
+            for brand in self.brands])
+        return (
+            "# YouTube视频分析报告\n\n"
+            "## 1. 赞助信息\n"
+            f"- 判断结果: {self.sponsorship}\n"
+            f"- 依据: {self.sponsorship_evidence or '无'}\n\n"
+            "## 2. 品牌分析\n"
+            f"{table}\n\n"
+            "## 3. 内容摘要\n"
+            f"- 视频类型: {self.video_type}\n"
+            f"- 内容简介: {self.summary}\n"
+            f"- KOL情感: {self.kol_sentiment:g}分\n\n"
+            "## 4. 关键评价\n"
+            f"- 正面: {'；'.join(self.positives) or '无'}\n"
+            f"- 负面: {'；'.join(self.negatives) or '无'}\n"
+        )
+
+
+def _field(data: dict, key: str, path: str = ''):
+    if key not in data:
+        raise MalformedOutputError(f"结构化结果缺少字段: {path}{key}", 'generate')
+    return data[key]
+
+
+def _text(data: dict, key: str, path: str = '') -> str:
+    value = _field(data, key, path)
+    if not isinstance(value, str):
+        raise MalformedOutputError(f"结构化结果字段 {path}{key} 应为字符串", 'generate')
+    return value.strip()
+
+
+def _number(data: dict, key: str, low: float, high: Optional[float], path: str = '') -> float:
+    value = _field(data, key, path)
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise MalformedOutputError(f"结构化结果字段 {path}{key} 应为数字", 'generate')
+    if value < low or (high is not None and value > high):
+        bounds = f"{low:g}到{high:g}之间" if high is not None else f"不小于{low:g}"
+        raise MalformedOutputError(f"结构化结果字段 {path}{key} 应在{bounds}: {value}", 'generate')
+    return float(value)
+
+
+def _texts(data: dict, key: str) -> List[str]:
+    value = _field(data, key)
+    if not isinstance(value, list) or not all(isinstance(item, str) for item in value):
+        raise MalformedOutputError(f"结构化结果字段 {key} 应为字符串列表", 'generate')
+    return [item.strip() for item in value if item.strip()]
+
+
+def from_dict(data) -> VideoReport:
+    """校验结构化结果并转换为VideoReport
+
+    Raises:
+        MalformedOutputError: 缺少字段、类型错误或数值超出范围
+    """
+    if not isinstance(data, dict):
+        raise MalformedOutputError("结构化结果不是JSON对象", 'generate')
+    sponsorship = _text(data, "sponsorship")
+    if sponsorship not in SPONSORSHIP_LEVELS:
+        raise MalformedOutputError(f"赞助判断无效: {sponsorship}", 'generate')
+
+    items = _field(data, "brands")
+    if not isinstance(items, list):
+        raise MalformedOutputError("结构化结果字段 brands 应为列表", 'generate')
+    brands = []
+    for index, item in enumerate(items):
+        path = f"brands[{index}]."
+        if not isinstance(item, dict):
+            raise MalformedOutputError(f"结构化结果字段 brands[{index}] 应为对象", 'generate')
+        name = _text(item, "name", path)
+        if not name:
+            raise MalformedOutputError(f"结构化结果字段 {path}name 为空", 'generate')
+        brands.append(BrandRow(
+            name=name,
+            seconds=_number(item, "seconds", 0, None, path),
+            percent=_number(item, "percent", 0, 100, path),
+            sentiment=_number(item, "sentiment", 1, 5, path),
+            opinion=_text(item, "opinion", path),
+        ))
+
+    return VideoReport(
+        sponsorship=sponsorship,
+        sponsorship_evidence=_text(data, "sponsorship_evidence"),
+        brands=brands,
+        video_type=_text(data, "video_type"),
+        summary=_text(data, "summary"),
+        kol_sentiment=_number(data, "kol_sentiment", 1, 5),
+        positives=_texts(data, "positives"),
+        negatives=_texts(data, "negatives"),
+    )
+
+
+def parse_report(text: str) -> VideoReport:
+    """解析并校验生成的JSON文本（容忍Markdown代码块包裹）
+
+    Raises:
+        MalformedOutputError: 不是有效的JSON或不符合结构
+    """
+    try:
+        data = json.loads(_JSON_FENCE_RE.sub('', text.strip()))
+    except ValueError as e:
+        raise MalformedOutputError(f"结构化结果不是有效的JSON: {str(e)}", 'generate') from None
+    return from_dict(data)
+
+
+def is_structured(prompt: Optional[str]) -> bool:
+    """提示词是否为结构化模式的提示词"""
+    return prompt == PROMPT
+
+
+def generation_config(prompt: Optional[str]) -> Optional[dict]:
+    """结构化模式的提示词需要的生成配置（JSON输出 + response_schema），其他提示词返回None"""
+    if not is_structured(prompt):
+        return None
+    return {"response_mime_type": "application/json", "response_schema": RESPONSE_SCHEMA}
+
+
+def normalize(prompt: Optional[str], text: str) -> str:
+    """结构化模式的结果校验后转换为紧凑JSON，其他提示词的结果原样返回
+
+    Raises:
+        MalformedOutputError: 结构化结果无效
+    """
+    return parse_report(text).to_json() if is_structured(prompt) else text
@@ -0,0 +1,7 @@
+# -*- coding: utf-8 -*-
+"""测试公共设置：模块都在仓库根目录下（扁平布局）"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
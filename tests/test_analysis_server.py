@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+"""AnalysisServer的流式接口测试（与worker共用执行名额）"""
+
+import asyncio
+
+import aiohttp
+import pytest
+from aiohttp import web
+
+import fake_gemini
+import gemini_video_analyzer
+from analysis_server import AnalysisServer
+from gemini_video_analyzer import AsyncGeminiVideoAnalyzer
+
+
+@pytest.fixture(autouse=True)
+def backend(monkeypatch):
+    monkeypatch.setattr(gemini_video_analyzer, 'genai', gemini_video_analyzer.genai)
+    monkeypatch.setattr(gemini_video_analyzer, 'gemini_rest', gemini_video_analyzer.gemini_rest)
+    return fake_gemini.install(generate_latency=0.5)
+
+
+def test_stream_rejected_when_slots_are_full():
+    """执行名额被占满时流式请求返回503，名额释放后恢复"""
+    async def run():
+        server = AnalysisServer(AsyncGeminiVideoAnalyzer('fake-key'), workers=1)
+        runner = web.AppRunner(server.make_app())
+        await runner.setup()
+        site = web.TCPSite(runner, '127.0.0.1', 0)
+        await site.start()
+        url = f"http://127.0.0.1:{runner.addresses[0][1]}/stream"
+        try:
+            async with aiohttp.ClientSession() as session:
+                async def stream(video_id: str):
+                    payload = {"youtube_url": f"https://www.youtube.com/watch?v={video_id}"}
+                    async with session.post(url, json=payload) as response:
+                        return response.status, await response.text()
+
+                first = asyncio.create_task(stream('first'))
+                await asyncio.sleep(0.2)
+                rejected = await stream('second')
+                accepted = await first
+                after = await stream('third')
+        finally:
+            await runner.cleanup()
+        return rejected, accepted, after
+
+    rejected, accepted, after = asyncio.run(run())
+    assert rejected[0] == 503
+    assert accepted[0] == 200 and 'first' in accepted[1]
+    assert after[0] == 200 and 'third' in after[1]
@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+"""离线批量预测流程在本地替身后端上的测试（边准备边提交、状态查询持续失败）"""
+
+import asyncio
+import json
+
+import pytest
+
+import fake_gemini
+import gemini_video_analyzer
+from batch_prediction import LocalBatchBackend, run_batch_prediction
+from batch_runner import BatchJob
+from gemini_video_analyzer import AsyncGeminiVideoAnalyzer
+
+
+class RecordingBackend(LocalBatchBackend):
+    """记录提交事件的本地替身；status_error不为None时查询状态总是失败"""
+
+    def __init__(self, events, status_error=None):
+        super().__init__(delay=0.01)
+        self.events = events
+        self.status_error = status_error
+
+    async def submit(self, model, requests, display_name):
+        self.events.append(('submit', len(requests)))
+        return await super().submit(model, requests, display_name)
+
+    async def status(self, batch_id):
+        if self.status_error is not None:
+            raise self.status_error
+        return await super().status(batch_id)
+
+
+@pytest.fixture(autouse=True)
+def backend(monkeypatch):
+    monkeypatch.setattr(gemini_video_analyzer, 'genai', gemini_video_analyzer.genai)
+    monkeypatch.setattr(gemini_video_analyzer, 'gemini_rest', gemini_video_analyzer.gemini_rest)
+    return fake_gemini.install()
+
+
+def _jobs(count: int):
+    return [BatchJob(f"job-{n}", 'youtube', f"https://www.youtube.com/watch?v=batch{n}") for n in range(count)]
+
+
+def _run(tmp_path, batch_backend, jobs, **options):
+    output = str(tmp_path / 'out.jsonl')
+
+    async def run():
+        analyzer = AsyncGeminiVideoAnalyzer('fake-key')
+        prepare_video = analyzer.prepare_video
+
+        async def recording_prepare(video_type, source):
+            # 模拟上传耗时
+            await asyncio.sleep(0.05)
+            prepared = await prepare_video(video_type, source)
+            batch_backend.events.append(('prepare', source))
+            return prepared
+
+        analyzer.prepare_video = recording_prepare
+        try:
+            return await run_batch_prediction(analyzer, iter(jobs), output, batch_backend, concurrency=1,
+                                              poll_interval=0.01, **options)
+        finally:
+            await analyzer.close()
+            await batch_backend.close()
+
+    summary = asyncio.run(run())
+    with open(output, 'r', encoding='utf-8') as f:
+        return summary, [json.loads(line) for line in f]
+
+
+def test_chunks_submitted_while_preparing(tmp_path):
+    """攒满max_batch_size个请求就提交，不等其余视频准备完"""
+    events = []
+    summary, records = _run(tmp_path, RecordingBackend(events), _jobs(5), max_batch_size=2)
+
+    assert [kind for kind, _ in events] == [
+        'prepare', 'prepare', 'submit', 'prepare', 'prepare', 'submit', 'prepare', 'submit']
+    assert [size for kind, size in events if kind == 'submit'] == [2, 2, 1]
+    assert summary['batches'] == 3
+    assert sorted(r['id'] for r in records) == [f"job-{n}" for n in range(5)]
+    assert all(r['status'] == 'ok' for r in records)
+
+
+def test_status_errors_fail_the_chunk(tmp_path):
+    """状态查询连续失败达到上限后不再等待，该批的任务记为失败"""
+    events = []
+    batch_backend = RecordingBackend(events, status_error=ConnectionError("连接被重置"))
+    summary, records = _run(tmp_path, batch_backend, _jobs(3), max_batch_size=10, max_status_errors=3)
+
+    assert summary['batches'] == 1
+    assert len(records) == 3
+    for record in records:
+        assert record['status'] == 'error'
+        assert '连续 3 次查询状态失败' in record['error']
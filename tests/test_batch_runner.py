@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+"""batch_runner.run_job的失败归类测试"""
+
+import asyncio
+
+import pytest
+
+import fake_gemini
+import gemini_video_analyzer
+import retry_policy
+from batch_runner import BatchJob, run_job
+from gemini_video_analyzer import AsyncGeminiVideoAnalyzer
+
+
+@pytest.fixture(autouse=True)
+def backend(monkeypatch):
+    monkeypatch.setattr(gemini_video_analyzer, 'genai', gemini_video_analyzer.genai)
+    monkeypatch.setattr(gemini_video_analyzer, 'gemini_rest', gemini_video_analyzer.gemini_rest)
+    return fake_gemini.install(generate_latency=0.01, failing_models=['down'])
+
+
+def _run_job(model: str, return_error_strings: bool) -> dict:
+    async def run():
+        analyzer = AsyncGeminiVideoAnalyzer(
+            'fake-key', return_error_strings=return_error_strings,
+            retry_policies={retry_policy.GENERATE: retry_policy.NO_RETRY})
+        try:
+            return await run_job(analyzer, BatchJob('job-1', 'youtube', 'https://www.youtube.com/watch?v=runner',
+                                                    model=model))
+        finally:
+            await analyzer.close()
+
+    return asyncio.run(run())
+
+
+@pytest.mark.parametrize('return_error_strings', [False, True])
+def test_failure_classified_from_error_type(return_error_strings):
+    """兼容模式的分析器失败时同样按错误类型记录，而不是把错误信息当作结果"""
+    record = _run_job('down', return_error_strings)
+    assert record['status'] == 'error'
+    assert record['error_type'] == 'transient'
+    assert 'result' not in record
+
+
+def test_success_in_compat_mode():
+    """兼容模式下成功的结果照常记录"""
+    record = _run_job('gemini-2.5-flash', return_error_strings=True)
+    assert record['status'] == 'ok'
+    assert '[fake:gemini-2.5-flash]' in record['result']
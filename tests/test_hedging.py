@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+"""对冲请求与降级链在假后端上的测试（注入按模型的延迟和故障）"""
+
+import asyncio
+import time
+
+import pytest
+
+import fake_gemini
+import gemini_video_analyzer
+import hedging
+import retry_policy
+from gemini_video_analyzer import AsyncGeminiVideoAnalyzer
+from hedging import HedgingPolicy
+
+VIDEO = 'https://www.youtube.com/watch?v=hedging-test'
+
+
+@pytest.fixture
+def backend(monkeypatch):
+    """慢模型2秒、快模型0.05秒返回，down模型总是503（测试结束后恢复真实后端）"""
+    monkeypatch.setattr(gemini_video_analyzer, 'genai', gemini_video_analyzer.genai)
+    monkeypatch.setattr(gemini_video_analyzer, 'gemini_rest', gemini_video_analyzer.gemini_rest)
+    return fake_gemini.install(model_latency={'slow': 2.0, 'fast': 0.05}, failing_models=['down'])
+
+
+def _policy(**options) -> HedgingPolicy:
+    # 样本足够时按分位数对冲：slow近期延迟都是0.2秒
+    policy = HedgingPolicy(min_samples=5, min_delay=0.05, **options)
+    for _ in range(5):
+        policy.record('slow', 0.2)
+    return policy
+
+
+def _analyze(policy: HedgingPolicy, model: str):
+    """用model分析一次，返回(结果, 给出结果的模型, 耗时, 计数器文本)"""
+    async def run():
+        analyzer = AsyncGeminiVideoAnalyzer(
+            'fake-key', hedging_policy=policy,
+            retry_policies={retry_policy.GENERATE: retry_policy.NO_RETRY})
+        try:
+            with hedging.recording_answers() as answers:
+                start = time.monotonic()
+                result = await analyzer.analyze_youtube_video(VIDEO, '总结视频', model=model)
+                elapsed = time.monotonic() - start
+        finally:
+            await analyzer.close()
+        return result, answers.get('总结视频'), elapsed, analyzer.metrics.render_prometheus()
+
+    return asyncio.run(run())
+
+
+def test_hedge_after_percentile_cancels_slower_request(backend):
+    """超过slow的95分位延迟后对冲到fast，采用fast的结果并取消slow的请求"""
+    policy = _policy(percentile=95, hedge_model='fast')
+    result, answered_by, elapsed, metrics = _analyze(policy, 'slow')
+
+    assert answered_by == 'fast'
+    assert '[fake:fast]' in result
+    # 等到分位数延迟（0.2秒）才对冲，远早于slow自身的2秒
+    assert 0.2 <= elapsed < 1.0
+    assert backend.calls['generate'] == 2
+    assert backend.calls['cancelled'] == 1
+    assert 'gva_hedges_total{model="fast"} 1' in metrics
+
+
+def test_no_hedge_before_percentile(backend):
+    """在分位数延迟内返回的请求不发对冲"""
+    policy = _policy(percentile=95, hedge_model='slow')
+    for _ in range(5):
+        policy.record('fast', 0.2)
+    _, answered_by, _, metrics = _analyze(policy, 'fast')
+
+    assert answered_by == 'fast'
+    assert backend.calls['generate'] == 1
+    assert 'hedges_total' not in metrics
+
+
+def test_fallback_on_retryable_error_records_answered_by(backend):
+    """down返回503（可重试的临时故障）时改用降级链中的fast，answered_by记录实际给出结果的模型"""
+    policy = HedgingPolicy(fallback_models=['fast'])
+    result, answered_by, _, metrics = _analyze(policy, 'down')
+
+    assert answered_by == 'fast'
+    assert '[fake:fast]' in result
+    assert backend.injected['model_down'] == 1
+    assert 'gva_fallbacks_total{error_type="transient",model="down"} 1' in metrics
+
+
+def test_stream_never_hedges(backend):
+    """流式请求超过对冲等待时间也不发对冲请求"""
+    policy = _policy(percentile=95, hedge_model='fast')
+    backend.model_latency['slow'] = 0.5
+
+    async def run():
+        analyzer = AsyncGeminiVideoAnalyzer('fake-key', hedging_policy=policy)
+        try:
+            chunks = [chunk async for chunk in analyzer.stream_youtube_video(VIDEO, '总结视频', model='slow')]
+        finally:
+            await analyzer.close()
+        return ''.join(chunks), analyzer.metrics.render_prometheus()
+
+    text, metrics = asyncio.run(run())
+    assert '[fake:slow]' in text
+    assert backend.calls['generate'] == 1
+    assert backend.calls['cancelled'] == 0
+    assert 'hedges_total' not in metrics
@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+"""ResultCache 的淘汰测试（按写入次数分摊淘汰、过期条目按created_at索引删除）"""
+
+import time
+
+from result_cache import ResultCache
+
+
+def _count(cache: ResultCache) -> int:
+    return cache._conn.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+
+def test_eviction_runs_every_n_puts(tmp_path):
+    """两次淘汰之间可以暂时超出容量，第evict_every次写入时按LRU压回上限"""
+    cache = ResultCache(str(tmp_path / 'cache.sqlite3'), max_entries=3, evict_every=5)
+    for n in range(4):
+        cache.put(f"key-{n}", f"result-{n}")
+    assert _count(cache) == 4
+
+    # key-0最近被读过，淘汰时保留
+    assert cache.get('key-0') == 'result-0'
+    cache.put('key-4', 'result-4')
+    assert _count(cache) == 3
+    assert cache.get('key-0') == 'result-0'
+    assert cache.get('key-1') is None and cache.get('key-2') is None
+    cache.close()
+
+
+def test_expired_entries_deleted_by_index(tmp_path):
+    """过期条目读取时视为未命中，淘汰时通过created_at索引删除"""
+    cache = ResultCache(str(tmp_path / 'cache.sqlite3'), ttl=60, evict_every=2)
+    cache.put('old', 'stale')
+    cache._conn.execute("UPDATE results SET created_at = ?", (time.time() - 120,))
+    assert cache.get('old') is None
+
+    cache.put('new', 'fresh')
+    assert _count(cache) == 1
+    assert cache.get('new') == 'fresh'
+
+    plan = cache._conn.execute(
+        "EXPLAIN QUERY PLAN DELETE FROM results WHERE created_at < ?", (0,)).fetchall()
+    assert any('idx_results_created_at' in row[-1] for row in plan)
+    cache.close()
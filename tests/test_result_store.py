@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+"""ResultStore缓冲写入的测试"""
+
+import sqlite3
+
+import pytest
+
+from result_store import ResultStore
+
+REPORT = "# 分析报告\n\n| 品牌 | 时长 | 占比 | 好感度 | 观点 |\n|---|---|---|---|---|\n| Acme | 30 | 5% | 4 | 不错 |\n"
+
+
+def test_failed_flush_keeps_pending_entries(tmp_path):
+    """写入失败时这批结果留在缓冲区，下次flush写入"""
+    store = ResultStore(str(tmp_path / 'results.sqlite3'))
+    for n in range(3):
+        store.add('youtube', f"https://www.youtube.com/watch?v=video{n}", 'gemini-2.5-flash', '总结', REPORT)
+
+    write = store._write
+
+    def failing_write(entries):
+        raise sqlite3.OperationalError("database is locked")
+
+    store._write = failing_write
+    with pytest.raises(sqlite3.OperationalError):
+        store.flush()
+    assert store.count() == 0
+
+    store._write = write
+    store.add('youtube', "https://www.youtube.com/watch?v=video3", 'gemini-2.5-flash', '总结', REPORT)
+    assert store.flush() == 4
+    assert store.count() == 4
+    assert store.flush() == 0
+    store.close()
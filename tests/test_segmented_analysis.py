@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+"""分段分析与视频片段（--clip）组合的测试"""
+
+import asyncio
+
+import pytest
+
+import fake_gemini
+import gemini_video_analyzer
+import media_presets
+import segmented_analysis
+from gemini_video_analyzer import AsyncGeminiVideoAnalyzer
+
+
+@pytest.fixture
+def backend(monkeypatch):
+    monkeypatch.setattr(gemini_video_analyzer, 'genai', gemini_video_analyzer.genai)
+    monkeypatch.setattr(gemini_video_analyzer, 'gemini_rest', gemini_video_analyzer.gemini_rest)
+    return fake_gemini.install(processing_delay=0, generate_latency=0.01, video_duration=1800)
+
+
+def _offset(value: str) -> float:
+    return float(value.rstrip('s'))
+
+
+def test_plan_segments_within_range():
+    """指定起点时片段首尾相接地覆盖[start, duration]"""
+    segments = segmented_analysis.plan_segments(600, 200, 10, start=60)
+    assert segments[0].start == 60
+    assert segments[-1].end == 600 and segments[-1].owned_end == 600
+    assert all(60 <= s.start < s.end <= 600 for s in segments)
+    assert all(a.owned_end == b.start for a, b in zip(segments, segments[1:]))
+
+
+def test_segments_stay_inside_clip(backend, tmp_path):
+    """--clip 60-600 与分段分析同时使用时，每个片段请求的起止时间都在片段范围内"""
+    video = tmp_path / 'video.mp4'
+    video.write_bytes(b'\0' * 1024)
+    offsets = []
+    respond = backend._respond
+
+    async def recording_respond(model_name, contents, generation_config):
+        for part in contents[0]['parts']:
+            metadata = part.get('video_metadata')
+            if metadata:
+                offsets.append((_offset(metadata['start_offset']), _offset(metadata['end_offset'])))
+        return await respond(model_name, contents, generation_config)
+
+    backend._respond = recording_respond
+
+    async def run():
+        analyzer = AsyncGeminiVideoAnalyzer(
+            'fake-key', segment_seconds=200, segment_overlap=10,
+            media_preset=media_presets.with_clip(None, 60, 600))
+        try:
+            return await analyzer.analyze_local_video(str(video), '总结视频')
+        finally:
+            await analyzer.close()
+
+    asyncio.run(run())
+    assert len(offsets) == 3
+    assert all(60 <= start < end <= 600 for start, end in offsets)
+    assert min(start for start, _ in offsets) == 60
+    assert max(end for _, end in offsets) == 600
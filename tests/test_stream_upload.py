@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""流式上传网络视频时的结果缓存测试"""
+
+import asyncio
+import hashlib
+
+import pytest
+from aiohttp import web
+
+import fake_gemini
+import gemini_video_analyzer
+from gemini_video_analyzer import AsyncGeminiVideoAnalyzer
+from result_cache import ResultCache
+
+DATA = b'\0' * 4096
+
+
+@pytest.fixture
+def backend(monkeypatch, tmp_path):
+    """假后端；stream_to_gemini替换为直接在假后端中登记文件，并记录调用次数"""
+    monkeypatch.setattr(gemini_video_analyzer, 'genai', gemini_video_analyzer.genai)
+    monkeypatch.setattr(gemini_video_analyzer, 'gemini_rest', gemini_video_analyzer.gemini_rest)
+    backend = fake_gemini.install(processing_delay=0, generate_latency=0.01)
+    backend.streamed = 0
+    source = tmp_path / 'source.mp4'
+    source.write_bytes(DATA)
+
+    async def fake_stream(session, api_key, video_url, headers=None, upload_endpoint=None):
+        backend.streamed += 1
+        uploaded = backend.upload_file(str(source), mime_type='video/mp4')
+        return {"name": uploaded.name, "sizeBytes": str(len(DATA))}, hashlib.sha256(DATA).hexdigest()
+
+    monkeypatch.setattr(gemini_video_analyzer, 'stream_to_gemini', fake_stream)
+    return backend
+
+
+async def _serve(state: dict):
+    async def handle(request):
+        return web.Response(body=DATA, content_type='video/mp4', headers={'ETag': state['etag']})
+
+    app = web.Application()
+    app.router.add_route('*', '/video.mp4', handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, '127.0.0.1', 0).start()
+    return runner, f"http://127.0.0.1:{runner.addresses[0][1]}/video.mp4"
+
+
+def test_cache_hit_skips_streamed_upload(backend, tmp_path):
+    """同一链接、同一ETag的第二次分析命中缓存，不再上传；ETag变化后重新上传"""
+    cache = ResultCache(str(tmp_path / 'cache.sqlite3'))
+    state = {'etag': '"v1"'}
+
+    async def analyze(url):
+        analyzer = AsyncGeminiVideoAnalyzer('fake-key', cache=cache, stream_uploads=True)
+        try:
+            return await analyzer.analyze_video_url_multi(url, ['总结', '品牌'])
+        finally:
+            await analyzer.close()
+
+    async def run():
+        runner, url = await _serve(state)
+        try:
+            first = await analyze(url)
+            second = await analyze(url)
+            uploads = backend.streamed
+            state['etag'] = '"v2"'
+            await analyze(url)
+        finally:
+            await runner.cleanup()
+        return first, second, uploads
+
+    first, second, uploads = asyncio.run(run())
+    assert second == first
+    assert uploads == 1
+    # ETag变化后重新上传
+    assert backend.streamed == 2
@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+"""UploadRegistry 最近使用时间的刷新测试（间隔内的重复命中不写数据库）"""
+
+import time
+from types import SimpleNamespace
+
+import upload_registry
+from upload_registry import UploadRegistry
+
+
+def _stored_last_used(registry: UploadRegistry, content_hash: str) -> float:
+    return registry._conn.execute(
+        "SELECT last_used FROM uploads WHERE content_hash = ?", (content_hash,)).fetchone()[0]
+
+
+def test_lookup_touches_at_most_once_per_interval(tmp_path):
+    """刚登记或刚刷新过的上传再次命中时不写数据库，超过TOUCH_INTERVAL后才刷新最近使用时间"""
+    registry = UploadRegistry(str(tmp_path / 'uploads.sqlite3'))
+    file_info = SimpleNamespace(name='files/abc', uri='https://example.invalid/files/abc',
+                                mime_type='video/mp4', expiration_time=None)
+    registry.register('hash', file_info)
+    registered = _stored_last_used(registry, 'hash')
+
+    assert registry.lookup('hash').name == 'files/abc'
+    assert _stored_last_used(registry, 'hash') == registered
+
+    stale = time.time() - upload_registry.TOUCH_INTERVAL - 1
+    registry._conn.execute("UPDATE uploads SET last_used = ?", (stale,))
+    entry = registry.lookup('hash')
+    assert entry.last_used > stale
+    assert _stored_last_used(registry, 'hash') == entry.last_used
+    registry.close()
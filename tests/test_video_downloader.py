@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+"""RangedDownloader 对本地HTTP服务器的下载测试（支持/不支持Range、续传、分析器的下载重试）"""
+
+import asyncio
+import functools
+import os
+import re
+import tempfile
+
+import aiohttp
+import pytest
+from aiohttp import web
+
+import errors
+import gemini_video_analyzer
+import retry_policy
+from gemini_video_analyzer import AsyncGeminiVideoAnalyzer
+from video_downloader import RangedDownloader
+
+DATA = os.urandom(300 * 1024 + 123)
+PART_SIZE = 64 * 1024
+
+
+class VideoServer:
+    """提供DATA的本地服务器，可关闭Range支持或让某个分段的请求失败"""
+
+    def __init__(self, ranges: bool = True, fail_offsets=()):
+        self.ranges = ranges
+        self.fail_offsets = set(fail_offsets)
+        self.requests = []
+        self._runner = None
+        self.url = None
+
+    async def handle(self, request: web.Request) -> web.StreamResponse:
+        header = request.headers.get('Range')
+        self.requests.append(header)
+        match = re.match(r'bytes=(\d+)-(\d+)', header or '')
+        if not self.ranges or match is None:
+            return web.Response(body=DATA, content_type='video/mp4')
+        start, end = int(match.group(1)), min(int(match.group(2)), len(DATA) - 1)
+        if start in self.fail_offsets:
+            return web.Response(status=500)
+        return web.Response(status=206, body=DATA[start:end + 1], content_type='video/mp4', headers={
+            'Content-Range': f'bytes {start}-{end}/{len(DATA)}', 'ETag': '"v1"'})
+
+    async def __aenter__(self):
+        app = web.Application()
+        app.router.add_get('/video.mp4', self.handle)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, '127.0.0.1', 0)
+        await site.start()
+        port = self._runner.addresses[0][1]
+        self.url = f'http://127.0.0.1:{port}/video.mp4'
+        return self
+
+    async def __aexit__(self, *exc):
+        await self._runner.cleanup()
+
+
+@pytest.fixture(autouse=True)
+def partial_dir(tmp_path, monkeypatch):
+    """未完成下载的保留位置放在测试的临时目录中"""
+    monkeypatch.setattr(tempfile, 'tempdir', str(tmp_path))
+
+
+async def _download(server: VideoServer, dest: str, **options) -> str:
+    async with aiohttp.ClientSession() as session:
+        downloader = RangedDownloader(session, part_size=PART_SIZE, buffer_size=16 * 1024, **options)
+        return await downloader.download(server.url, dest)
+
+
+def _read(path: str) -> bytes:
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+@pytest.mark.parametrize('ranges', [True, False])
+def test_download_matches_source(tmp_path, ranges):
+    """支持Range时分段并发下载，不支持时退回单连接下载，结果都与源文件一致"""
+    async def run():
+        async with VideoServer(ranges=ranges) as server:
+            dest = await _download(server, str(tmp_path / 'out.mp4'), connections=4)
+            return server, dest
+
+    server, dest = asyncio.run(run())
+    assert _read(dest) == DATA
+    assert not os.path.exists(dest + '.state.json')
+    if ranges:
+        # 探测请求 + 每个分段一个请求
+        assert len(server.requests) == 1 + -(-len(DATA) // PART_SIZE)
+    else:
+        # 单连接：直接复用探测请求的完整响应
+        assert len(server.requests) == 1
+
+
+def test_resume_partial_download(tmp_path):
+    """中途失败的下载保留已完成的分段，下一次只请求缺失的分段"""
+    fail_at = 3 * PART_SIZE
+
+    # 续传按链接匹配，两次下载使用同一个服务器（同一个链接），第二次之前撤掉故障
+    async def run():
+        async with VideoServer(fail_offsets=[fail_at]) as server:
+            with pytest.raises(aiohttp.ClientResponseError):
+                await _download(server, str(tmp_path / 'first.mp4'), connections=1, max_retries=0)
+            assert not os.path.exists(tmp_path / 'first.mp4')
+            server.fail_offsets.clear()
+            server.requests.clear()
+            dest = await _download(server, str(tmp_path / 'second.mp4'), connections=1)
+            return server, dest
+
+    server, dest = asyncio.run(run())
+    assert _read(dest) == DATA
+    # 探测请求之后只请求失败分段及其后的分段
+    requested = [int(re.match(r'bytes=(\d+)-', r).group(1)) for r in server.requests[1:]]
+    assert requested == list(range(fail_at, len(DATA), PART_SIZE))
+
+
+def test_analyzer_download_retries_once_per_policy_attempt(monkeypatch):
+    """分析器下载时只由重试策略重试：一直失败的分段按策略的尝试次数请求，重试时续传已完成的分段"""
+    fail_at = 3 * PART_SIZE
+    monkeypatch.setattr(gemini_video_analyzer, 'RangedDownloader',
+                        functools.partial(RangedDownloader, part_size=PART_SIZE))
+    policy = retry_policy.RetryPolicy(attempts=3, base_delay=0.01)
+
+    async def run():
+        async with VideoServer(fail_offsets=[fail_at]) as server:
+            analyzer = AsyncGeminiVideoAnalyzer('fake-key', download_connections=1,
+                                                retry_policies={retry_policy.DOWNLOAD: policy})
+            try:
+                with pytest.raises(errors.AnalysisError):
+                    await analyzer.download_video(server.url)
+            finally:
+                await analyzer.close()
+            return server
+
+    server = asyncio.run(run())
+    requested = [int(re.match(r'bytes=(\d+)-', r).group(1)) for r in server.requests if r and r != 'bytes=0-0']
+    assert requested.count(fail_at) == policy.attempts
+    # 失败分段之前的分段只在第一次尝试中下载
+    assert requested.count(0) == 1
@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+"""WebhookDispatcher + WebhookOutbox 对不稳定接收端的投递测试（重试、崩溃后重投、多进程认领）"""
+
+import asyncio
+
+from aiohttp import web
+
+from webhook_dispatcher import WebhookDispatcher
+from webhook_outbox import STATUS_IN_FLIGHT, WebhookOutbox
+
+
+class FlakyReceiver:
+    """每条payload前failures次返回503，之后返回200，并记录成功收到的payload"""
+
+    def __init__(self, failures: int = 0):
+        self.failures = failures
+        self.attempts = {}
+        self.delivered = []
+        self._runner = None
+        self.url = None
+
+    async def handle(self, request: web.Request) -> web.Response:
+        data = await request.json()
+        key = data['n']
+        self.attempts[key] = self.attempts.get(key, 0) + 1
+        if self.attempts[key] <= self.failures:
+            return web.Response(status=503)
+        self.delivered.append(key)
+        return web.Response(status=200)
+
+    async def __aenter__(self):
+        app = web.Application()
+        app.router.add_post('/hook', self.handle)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, '127.0.0.1', 0)
+        await site.start()
+        port = self._runner.addresses[0][1]
+        self.url = f'http://127.0.0.1:{port}/hook'
+        return self
+
+    async def __aexit__(self, *exc):
+        await self._runner.cleanup()
+
+
+def _dispatcher(outbox: WebhookOutbox) -> WebhookDispatcher:
+    return WebhookDispatcher(outbox=outbox, max_retries=3, base_delay=0.01, max_delay=0.02, timeout=5)
+
+
+def test_flaky_receiver_gets_each_payload_once(tmp_path):
+    """接收端前两次返回503，重试后每条payload恰好送达一次，发件箱清空"""
+    outbox = WebhookOutbox(str(tmp_path / 'outbox.sqlite3'))
+
+    async def run():
+        async with FlakyReceiver(failures=2) as receiver:
+            dispatcher = _dispatcher(outbox)
+            for n in range(20):
+                await dispatcher.submit(receiver.url, {'n': n})
+            await dispatcher.close()
+            return receiver
+
+    receiver = asyncio.run(run())
+    assert sorted(receiver.delivered) == list(range(20))
+    assert all(count == 3 for count in receiver.attempts.values())
+    assert outbox.count() == 0
+    outbox.close()
+
+
+def test_replay_after_crash(tmp_path):
+    """进程写入发件箱后崩溃，租约过期后另一个进程的replay()认领并投递，未过期前不会重复发送"""
+    path = str(tmp_path / 'outbox.sqlite3')
+
+    # 模拟崩溃：记录已写入并被认领，但投递前进程退出
+    crashed = WebhookOutbox(path, lease=1.0)
+    for n in range(5):
+        crashed.add('placeholder', {'n': n})
+    crashed.close()
+
+    async def run():
+        async with FlakyReceiver(failures=1) as receiver:
+            outbox = WebhookOutbox(path, lease=1.0)
+            # 换成本地接收端的地址
+            outbox._conn.execute("UPDATE outbox SET url = ?", (receiver.url,))
+            outbox._conn.commit()
+            dispatcher = _dispatcher(outbox)
+
+            # 崩溃进程的租约仍有效，视为仍在投递
+            assert await dispatcher.replay() == 0
+            await asyncio.sleep(1.1)
+            assert await dispatcher.replay() == 5
+            # 已被本进程认领，再次replay不会重复投递
+            assert await dispatcher.replay() == 0
+            await dispatcher.close()
+            return receiver, outbox
+
+    receiver, outbox = asyncio.run(run())
+    assert sorted(receiver.delivered) == list(range(5))
+    assert outbox.count() == 0
+    outbox.close()
+
+
+def test_claim_is_exclusive_between_processes(tmp_path):
+    """两个共享发件箱的进程同时重投时，每条记录只被其中一个认领"""
+    path = str(tmp_path / 'outbox.sqlite3')
+    first, second = WebhookOutbox(path), WebhookOutbox(path)
+    ids = [first.add('http://127.0.0.1/hook', {'n': n}) for n in range(10)]
+    # 投递失败后释放认领，等待重投
+    first.record_failure(ids, 'Webhook响应错误: 503')
+
+    claimed_first = first.claim(limit=4)
+    claimed_second = second.claim()
+    assert [e.id for e in claimed_first] == ids[:4]
+    assert [e.id for e in claimed_second] == ids[4:]
+    assert first.claim() == [] and second.claim() == []
+    assert first.count(STATUS_IN_FLIGHT) == 10
+    first.close()
+    second.close()
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Gemini上传文件登记表
+记录 文件内容sha256 -> 已上传的Gemini文件（name/uri/过期时间），
+让同一个视频的重复分析直接复用仍然有效的上传，而不是每次上传后立即删除
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from typing import List, NamedTuple, Optional
+
+DEFAULT_REGISTRY_PATH = os.path.join(
+    os.path.expanduser('~'), '.cache', 'gemini_video_analyzer', 'uploads.sqlite3')
+
+# Gemini Files API中的文件在上传48小时后自动过期
+GEMINI_FILE_LIFETIME = 48 * 3600
+
+# 最近使用时间的刷新间隔（秒）：间隔内的重复命中不再写数据库，远小于闲置回收时长
+TOUCH_INTERVAL = 60
+
+
+class UploadEntry(NamedTuple):
+    """登记表中的一条上传记录"""
+    content_hash: str
+    name: str
+    uri: str
+    mime_type: str
+    uploaded_at: float
+    expires_at: float
+    last_used: float
+
+
+class UploadRegistry:
+    """基于SQLite的上传文件登记表"""
+
+    def __init__(self, path: str = DEFAULT_REGISTRY_PATH, idle_ttl: float = 6 * 3600,
+                 expiry_margin: float = 15 * 60):
+        """初始化登记表
+
+        Args:
+            path: SQLite数据库文件路径
+            idle_ttl: 上传文件闲置多久（秒）后由回收器删除
+            expiry_margin: 距离Gemini过期时间不足该时长（秒）的上传不再复用，
+                避免生成过程中文件过期
+        """
+        self.path = path
+        self.idle_ttl = idle_ttl
+        self.expiry_margin = expiry_margin
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS uploads ("
+            " content_hash TEXT PRIMARY KEY,"
+            " name TEXT NOT NULL,"
+            " uri TEXT NOT NULL,"
+            " mime_type TEXT NOT NULL,"
+            " uploaded_at REAL NOT NULL,"
+            " expires_at REAL NOT NULL,"
+            " last_used REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def lookup(self, content_hash: str) -> Optional[UploadEntry]:
+        """查找仍可复用的上传记录，并刷新其最近使用时间
+
+        距上次刷新不足TOUCH_INTERVAL时只读不写，频繁复用同一上传时不会每次都提交。
+
+        Returns:
+            上传记录，不存在或即将过期时返回None
+        """
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT content_hash, name, uri, mime_type, uploaded_at, expires_at, last_used"
+                " FROM uploads WHERE content_hash = ?", (content_hash,)).fetchone()
+            if row is None:
+                return None
+            entry = UploadEntry(*row)
+            if entry.expires_at - self.expiry_margin <= now:
+                return None
+            if now - entry.last_used < TOUCH_INTERVAL:
+                return entry
+            self._conn.execute(
+                "UPDATE uploads SET last_used = ? WHERE content_hash = ?", (now, content_hash))
+            self._conn.commit()
+            return entry._replace(last_used=now)
+
+    def register(self, content_hash: str, file_info) -> UploadEntry:
+        """登记一个新上传的Gemini文件
+
+        Args:
+            content_hash: 文件内容sha256
+            file_info: genai.get_file/upload_file返回的文件对象
+
+        Returns:
+            写入的上传记录
+        """
+        now = time.time()
+        expiration = getattr(file_info, 'expiration_time', None)
+        expires_at = expiration.timestamp() if expiration else now + GEMINI_FILE_LIFETIME
+        entry = UploadEntry(content_hash, file_info.name, file_info.uri,
+                            file_info.mime_type, now, expires_at, now)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO uploads"
+                " (content_hash, name, uri, mime_type, uploaded_at, expires_at, last_used)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)", entry)
+            self._conn.commit()
+        return entry
+
+    def remove(self, content_hash: str) -> None:
+        """删除一条上传记录"""
+        with self._lock:
+            self._conn.execute("DELETE FROM uploads WHERE content_hash = ?", (content_hash,))
+            self._conn.commit()
+
+    def due_for_reaping(self) -> List[UploadEntry]:
+        """返回已闲置超过idle_ttl或已经过期、应当删除的上传记录"""
+        now = time.time()
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT content_hash, name, uri, mime_type, uploaded_at, expires_at, last_used"
+                " FROM uploads WHERE last_used < ? OR expires_at - ? <= ?",
+                (now - self.idle_ttl, self.expiry_margin, now)).fetchall()
+        return [UploadEntry(*row) for row in rows]
+
+    def close(self) -> None:
+        """关闭数据库连接"""
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+并行分段视频下载器
+探测服务器是否支持Range请求：支持时把文件切成多个分段并发下载到预分配的文件中，
+失败的分段从中断处续传；不支持时退回到单连接顺序下载
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import re
+import tempfile
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+import aiohttp
+
+_CONTENT_RANGE_RE = re.compile(r'bytes\s+\d+-\d+/(\d+)')
+
+
+class DownloadProgress:
+    """限频的下载进度输出"""
+
+    def __init__(self, total: int, interval: float = 0.5):
+        self.total = total
+        self.interval = interval
+        self.downloaded = 0
+        self._start = time.monotonic()
+        self._last_report = 0.0
+
+    def advance(self, size: int) -> None:
+        """累加已下载字节数，距上次输出超过interval时才打印"""
+        self.downloaded += size
+        now = time.monotonic()
+        if now - self._last_report >= self.interval:
+            self._last_report = now
+            self._report(now)
+
+    def finish(self) -> None:
+        """打印最终进度"""
+        self._report(time.monotonic())
+        print()
+
+    def _report(self, now: float) -> None:
+        elapsed = max(now - self._start, 1e-6)
+        speed = self.downloaded / elapsed / (1024 * 1024)
+        if self.total > 0:
+            progress = self.downloaded / self.total * 100
+            print(f"\r下载进度: {progress:.1f}% ({speed:.1f} MB/s)", end='', flush=True)
+        else:
+            print(f"\r已下载: {self.downloaded / (1024 * 1024):.1f} MB ({speed:.1f} MB/s)", end='', flush=True)
+
+
+class RangedDownloader:
+    """支持并发分段与断点续传的下载器"""
+
+    def __init__(self, session: aiohttp.ClientSession, connections: int = 4,
+                 part_size: int = 8 * 1024 * 1024, buffer_size: int = 1024 * 1024,
+                 max_retries: int = 3, headers: Optional[Dict[str, str]] = None):
+        """初始化下载器
+
+        Args:
+            session: 共享的aiohttp会话
+            connections: 并发连接数
+            part_size: 每个Range分段的大小（字节）
+            buffer_size: 每次从网络读取并写盘的缓冲区大小（字节）
+            max_retries: 每个分段（或单连接下载）的最大重试次数
+            headers: 附加的请求头
+        """
+        self.session = session
+        self.connections = max(1, connections)
+        self.part_size = part_size
+        self.buffer_size = buffer_size
+        self.max_retries = max_retries
+        self.headers = headers or {}
+
+    @staticmethod
+    def partial_path(url: str, suffix: str) -> str:
+        """某个链接未完成下载的保留位置（供后续调用续传）"""
+        digest = hashlib.sha1(url.encode('utf-8')).hexdigest()[:16]
+        return os.path.join(tempfile.gettempdir(), f"gva-partial-{digest}{suffix}")
+
+    async def download(self, url: str, dest_path: str) -> str:
+        """下载文件到dest_path
+
+        如果此前同一链接的下载中途失败，会先接管保留的部分文件并只下载缺失的分段；
+        本次下载最终失败时，已下载的部分会保留下来供下次续传。
+
+        Args:
+            url: 文件链接
+            dest_path: 目标文件路径
+
+        Returns:
+            目标文件路径
+        """
+        suffix = os.path.splitext(dest_path)[1]
+        partial = self.partial_path(url, suffix)
+        state = self._claim_partial(partial, dest_path, url)
+
+        try:
+            total, etag, response = await self._probe(url)
+            if response is not None:
+                # 服务器不支持Range，直接复用探测请求的响应做单连接下载
+                await self._download_single(url, dest_path, response)
+            else:
+                if state and (state.get('total') != total or state.get('etag') != etag):
+                    # 远端文件已变化，不能续传
+                    state = None
+                done = [tuple(r) for r in state['done']] if state else []
+                if done:
+                    print(f"✓ 续传未完成的下载，已完成 {sum(e - s for s, e in done)} 字节")
+                await self._download_ranges(url, dest_path, total, etag, done)
+            self._remove_state(dest_path)
+            return dest_path
+        except BaseException:
+            self._retain_partial(dest_path, partial)
+            raise
+
+    async def _probe(self, url: str) -> Tuple[int, Optional[str], Optional[aiohttp.ClientResponse]]:
+        """用 Range: bytes=0-0 探测服务器是否支持分段下载
+
+        Returns:
+            (文件总大小, ETag, 响应)；支持Range时响应为None，否则返回尚未读取的完整响应
+        """
+        headers = dict(self.headers, Range='bytes=0-0')
+        response = await self.session.get(url, headers=headers, timeout=aiohttp.ClientTimeout(total=None))
+        try:
+            response.raise_for_status()
+        except aiohttp.ClientResponseError:
+            response.release()
+            raise
+
+        match = _CONTENT_RANGE_RE.match(response.headers.get('Content-Range', ''))
+        if response.status == 206 and match:
+            response.release()
+            return int(match.group(1)), response.headers.get('ETag'), None
+        return int(response.headers.get('Content-Length', 0)), None, response
+
+    async def _download_single(self, url: str, dest_path: str, response: aiohttp.ClientResponse) -> None:
+        """单连接顺序下载，失败时从头重试"""
+        for attempt in range(self.max_retries + 1):
+            try:
+                if response is None:
+                    response = await self.session.get(
+                        url, headers=self.headers, timeout=aiohttp.ClientTimeout(total=None))
+                    response.raise_for_status()
+                total = int(response.headers.get('Content-Length', 0))
+                progress = DownloadProgress(total)
+                with open(dest_path, 'wb', buffering=self.buffer_size) as f:
+                    async for chunk in response.content.iter_chunked(self.buffer_size):
+                        await asyncio.to_thread(f.write, chunk)
+                        progress.advance(len(chunk))
+                progress.finish()
+                return
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if attempt >= self.max_retries:
+                    raise
+                print(f"\n⚠ 下载中断，重新下载 ({attempt + 1}/{self.max_retries}): {str(e)}")
+                await asyncio.sleep(min(2 ** attempt, 10))
+            finally:
+                if response is not None:
+                    response.release()
+                    response = None
+
+    async def _download_ranges(self, url: str, dest_path: str, total: int, etag: Optional[str],
+                               done: List[Tuple[int, int]]) -> None:
+        """多连接分段下载到预分配的文件中"""
+        # 预分配文件（保留已经下载好的内容）
+        mode = 'r+b' if os.path.exists(dest_path) else 'wb'
+        with open(dest_path, mode) as f:
+            f.truncate(total)
+
+        pending = asyncio.Queue()
+        for start in range(0, total, self.part_size):
+            end = min(start + self.part_size, total)
+            if not any(s <= start and end <= e for s, e in done):
+                pending.put_nowait((start, end))
+
+        progress = DownloadProgress(total)
+        progress.downloaded = sum(e - s for s, e in done)
+        completed = list(done)
+        last_saved = time.monotonic()
+
+        fd = os.open(dest_path, os.O_WRONLY)
+        writes: Set[asyncio.Future] = set()
+
+        async def write(chunk: bytes, offset: int) -> None:
+            # 写盘放到线程中，慢磁盘不会阻塞事件循环中的其他分段；
+            # shield保证取消下载时线程中的写入照常完成，关闭fd前等待全部写入结束
+            future = asyncio.ensure_future(asyncio.to_thread(os.pwrite, fd, chunk, offset))
+            writes.add(future)
+            future.add_done_callback(writes.discard)
+            await asyncio.shield(future)
+
+        try:
+            async def worker():
+                nonlocal last_saved
+                while True:
+                    try:
+                        start, end = pending.get_nowait()
+                    except asyncio.QueueEmpty:
+                        return
+                    await self._fetch_range(url, write, start, end, progress)
+                    completed.append((start, end))
+                    # 定期记录已完成的分段，进程崩溃后也能续传
+                    now = time.monotonic()
+                    if now - last_saved >= 1.0:
+                        last_saved = now
+                        self._save_state(dest_path, url, total, etag, completed)
+
+            workers = [asyncio.create_task(worker()) for _ in range(self.connections)]
+            try:
+                await asyncio.gather(*workers)
+            except BaseException:
+                for task in workers:
+                    task.cancel()
+                await asyncio.gather(*workers, return_exceptions=True)
+                self._save_state(dest_path, url, total, etag, completed)
+                raise
+        finally:
+            if writes:
+                await asyncio.gather(*writes, return_exceptions=True)
+            os.close(fd)
+        progress.finish()
+
+    async def _fetch_range(self, url: str, write: Callable[[bytes, int], Awaitable[None]], start: int, end: int,
+                           progress: DownloadProgress) -> None:
+        """下载[start, end)区间并用write(数据, 偏移)写入文件对应位置，中断后从已写入的位置继续"""
+        offset = start
+        for attempt in range(self.max_retries + 1):
+            try:
+                headers = dict(self.headers, Range=f'bytes={offset}-{end - 1}')
+                async with self.session.get(url, headers=headers,
+                                            timeout=aiohttp.ClientTimeout(total=None, sock_read=60)) as response:
+                    if response.status != 206:
+                        raise aiohttp.ClientResponseError(
+                            response.request_info, response.history, status=response.status,
+                            message=f"分段请求返回 {response.status}")
+                    async for chunk in response.content.iter_chunked(self.buffer_size):
+                        chunk = chunk[:end - offset]
+                        await write(chunk, offset)
+                        offset += len(chunk)
+                        progress.advance(len(chunk))
+                if offset >= end:
+                    return
+                raise aiohttp.ClientPayloadError(f"分段数据不完整: {offset}/{end}")
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if attempt >= self.max_retries:
+                    raise
+                print(f"\n⚠ 分段 {start}-{end - 1} 中断，从 {offset} 继续 ({attempt + 1}/{self.max_retries}): {str(e)}")
+                await asyncio.sleep(min(2 ** attempt, 10))
+
+    @staticmethod
+    def _state_path(path: str) -> str:
+        return path + '.state.json'
+
+    def _save_state(self, dest_path: str, url: str, total: int, etag: Optional[str],
+                    completed: List[Tuple[int, int]]) -> None:
+        state = {'url': url, 'total': total, 'etag': etag, 'done': sorted(completed)}
+        tmp_path = self._state_path(dest_path) + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self._state_path(dest_path))
+
+    def _remove_state(self, dest_path: str) -> None:
+        try:
+            os.unlink(self._state_path(dest_path))
+        except FileNotFoundError:
+            pass
+
+    def _claim_partial(self, partial: str, dest_path: str, url: str) -> Optional[dict]:
+        """接管此前保留的未完成下载；rename是原子操作，并发调用中只有一个能接管成功"""
+        try:
+            os.rename(self._state_path(partial), self._state_path(dest_path))
+        except OSError:
+            return None
+        try:
+            os.rename(partial, dest_path)
+            with open(self._state_path(dest_path), 'r', encoding='utf-8') as f:
+                state = json.load(f)
+            return state if state.get('url') == url else None
+        except (OSError, ValueError):
+            self._remove_state(dest_path)
+            return None
+
+    def _retain_partial(self, dest_path: str, partial: str) -> None:
+        """下载失败时把已下载的部分移到保留位置，供下一次调用续传"""
+        if not os.path.exists(self._state_path(dest_path)):
+            return
+        try:
+            os.replace(dest_path, partial)
+            os.replace(self._state_path(dest_path), self._state_path(partial))
+        except OSError:
+            pass
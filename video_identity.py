@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+视频身份标识工具
+把同一个视频的不同链接形式/文件副本归一化为稳定的标识，用于缓存和去重
+"""
+
+import hashlib
+import os
+import re
+import threading
+import urllib.parse
+from typing import Dict, Optional, Tuple
+
+# YouTube视频ID固定为11位
+_YOUTUBE_ID_RE = re.compile(r'^[A-Za-z0-9_-]{11}$')
+_YOUTUBE_HOSTS = ('youtube.com', 'www.youtube.com', 'm.youtube.com', 'music.youtube.com',
+                  'youtube-nocookie.com', 'www.youtube-nocookie.com')
+
+# 文件内容哈希的进程内缓存：(真实路径, 大小, 修改时间) -> sha256
+_hash_memo: Dict[Tuple[str, int, int], str] = {}
+_hash_memo_lock = threading.Lock()
+
+
+def youtube_video_id(url: str) -> Optional[str]:
+    """从YouTube链接中提取视频ID
+
+    支持 watch?v=、youtu.be/、shorts/、embed/、live/ 和 v/ 等形式。
+
+    Args:
+        url: YouTube视频链接
+
+    Returns:
+        11位视频ID，无法识别时返回None
+    """
+    parsed = urllib.parse.urlparse(url.strip())
+    host = (parsed.hostname or '').lower()
+    segments = [s for s in parsed.path.split('/') if s]
+
+    candidate = None
+    if host in ('youtu.be', 'www.youtu.be'):
+        candidate = segments[0] if segments else None
+    elif host in _YOUTUBE_HOSTS:
+        if parsed.path == '/watch':
+            candidate = urllib.parse.parse_qs(parsed.query).get('v', [None])[0]
+        elif len(segments) >= 2 and segments[0] in ('shorts', 'embed', 'live', 'v', 'e'):
+            candidate = segments[1]
+
+    if candidate and _YOUTUBE_ID_RE.match(candidate):
+        return candidate
+    return None
+
+
+def file_sha256(path: str) -> str:
+    """计算文件内容的sha256（按路径、大小和修改时间在进程内缓存结果）
+
+    Args:
+        path: 文件路径
+
+    Returns:
+        十六进制sha256摘要
+    """
+    stat = os.stat(path)
+    memo_key = (os.path.realpath(path), stat.st_size, stat.st_mtime_ns)
+    with _hash_memo_lock:
+        if memo_key in _hash_memo:
+            return _hash_memo[memo_key]
+
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    result = digest.hexdigest()
+
+    with _hash_memo_lock:
+        _hash_memo[memo_key] = result
+    return result
+
+
+def youtube_identity(url: str) -> str:
+    """YouTube视频的归一化标识，无法解析视频ID时退回到原始链接"""
+    video_id = youtube_video_id(url)
+    return f"youtube:{video_id}" if video_id else url_identity(url)
+
+
+def url_identity(url: str) -> str:
+    """网络视频链接的标识（下载前还不知道内容哈希时使用）"""
+    return f"url:{url.strip()}"
+
+
+def content_identity(sha256_hex: str) -> str:
+    """按内容sha256生成的视频标识"""
+    return f"sha256:{sha256_hex}"
+
+
+def file_identity(path: str) -> str:
+    """本地文件（包括下载得到的临时文件）的内容标识"""
+    return content_identity(file_sha256(path))
+
+
+def prompt_hash(prompt: str) -> str:
+    """提示词的sha256摘要"""
+    return hashlib.sha256(prompt.encode('utf-8')).hexdigest()
@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+后台webhook投递器
+分析结果放入有界的待发送队列后立即返回，由后台任务通过复用连接的HTTP会话投递；
+5xx、429和超时按带随机抖动的指数退避重试，每个接收端的并发请求数单独限制。
+配置发件箱时每条webhook先持久化再投递，配置批量模式时同一地址的多条结果合并为一个JSON数组发送
+"""
+
+import asyncio
+import random
+import time
+import urllib.parse
+from typing import Dict, List, Optional, Set, Tuple
+
+import aiohttp
+
+from metrics import Metrics
+from webhook_outbox import WebhookOutbox
+
+DEFAULT_HEADERS = {
+    'Content-Type': 'application/json',
+    'User-Agent': 'Gemini-Video-Analyzer/1.0'
+}
+
+# 投递结果
+DELIVERED = 'delivered'
+FAILED = 'failed'        # 重试耗尽，保留在发件箱中等待下次重投
+REJECTED = 'rejected'    # 接收端明确拒绝（4xx），重投也不会成功
+
+# 待投递的一条webhook：(发件箱记录ID, 数据)
+_Item = Tuple[Optional[int], dict]
+
+
+class WebhookDispatcher:
+    """带重试、按接收端限流、可持久化和批量发送的webhook后台投递器"""
+
+    def __init__(self, max_pending: int = 1000, per_endpoint: int = 4, max_retries: int = 4,
+                 base_delay: float = 1.0, max_delay: float = 30.0, timeout: float = 30.0,
+                 pool_size: int = 32, outbox: Optional[WebhookOutbox] = None,
+                 batch_size: int = 1, batch_interval: float = 0.5,
+                 metrics: Optional[Metrics] = None):
+        """初始化投递器
+
+        Args:
+            max_pending: 待发送队列的容量，队列满时submit会等待，避免结果无限堆积
+            per_endpoint: 每个接收端（scheme://host:port）同时进行的最大请求数
+            max_retries: 5xx、429、超时和连接错误的最大重试次数
+            base_delay: 第一次重试前的基础等待时间（秒），之后按指数增长并加随机抖动
+            max_delay: 两次重试之间的最长等待时间（秒）
+            timeout: 单次请求的超时时间（秒）
+            pool_size: HTTP连接池的最大连接数
+            outbox: 可选的持久化发件箱，每条webhook投递前先写入，送达后删除
+            batch_size: 大于1时启用批量模式，同一地址最多合并这么多条结果为一个JSON数组发送
+            batch_interval: 批量模式下未攒满一批时最多等待的时间（秒）
+            metrics: 可选的耗时统计，每次投递（含重试）记录为webhook阶段
+        """
+        self.max_pending = max(max_pending, batch_size)
+        self.per_endpoint = per_endpoint
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self.outbox = outbox
+        self.batch_size = max(1, batch_size)
+        self.batch_interval = batch_interval
+        self.metrics = metrics
+        self.delivered = 0
+        self.failed = 0
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._endpoints: Dict[str, asyncio.Semaphore] = {}
+        self._tasks: Set[asyncio.Task] = set()
+        self._batches: Dict[str, List[_Item]] = {}
+        self._batch_timers: Dict[str, asyncio.TimerHandle] = {}
+        self._in_flight: Set[int] = set()
+        self._pending = 0
+
+    async def _get_session(self) -> aiohttp.ClientSession:
+        """获取投递专用的HTTP会话（保持长连接，多次投递复用TCP/TLS连接）"""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.pool_size, keepalive_timeout=60)
+            self._session = aiohttp.ClientSession(
+                connector=connector, headers=DEFAULT_HEADERS,
+                timeout=aiohttp.ClientTimeout(total=self.timeout))
+        return self._session
+
+    def _endpoint_semaphore(self, webhook_url: str) -> asyncio.Semaphore:
+        parsed = urllib.parse.urlparse(webhook_url)
+        endpoint = f"{parsed.scheme}://{parsed.netloc}"
+        if endpoint not in self._endpoints:
+            self._endpoints[endpoint] = asyncio.Semaphore(self.per_endpoint)
+        return self._endpoints[endpoint]
+
+    def _backoff(self, attempt: int) -> float:
+        """第attempt次重试前的等待时间（full jitter）"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    @property
+    def pending_count(self) -> int:
+        """尚未投递完成的webhook数"""
+        return self._pending
+
+    async def _acquire_slot(self) -> None:
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_pending)
+        await self._slots.acquire()
+        self._pending += 1
+
+    async def submit(self, webhook_url: str, data: dict) -> None:
+        """把一条webhook放入后台投递队列后立即返回（队列已满时等待空位）
+
+        Args:
+            webhook_url: webhook地址
+            data: 要发送的JSON数据
+        """
+        await self._acquire_slot()
+        entry_id = None
+        if self.outbox is not None:
+            try:
+                # 写盘和提交放到线程中，不阻塞事件循环
+                entry_id = await asyncio.to_thread(self.outbox.add, webhook_url, data)
+            except BaseException:
+                self._release_slots(1)
+                raise
+        self._enqueue(webhook_url, (entry_id, data))
+
+    async def replay(self) -> int:
+        """认领发件箱中此前未送达的webhook并重新放入投递队列
+
+        只认领无人认领或租约已过期的记录，其他进程正在投递的webhook不会重复发送。
+
+        Returns:
+            重新投递的条数
+        """
+        if self.outbox is None:
+            return 0
+        count = 0
+        for entry in await asyncio.to_thread(self.outbox.claim):
+            if entry.id in self._in_flight:
+                # 本进程仍在投递（投递耗时超过了租约）
+                continue
+            await self._acquire_slot()
+            self._enqueue(entry.url, (entry.id, entry.data))
+            count += 1
+        if count:
+            print(f"✓ 重新投递发件箱中未送达的webhook: {count} 条")
+        return count
+
+    def _enqueue(self, webhook_url: str, item: _Item) -> None:
+        if item[0] is not None:
+            self._in_flight.add(item[0])
+        if self.batch_size <= 1:
+            self._spawn(webhook_url, [item])
+            return
+
+        batch = self._batches.setdefault(webhook_url, [])
+        batch.append(item)
+        if len(batch) >= self.batch_size:
+            self._flush_batch(webhook_url)
+        elif webhook_url not in self._batch_timers:
+            loop = asyncio.get_running_loop()
+            self._batch_timers[webhook_url] = loop.call_later(
+                self.batch_interval, self._flush_batch, webhook_url)
+
+    def _flush_batch(self, webhook_url: str) -> None:
+        """把某个地址攒下的结果作为一批发出"""
+        timer = self._batch_timers.pop(webhook_url, None)
+        if timer is not None:
+            timer.cancel()
+        batch = self._batches.pop(webhook_url, None)
+        if batch:
+            self._spawn(webhook_url, batch)
+
+    def _spawn(self, webhook_url: str, items: List[_Item]) -> None:
+        task = asyncio.create_task(self._deliver_items(webhook_url, items))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _deliver_items(self, webhook_url: str, items: List[_Item]) -> None:
+        ids = [entry_id for entry_id, _ in items if entry_id is not None]
+        try:
+            if self.batch_size > 1:
+                payload = [data for _, data in items]
+            else:
+                payload = items[0][1]
+            outcome, error = await self._post(webhook_url, payload, len(items))
+            if self.outbox is not None and ids:
+                if outcome == DELIVERED:
+                    await asyncio.to_thread(self.outbox.remove, ids)
+                else:
+                    await asyncio.to_thread(self.outbox.record_failure, ids, error, dead=outcome == REJECTED)
+        finally:
+            self._in_flight.difference_update(ids)
+            self._release_slots(len(items))
+
+    def _release_slots(self, count: int) -> None:
+        self._pending -= count
+        for _ in range(count):
+            self._slots.release()
+
+    async def send(self, webhook_url: str, data) -> bool:
+        """立即投递一条webhook并等待结果，失败时按退避策略重试（不经过发件箱）
+
+        Args:
+            webhook_url: webhook地址
+            data: 要发送的JSON数据
+
+        Returns:
+            发送是否成功
+        """
+        outcome, _ = await self._post(webhook_url, data)
+        return outcome == DELIVERED
+
+    async def _post(self, webhook_url: str, payload, count: int = 1) -> Tuple[str, str]:
+        """发送一次请求（含重试），并记录投递耗时
+
+        Returns:
+            (投递结果, 最后一次的错误信息)
+        """
+        start = time.monotonic()
+        outcome, error = await self._post_with_retries(webhook_url, payload, count)
+        if self.metrics is not None:
+            status = "ok" if outcome == DELIVERED else "error"
+            self.metrics.observe("webhook", time.monotonic() - start, status)
+            self.metrics.count("webhooks_total", count, outcome=outcome)
+        return outcome, error
+
+    async def _post_with_retries(self, webhook_url: str, payload, count: int) -> Tuple[str, str]:
+        session = await self._get_session()
+        label = f"{webhook_url}（{count}条）" if count > 1 else webhook_url
+        async with self._endpoint_semaphore(webhook_url):
+            for attempt in range(self.max_retries + 1):
+                try:
+                    async with session.post(webhook_url, json=payload) as response:
+                        if 200 <= response.status < 300:
+                            print(f"✓ 成功发送到webhook: {label}")
+                            self.delivered += count
+                            return DELIVERED, ''
+                        retryable = response.status >= 500 or response.status == 429
+                        error = f"Webhook响应错误: {response.status}"
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    retryable = True
+                    error = f"发送到webhook失败: {str(e) or type(e).__name__}"
+
+                if not retryable or attempt >= self.max_retries:
+                    print(f"✗ {error}")
+                    self.failed += count
+                    return (FAILED if retryable else REJECTED), error
+                delay = self._backoff(attempt)
+                print(f"⚠ {error}，{delay:.1f}秒后重试 ({attempt + 1}/{self.max_retries})")
+                await asyncio.sleep(delay)
+
+    async def flush(self) -> None:
+        """立即发出攒批中的结果，并等待队列中所有webhook投递完成（包括重试）"""
+        for webhook_url in list(self._batches):
+            self._flush_batch(webhook_url)
+        while self._tasks:
+            await asyncio.gather(*list(self._tasks), return_exceptions=True)
+
+    async def close(self) -> None:
+        """投递完队列中剩余的webhook并关闭HTTP会话"""
+        await self.flush()
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+        if self.outbox is not None and self.failed:
+            remaining = self.outbox.count()
+            if remaining:
+                print(f"⚠ 发件箱中有 {remaining} 条webhook尚未送达，下次启动时会重新投递")
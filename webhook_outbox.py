@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+webhook持久化发件箱
+每条webhook在投递前先写入本地SQLite，投递成功后删除；重试耗尽仍未送达的记录保留下来，
+下次启动时重新投递，接收端短暂不可用时不会丢失已经付费得到的分析结果。
+发件箱文件由同一用户的多个进程共享（命令行、常驻服务、常驻进程的子进程），
+每条记录由投递它的进程认领并带有租约：重投只认领无人认领或租约已过期（认领进程崩溃）的记录，
+不会重复发送另一个进程正在投递的webhook
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Iterable, List, NamedTuple
+
+DEFAULT_OUTBOX_PATH = os.path.join(
+    os.path.expanduser('~'), '.cache', 'gemini_video_analyzer', 'webhook_outbox.sqlite3')
+
+# 记录状态：pending 无人认领，等待重投；in_flight 某个进程正在投递（owner、claimed_at为其认领信息）；
+# dead 接收端明确拒绝（4xx），不再自动重投
+STATUS_PENDING = 'pending'
+STATUS_IN_FLIGHT = 'in_flight'
+STATUS_DEAD = 'dead'
+
+
+class OutboxEntry(NamedTuple):
+    """发件箱中的一条webhook"""
+    id: int
+    url: str
+    data: Any
+    created_at: float
+    attempts: int
+    last_error: str
+
+
+class WebhookOutbox:
+    """基于SQLite的webhook发件箱"""
+
+    def __init__(self, path: str = DEFAULT_OUTBOX_PATH, lease: float = 15 * 60):
+        """初始化发件箱
+
+        Args:
+            path: SQLite数据库文件路径
+            lease: 认领的租约时长（秒）：认领后超过这个时间仍未送达或释放的记录视为认领进程已崩溃，
+                可以由其他进程重新认领；应长于一次投递（含全部重试）的最长耗时
+        """
+        self.path = path
+        self.lease = lease
+        # 本实例的认领标识（进程ID便于排查，随机部分区分同一进程中的多个实例和fork出的子进程）
+        self.owner = f"{os.getpid()}-{uuid.uuid4().hex[:12]}"
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS outbox ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " url TEXT NOT NULL,"
+            " payload TEXT NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " attempts INTEGER NOT NULL DEFAULT 0,"
+            " last_error TEXT NOT NULL DEFAULT '',"
+            " status TEXT NOT NULL DEFAULT 'pending')"
+        )
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(outbox)")}
+        if 'owner' not in columns:
+            # 早期版本的发件箱没有认领信息
+            self._conn.execute("ALTER TABLE outbox ADD COLUMN owner TEXT")
+            self._conn.execute("ALTER TABLE outbox ADD COLUMN claimed_at REAL")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS outbox_status ON outbox (status, id)")
+        self._conn.commit()
+
+    def add(self, url: str, data) -> int:
+        """在投递前记录一条webhook（记录直接由本实例认领，其他进程不会重投）
+
+        会写盘并提交，在事件循环中应通过asyncio.to_thread调用。
+
+        Returns:
+            记录ID
+        """
+        payload = json.dumps(data, ensure_ascii=False)
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO outbox (url, payload, created_at, status, owner, claimed_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (url, payload, now, STATUS_IN_FLIGHT, self.owner, now))
+            self._conn.commit()
+            return cursor.lastrowid
+
+    def remove(self, ids: Iterable[int]) -> None:
+        """删除已经成功投递的记录"""
+        ids = [(i,) for i in ids]
+        with self._lock:
+            self._conn.executemany("DELETE FROM outbox WHERE id = ?", ids)
+            self._conn.commit()
+
+    def record_failure(self, ids: Iterable[int], error: str, dead: bool = False) -> None:
+        """记录一次失败的投递并释放认领（之后任何进程都可以重投）
+
+        Args:
+            ids: 记录ID
+            error: 错误信息
+            dead: 为True时标记为不再重投（接收端明确拒绝）
+        """
+        status = STATUS_DEAD if dead else STATUS_PENDING
+        rows = [(error, status, i) for i in ids]
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE outbox SET attempts = attempts + 1, last_error = ?, status = ?, owner = NULL,"
+                " claimed_at = NULL WHERE id = ?", rows)
+            self._conn.commit()
+
+    def claim(self, limit: int = 10000) -> List[OutboxEntry]:
+        """认领需要重投的记录：无人认领的，以及租约已过期（认领进程已崩溃）的
+
+        认领是一条UPDATE语句，多个进程同时调用时每条记录只会被其中一个认领。
+
+        Returns:
+            本次认领的记录（按写入顺序）
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "UPDATE outbox SET status = ?, owner = ?, claimed_at = ? WHERE id IN ("
+                " SELECT id FROM outbox WHERE status = ? OR (status = ? AND claimed_at < ?)"
+                " ORDER BY id LIMIT ?)",
+                (STATUS_IN_FLIGHT, self.owner, now, STATUS_PENDING, STATUS_IN_FLIGHT, now - self.lease, limit))
+            self._conn.commit()
+            rows = self._conn.execute(
+                "SELECT id, url, payload, created_at, attempts, last_error FROM outbox"
+                " WHERE status = ? AND owner = ? AND claimed_at = ? ORDER BY id",
+                (STATUS_IN_FLIGHT, self.owner, now)).fetchall()
+        return [OutboxEntry(row[0], row[1], json.loads(row[2]), *row[3:]) for row in rows]
+
+    def pending(self, limit: int = 10000) -> List[OutboxEntry]:
+        """按写入顺序返回尚未送达的记录（包括其他进程正在投递的），只读，不认领"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, url, payload, created_at, attempts, last_error FROM outbox"
+                " WHERE status IN (?, ?) ORDER BY id LIMIT ?", (STATUS_PENDING, STATUS_IN_FLIGHT, limit)).fetchall()
+        return [OutboxEntry(row[0], row[1], json.loads(row[2]), *row[3:]) for row in rows]
+
+    def count(self, status: str = STATUS_PENDING) -> int:
+        """某个状态的记录数（pending同时计入正在投递的记录，即所有尚未送达的记录）"""
+        statuses = (STATUS_PENDING, STATUS_IN_FLIGHT) if status == STATUS_PENDING else (status, status)
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM outbox WHERE status IN (?, ?)", statuses).fetchone()[0]
+
+    def close(self) -> None:
+        """关闭数据库连接"""
+        with self._lock:
+            self._conn.close()